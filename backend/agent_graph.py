@@ -2,17 +2,23 @@ import os
 import json
 import re
 import hashlib
-import requests
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 
 from code_executor import MathExecutor
 from vector_store import VectorStore
 from knowledge_graph import KnowledgeBase
 from llm_provider import get_llm_provider
+from cache_utils import SingleFlight, singleflight
+from concurrency import LoopScoped
 from graph_agent import get_graph_builder
 from constraint_checker import ConstraintChecker
 
@@ -98,22 +104,57 @@ MULTI_ENTITY_SIGNALS = [
 # NVIDIA NIM RERANKER
 # ---------------------------------------------------------------------------
 
+# RERANK_MODEL:           NIM reranking model, read once at startup
+# RERANK_MAX_PASSAGES:    passages per API request — larger candidate lists are
+#                         split into sub-requests sent in parallel and merged by
+#                         original index
+# RERANK_MAX_CONNECTIONS: pooled keep-alive connections per client
+# RERANK_HTTP2:           multiplex sub-requests over one HTTP/2 connection
+#                         (falls back to HTTP/1.1 if h2 is not installed)
+RERANK_MODEL           = os.getenv("RERANK_MODEL", "nvidia/nv-rerankqa-mistral-4b-v3")
+RERANK_MAX_PASSAGES    = int(os.getenv("RERANK_MAX_PASSAGES", "64"))
+RERANK_MAX_CONNECTIONS = int(os.getenv("RERANK_MAX_CONNECTIONS", "10"))
+RERANK_HTTP2           = os.getenv("RERANK_HTTP2", "true").lower() == "true"
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
 def _is_retryable_reranker(exc: Exception) -> bool:
     """
     Retry on transient network failures and 429/5xx HTTP errors only.
     400 Bad Request (malformed payload) fails immediately — it will never
     succeed on retry. Same principle as _is_retryable_gemini in llm_provider.py.
-    status_code lives on exc.response.status_code for requests.HTTPError.
     """
-    if isinstance(exc, (requests.exceptions.ConnectionError,
-                        requests.exceptions.Timeout)):
+    if isinstance(exc, (httpx.TransportError, httpx.TimeoutException)):
         return True
-    if isinstance(exc, requests.exceptions.HTTPError):
-        status = getattr(exc.response, 'status_code', None)
-        return status == 429 or (status is not None and status >= 500)
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
     return False
 
 
+_reranker_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=retry_if_exception(_is_retryable_reranker)
+)
+
+# Users asking the same question at the same time rerank the same passages —
+# predict / apredict calls with identical pairs share one API request
+_rerank_flight = SingleFlight("rerank")
+
+_coalesced_rerank = singleflight(
+    _rerank_flight,
+    lambda self, pairs: (self.model, tuple((q, p) for q, p in pairs)),
+)
+
+
 class NvidiaReranker:
     """
     Thin wrapper around the NVIDIA NIM reranker REST API.
@@ -130,58 +171,100 @@ class NvidiaReranker:
     controlled by AGENT_MIN_RERANK_SCORE env var (default -5.0).
     Verified from NVIDIA NIM docs: relevant docs score roughly -3 to +1,
     clear noise drops below -5.
-    """
 
-    @property
-    def ENDPOINT(self):
-        model = os.getenv("RERANK_MODEL", "nvidia/nv-rerankqa-mistral-4b-v3")
-        return f"https://ai.api.nvidia.com/v1/retrieval/{model}/reranking"
+    Both paths reuse pooled keep-alive connections (HTTP/2 where available)
+    instead of a new TCP+TLS handshake per query. Candidate lists longer than
+    RERANK_MAX_PASSAGES are split into parallel sub-requests.
+    """
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, model: str = RERANK_MODEL,
+                 max_passages: int = RERANK_MAX_PASSAGES):
         if not api_key:
             raise RuntimeError(
                 "NVIDIA_API_KEY is required for the reranker. "
                 "Set NVIDIA_API_KEY in your K8s secret."
             )
+        self.model = model
+        self.endpoint = f"https://ai.api.nvidia.com/v1/retrieval/{model}/reranking"
+        self.max_passages = max(1, max_passages)
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception(_is_retryable_reranker)
-    )
-    def predict(self, pairs: list) -> list:
-        """
-        pairs: list of [query, passage] — same format as CrossEncoder.predict().
-        Returns: list of logit scores, scores[i] corresponds to pairs[i].
-        """
+        self._client_kwargs = dict(
+            headers=self.headers,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=RERANK_MAX_CONNECTIONS,
+                                max_keepalive_connections=RERANK_MAX_CONNECTIONS),
+            http2=RERANK_HTTP2 and _h2_available(),
+        )
+        # httpx.Client is thread-safe — one pool shared by every sync caller
+        self._client = httpx.Client(**self._client_kwargs)
+        self._slice_pool = ThreadPoolExecutor(max_workers=RERANK_MAX_CONNECTIONS,
+                                              thread_name_prefix="rerank")
+        # One pool per event loop, created on first apredict() inside it and
+        # closed as that loop shuts down
+        self._async_clients = LoopScoped(lambda: httpx.AsyncClient(**self._client_kwargs),
+                                         lambda client: client.aclose())
+
+    def _payload(self, pairs: list) -> dict:
         query = pairs[0][0]  # All pairs share the same query
-        passages = [{"text": p[1]} for p in pairs]
-
-        payload = {
-            "model": os.getenv("RERANK_MODEL", "nvidia/nv-rerankqa-mistral-4b-v3"),
+        return {
+            "model": self.model,
             "query": {"text": query},
-            "passages": passages,
+            "passages": [{"text": p[1]} for p in pairs],
         }
 
-        response = requests.post(self.ENDPOINT, headers=self.headers, json=payload, timeout=(5, 30))
-        response.raise_for_status()
-        data = response.json()
-
+    @staticmethod
+    def _scores_by_index(data: dict, n: int) -> list:
         # Reconstruct flat scores array by original index.
         # API returns rankings sorted by relevance — each item has 'index' (original
         # passage position) and 'logit'. Reading in response order would assign
         # wrong scores to wrong documents.
-        scores = [0.0] * len(pairs)
+        scores = [0.0] * n
         for ranking in data["rankings"]:
             scores[ranking["index"]] = ranking["logit"]
-
         return scores
 
+    def _slices(self, pairs: list) -> list:
+        return [pairs[i : i + self.max_passages] for i in range(0, len(pairs), self.max_passages)]
+
+    @_reranker_retry
+    def _post(self, pairs: list) -> list:
+        response = self._client.post(self.endpoint, json=self._payload(pairs))
+        response.raise_for_status()
+        return self._scores_by_index(response.json(), len(pairs))
+
+    @_reranker_retry
+    async def _apost(self, client: httpx.AsyncClient, pairs: list) -> list:
+        response = await client.post(self.endpoint, json=self._payload(pairs))
+        response.raise_for_status()
+        return self._scores_by_index(response.json(), len(pairs))
+
+    @_coalesced_rerank
+    def predict(self, pairs: list) -> list:
+        """
+        pairs: list of [query, passage] — same format as CrossEncoder.predict().
+        Returns: list of logit scores, scores[i] corresponds to pairs[i].
+        """
+        if not pairs:
+            return []
+        slices = self._slices(pairs)
+        if len(slices) == 1:
+            return self._post(pairs)
+        # Slices are contiguous, so concatenating in order restores original indices
+        return [s for scores in self._slice_pool.map(self._post, slices) for s in scores]
+
+    @_coalesced_rerank
+    async def apredict(self, pairs: list) -> list:
+        """Async predict() on a pooled httpx.AsyncClient — used by the async agent graph."""
+        if not pairs:
+            return []
+        client = self._async_clients.get()
+        results = await asyncio.gather(*(self._apost(client, s) for s in self._slices(pairs)))
+        return [s for scores in results for s in scores]
+
 
 # ---------------------------------------------------------------------------
 # SERVICE SINGLETON  (lru_cache — created once per worker process)
@@ -298,32 +381,20 @@ def route_question_node(state: AgentState):
     }
 
 
+async def aroute_question_node(state: AgentState):
+    """Async-graph entry — routing is regex-only, so the sync body is reused as-is."""
+    return route_question_node(state)
+
+
 # ---------------------------------------------------------------------------
 # NODE: decompose_query_node
 # ---------------------------------------------------------------------------
 
-def decompose_query_node(state: AgentState):
+def _decomposition_prompts(question: str, question_type: str):
     """
-    Breaks complex questions into simpler sub-queries for better retrieval.
-    Uses word-boundary regex patterns + word-count to avoid false positives
-    on common words like 'and', 'first', 'second'.
-
-    Synthesis questions (question_type == "synthesis") enforce a minimum of
-    3 sub-questions, each targeting a different section of the document.
-
-    Commit A — synthesis min 3 sub-questions.
-    Commit B — financial vocabulary guidance in decompose prompt.
-    Both are included here. Attribution: Commit A = synthesis block,
-    Commit B = financial vocabulary lines in system_prompt.
+    Returns (prompt, system_prompt, is_synthesis), or None when the question
+    is simple enough to retrieve for directly.
     """
-    svc = get_services()
-    llm = svc["audit_llm"]
-
-    question      = state["question"]
-    question_type = state.get("question_type", "factual")
-
-    print("--- 🔀 DECOMPOSING QUERY ---")
-
     is_synthesis = question_type == "synthesis"
 
     is_complex = (
@@ -334,7 +405,7 @@ def decompose_query_node(state: AgentState):
 
     if not is_complex:
         print("   💡 Simple question — no decomposition needed")
-        return {"sub_queries": [question]}
+        return None
 
     # --- Commit A: synthesis enforces min 3 section-targeted sub-questions ---
     if is_synthesis:
@@ -380,48 +451,67 @@ Example: ["What is revenue in Q1?", "What is revenue in Q2?", "What is the trend
 
 JSON array:"""
 
-    try:
-        response = llm.generate(prompt, system_prompt)
-        sub_queries = _parse_json_list(response)
-
-        # Enforce minimum 3 for synthesis — if LLM returned fewer, fall through
-        # to single-query fallback which is better than under-decomposed synthesis
-        if sub_queries and (not is_synthesis or len(sub_queries) >= 3):
-            print(f"   ✅ Decomposed into {len(sub_queries)} sub-queries:")
-            for i, sq in enumerate(sub_queries, 1):
-                print(f"      {i}. {sq}")
-            return {"sub_queries": sub_queries}
-
-        if is_synthesis and sub_queries and len(sub_queries) < 3:
-            print(f"   ⚠️ Synthesis question got only {len(sub_queries)} sub-queries — "
-                  f"expected ≥3. Using what we have.")
-            return {"sub_queries": sub_queries}
+    return prompt, system_prompt, is_synthesis
 
-    except Exception as e:
-        print(f"   ⚠️ Decomposition failed: {e}")
+
+def _parse_decomposition(response: str, question: str, is_synthesis: bool) -> dict:
+    sub_queries = _parse_json_list(response)
+
+    # Enforce minimum 3 for synthesis — if LLM returned fewer, fall through
+    # to single-query fallback which is better than under-decomposed synthesis
+    if sub_queries and (not is_synthesis or len(sub_queries) >= 3):
+        print(f"   ✅ Decomposed into {len(sub_queries)} sub-queries:")
+        for i, sq in enumerate(sub_queries, 1):
+            print(f"      {i}. {sq}")
+        return {"sub_queries": sub_queries}
+
+    if is_synthesis and sub_queries and len(sub_queries) < 3:
+        print(f"   ⚠️ Synthesis question got only {len(sub_queries)} sub-queries — "
+              f"expected ≥3. Using what we have.")
+        return {"sub_queries": sub_queries}
 
     # Fallback — treat as single query
     return {"sub_queries": [question]}
 
 
-# ---------------------------------------------------------------------------
-# NODE: retrieve_node
-# ---------------------------------------------------------------------------
-
-def retrieve_node(state: AgentState):
+async def adecompose_query_node(state: AgentState):
     """
-    Retrieves for each sub-query, deduplicates, reranks, and optionally
-    runs graph search when real entities are extracted.
+    Breaks complex questions into simpler sub-queries for better retrieval.
+    Uses word-boundary regex patterns + word-count to avoid false positives
+    on common words like 'and', 'first', 'second'.
 
-    Multi-entity widening: when multi_entity is True, base_k raises from
-    10 to 15 so per-sub-query limits cover both entity contexts.
+    Synthesis questions (question_type == "synthesis") enforce a minimum of
+    3 sub-questions, each targeting a different section of the document.
+
+    Commit A — synthesis min 3 sub-questions.
+    Commit B — financial vocabulary guidance in decompose prompt.
+    Both are included here. Attribution: Commit A = synthesis block,
+    Commit B = financial vocabulary lines in system_prompt.
     """
     svc = get_services()
-    vector_db     = svc["vector_db"]
-    kb            = svc["kb"]
-    graph_builder = svc["graph_builder"]
-    reranker      = svc["reranker"]
+    llm = svc["audit_llm"]
+
+    question = state["question"]
+    print("--- 🔀 DECOMPOSING QUERY ---")
+
+    plan = _decomposition_prompts(question, state.get("question_type", "factual"))
+    if plan is None:
+        return {"sub_queries": [question]}
+    prompt, system_prompt, is_synthesis = plan
+
+    try:
+        response = await llm.async_generate(prompt, system_prompt)
+        return _parse_decomposition(response, question, is_synthesis)
+    except Exception as e:
+        print(f"   ⚠️ Decomposition failed: {e}")
+        return {"sub_queries": [question]}
 
+
+# ---------------------------------------------------------------------------
+# NODE: retrieve_node
+# ---------------------------------------------------------------------------
+
+def _retrieval_plan(state: AgentState) -> dict:
     sub_queries   = state.get("sub_queries", [state["question"]])
     question      = state["question"]
 
@@ -429,7 +519,7 @@ def retrieve_node(state: AgentState):
     # Decomposed sub-queries often drop vocabulary from the original
     # (e.g. "retainers" → sub-query only says "bonuses"), causing
     # relevant chunks to be missed. The original question preserves
-    # the full search vocabulary. Dedup on line 461 handles overlaps.
+    # the full search vocabulary. _dedupe_results handles overlaps.
     if len(sub_queries) > 1 and question not in sub_queries:
         sub_queries = [question] + sub_queries
 
@@ -438,32 +528,38 @@ def retrieve_node(state: AgentState):
 
     print(f"--- 🔍 RETRIEVING FOR {len(sub_queries)} SUB-QUERIES ---")
 
-    # Build filters for user-selected documents.
-    # VectorStore.search() detects isinstance(value, list) → MatchAny(any=value)
-    search_filters = {"source": selected_docs} if selected_docs else None
-
-    # --- 1. VECTOR SEARCH (per sub-query) ---
-    all_vector_results = []
-
     # Multi-entity widening: base_k=15 ensures both entity contexts are covered
     # when sub-queries are distributed across entities. Tune via env var if needed.
     base_k = 15 if multi_entity else 10
-
+    limit = base_k
     if len(sub_queries) > 1:
-        per_query_limit = max(5, base_k // len(sub_queries))
-        print(f"   📊 Multi-query mode: {per_query_limit} docs per sub-query"
+        limit = max(5, base_k // len(sub_queries))
+        print(f"   📊 Multi-query mode: {limit} docs per sub-query"
               f"{' (multi-entity widened)' if multi_entity else ''}")
 
-        for i, sq in enumerate(sub_queries, 1):
-            results = vector_db.hybrid_search(sq, limit=per_query_limit, filters=search_filters)
+    return {
+        "question":      question,
+        "sub_queries":   sub_queries,
+        "selected_docs": selected_docs,
+        # Build filters for user-selected documents.
+        # VectorStore.search() detects isinstance(value, list) → MatchAny(any=value)
+        "filters":       {"source": selected_docs} if selected_docs else None,
+        "limit":         limit,
+    }
+
+
+def _collect_vector_results(batch_results: List[List[Dict]]) -> List[Dict]:
+    all_vector_results = []
+    for i, results in enumerate(batch_results, 1):
+        if len(batch_results) > 1:
             for r in results:
                 r['_from_subquery'] = i
-            all_vector_results.extend(results)
-    else:
-        results = vector_db.hybrid_search(sub_queries[0], limit=base_k, filters=search_filters)
         all_vector_results.extend(results)
+    return all_vector_results
+
 
-    # --- 2. DEDUPLICATE (MD5 of first 200 chars — fast, whitespace-tolerant) ---
+def _dedupe_results(all_vector_results: List[Dict]) -> List[Dict]:
+    # MD5 of first 200 chars — fast, whitespace-tolerant
     seen_hashes = set()
     unique_results = []
     for res in all_vector_results:
@@ -471,42 +567,36 @@ def retrieve_node(state: AgentState):
         if fingerprint not in seen_hashes:
             seen_hashes.add(fingerprint)
             unique_results.append(res)
+    return unique_results
 
-    print(f"   📦 {len(unique_results)} unique candidates from {len(sub_queries)} queries")
-
-    # --- 3. RERANK (NVIDIA NIM reranker against original question) ---
-    # Scores are raw logits. AGENT_MIN_RERANK_SCORE default -5.0 is based on
-    # observed NVIDIA NIM score distribution: relevant docs score roughly -3 to +1,
-    # clear noise drops below -5. Tune via env var without redeploy.
-    top_score = 0.0
-    if unique_results:
-        try:
-            print("   ⚖️  Reranking candidates...")
-            pairs = [[question, r['text']] for r in unique_results]
-            scores = reranker.predict(pairs)
 
-            for i, res in enumerate(unique_results):
-                res['_rerank_score'] = scores[i]
+def _apply_rerank_scores(unique_results: List[Dict], scores: list) -> tuple:
+    """
+    Scores are raw logits. AGENT_MIN_RERANK_SCORE default -5.0 is based on
+    observed NVIDIA NIM score distribution: relevant docs score roughly -3 to +1,
+    clear noise drops below -5. Tune via env var without redeploy.
+    Returns (kept results, top score).
+    """
+    for i, res in enumerate(unique_results):
+        res['_rerank_score'] = scores[i]
 
-            unique_results.sort(key=lambda x: x['_rerank_score'], reverse=True)
+    unique_results.sort(key=lambda x: x['_rerank_score'], reverse=True)
 
-            MIN_RELEVANCE_SCORE = float(os.getenv("AGENT_MIN_RERANK_SCORE", "-5.0"))
-            filtered = [r for r in unique_results if r['_rerank_score'] > MIN_RELEVANCE_SCORE]
+    MIN_RELEVANCE_SCORE = float(os.getenv("AGENT_MIN_RERANK_SCORE", "-5.0"))
+    filtered = [r for r in unique_results if r['_rerank_score'] > MIN_RELEVANCE_SCORE]
 
-            if not filtered:
-                print(f"   ⚠️ No docs above threshold {MIN_RELEVANCE_SCORE} "
-                      f"(best: {unique_results[0]['_rerank_score']:.2f})")
-                filtered = unique_results[:7]
+    if not filtered:
+        print(f"   ⚠️ No docs above threshold {MIN_RELEVANCE_SCORE} "
+              f"(best: {unique_results[0]['_rerank_score']:.2f})")
+        filtered = unique_results[:7]
 
-            unique_results = filtered[:7]
-            top_score = unique_results[0]['_rerank_score']
-            print(f"   ✅ Kept {len(unique_results)} docs (top score: {top_score:.4f})")
+    kept = filtered[:7]
+    top_score = kept[0]['_rerank_score']
+    print(f"   ✅ Kept {len(kept)} docs (top score: {top_score:.4f})")
+    return kept, top_score
 
-        except Exception as e:
-            print(f"   ⚠️ Reranking failed: {e}")
-            unique_results = unique_results[:7]
 
-    # --- 4. FORMAT RESULTS ---
+def _format_results(unique_results: List[Dict]) -> tuple:
     docs = []
     sources = []
     for res in unique_results:
@@ -519,25 +609,30 @@ def retrieve_node(state: AgentState):
 
         docs.append(f"[Source: {source} | Section: {section} | Pg {page} | Score: {score:.2f}]\n{text}")
         sources.append(f"{source}:Pg{page}")
+    return docs, sources
+
 
-    # --- 5. GRAPH SEARCH (only when LLM extracted real entities) ---
+async def _agraph_search(graph_builder, kb, question: str, selected_docs: List[str]) -> str:
     # Keyword fallback removed — firing Neo4j on every simple question adds noise.
     # Accepted regression: queries where entity extraction yields nothing skip graph.
     print("   🧠 Extracting entities for graph search...")
-    entities = list(graph_builder.extract_query_entities(question))
-
-    if entities:
-        graph_context = kb.query_subgraph(
-            entities,
-            source_filter=selected_docs if selected_docs else None,
-        )
-        if graph_context:
-            docs.insert(0, f"--- RELEVANT GRAPH CONNECTIONS ---\n{graph_context}")
-            print(f"   🧠 Graph context added ({len(graph_context)} chars)")
-        else:
-            print(f"   ℹ️ No graph context found for entities: {entities}")
-    else:
+    entities = list(await graph_builder.aextract_query_entities(question))
+    if not entities:
         print("   ℹ️ No entities extracted — skipping graph search")
+        return ""
+    graph_context = await kb.aquery_subgraph(
+        entities,
+        source_filter=selected_docs if selected_docs else None,
+    )
+    if not graph_context:
+        print(f"   ℹ️ No graph context found for entities: {entities}")
+    return graph_context
+
+
+def _retrieval_result(docs: List[str], sources: List[str], graph_context: str, top_score: float) -> dict:
+    if graph_context:
+        docs.insert(0, f"--- RELEVANT GRAPH CONNECTIONS ---\n{graph_context}")
+        print(f"   🧠 Graph context added ({len(graph_context)} chars)")
 
     return {
         "documents":        docs,
@@ -546,36 +641,75 @@ def retrieve_node(state: AgentState):
     }
 
 
-# ---------------------------------------------------------------------------
-# NODE: generate_node
-# ---------------------------------------------------------------------------
-
-def generate_node(state: AgentState):
+async def aretrieve_node(state: AgentState):
     """
-    Detects math, executes code, injects result into LLM context, then
-    generates the answer using up to AGENT_MAX_CONTEXT_CHARS of context.
-    Feedback from the auditor is injected into BOTH system and user turns.
+    Retrieves for each sub-query, deduplicates, reranks, and optionally
+    runs graph search when real entities are extracted. Graph search runs as
+    a sibling task while the vector batch, dedup and rerank proceed.
+
+    Multi-entity widening: when multi_entity is True, base_k raises from
+    10 to 15 so per-sub-query limits cover both entity contexts.
     """
     svc = get_services()
-    llm           = svc["llm"]
-    math_executor = svc["math_executor"]
+    vector_db     = svc["vector_db"]
+    kb            = svc["kb"]
+    graph_builder = svc["graph_builder"]
+    reranker      = svc["reranker"]
 
-    print("--- ✍️ GENERATING ANSWER ---")
-    question  = state["question"]
-    documents = state["documents"]
-    history   = state["history"]
-    feedback  = state.get("audit_feedback", "")
+    plan = _retrieval_plan(state)
+    question = plan["question"]
 
-    # --- 1. MATH EXECUTION ---
-    math_context = ""
-    if math_executor.needs_math(question) and not feedback:
-        print("   🧮 Math question detected — running code execution...")
-        raw_context = "\n\n".join(documents[:15])
+    # --- 1. GRAPH SEARCH (sibling task) ---
+    graph_task = asyncio.create_task(
+        _agraph_search(graph_builder, kb, question, plan["selected_docs"])
+    )
+
+    # --- 2. VECTOR SEARCH (all sub-queries in one batch) ---
+    sub_queries = plan["sub_queries"]
+    try:
+        batch_results = await vector_db.ahybrid_search_batch(
+            sub_queries, limit=plan["limit"], filters=plan["filters"]
+        )
+    except BaseException:
+        graph_task.cancel()
+        raise
+
+    # --- 3. DEDUPLICATE ---
+    unique_results = _dedupe_results(_collect_vector_results(batch_results))
+    print(f"   📦 {len(unique_results)} unique candidates from {len(sub_queries)} queries")
+
+    # --- 4. RERANK ---
+    top_score = 0.0
+    if unique_results:
         try:
-            math_result = math_executor.process_math_question(question, raw_context)
-            if math_result and math_result.get('success'):
-                print(f"   ✅ Code Execution Success: {math_result['output']}")
-                math_context = f"""
+            print("   ⚖️  Reranking candidates...")
+            scores = await reranker.apredict([[question, r['text']] for r in unique_results])
+            unique_results, top_score = _apply_rerank_scores(unique_results, scores)
+        except Exception as e:
+            print(f"   ⚠️ Reranking failed: {e}")
+            unique_results = unique_results[:7]
+
+    # --- 5. FORMAT RESULTS ---
+    docs, sources = _format_results(unique_results)
+
+    # --- 6. MERGE GRAPH CONTEXT ---
+    try:
+        graph_context = await graph_task
+    except Exception as e:
+        print(f"   ⚠️ Graph search failed: {e}")
+        graph_context = ""
+
+    return _retrieval_result(docs, sources, graph_context, top_score)
+
+
+# ---------------------------------------------------------------------------
+# NODE: generate_node
+# ---------------------------------------------------------------------------
+
+def _math_context(math_result: Optional[Dict]) -> str:
+    if math_result and math_result.get('success'):
+        print(f"   ✅ Code Execution Success: {math_result['output']}")
+        return f"""
 [SYSTEM NOTE: TRUSTED CODE EXECUTION RESULT]
 The user asked for a calculation. A Python script verified this result:
 CALCULATED VALUE: {math_result['output']}
@@ -583,11 +717,17 @@ CALCULATED VALUE: {math_result['output']}
 MANDATORY INSTRUCTION: You must use this calculated value in your answer.
 Do not attempt to recalculate it mentally.
 """
-            else:
-                print(f"   ⚠️ Code execution failed/skipped: "
-                      f"{math_result.get('error') if math_result else 'Unknown'}")
-        except Exception as e:
-            print(f"   ⚠️ Math Executor Exception: {e}")
+    print(f"   ⚠️ Code execution failed/skipped: "
+          f"{math_result.get('error') if math_result else 'Unknown'}")
+    return ""
+
+
+def _generation_prompts(state: AgentState, math_context: str) -> tuple:
+    """Returns (system_prompt, user_prompt) for the answer-generation call."""
+    question  = state["question"]
+    documents = state["documents"]
+    history   = state["history"]
+    feedback  = state.get("audit_feedback", "")
 
     # --- 2. SMART CONTEXT PRUNING ---
     # Maximum chars of document context passed to the LLM.
@@ -670,12 +810,82 @@ DO NOT:
 {question}
 """
 
-    response = llm.generate(
-        prompt=user_prompt,
-        system_prompt=system_prompt,
-        max_tokens=8192,
-    )
-    return {"generation": response, "retry_count": state.get("retry_count", 0) + 1}
+    return system_prompt, user_prompt
+
+
+async def _astream_answer(llm, user_prompt: str, system_prompt: str, attempt: int) -> str:
+    """
+    Streams the answer to the graph's custom stream as it is generated.
+    Each attempt opens with a generation_start event so a client can discard the
+    tokens of an answer the auditor rejected.
+    """
+    write = get_stream_writer()
+    write({"event": "generation_start", "attempt": attempt})
+
+    parts = []
+    try:
+        async for delta in llm.astream_generate(
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            max_tokens=8192,
+        ):
+            parts.append(delta)
+            write({"event": "token", "text": delta})
+    except Exception as e:
+        if parts:
+            raise
+        # Nothing sent yet — the non-streaming call carries the retry policy.
+        print(f"   ⚠️ Streaming failed before first token, falling back: {e}")
+        response = await llm.async_generate(
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            max_tokens=8192,
+        )
+        write({"event": "token", "text": response})
+        return response
+
+    return "".join(parts).strip()
+
+
+async def agenerate_node(state: AgentState, config: RunnableConfig):
+    """
+    Detects math, executes code, injects result into LLM context, then
+    generates the answer using up to AGENT_MAX_CONTEXT_CHARS of context.
+    Feedback from the auditor is injected into BOTH system and user turns.
+    With configurable["stream_tokens"] set (/query/stream), the answer is
+    streamed token by token through the graph's custom stream.
+    """
+    svc = get_services()
+    llm           = svc["llm"]
+    math_executor = svc["math_executor"]
+
+    print("--- ✍️ GENERATING ANSWER ---")
+    question = state["question"]
+
+    # --- 1. MATH EXECUTION ---
+    # The sandbox is a subprocess pipeline — it stays on a worker thread.
+    math_context = ""
+    if math_executor.needs_math(question) and not state.get("audit_feedback", ""):
+        print("   🧮 Math question detected — running code execution...")
+        raw_context = "\n\n".join(state["documents"][:15])
+        try:
+            math_context = _math_context(
+                await math_executor.process_math_question_async(question, raw_context)
+            )
+        except Exception as e:
+            print(f"   ⚠️ Math Executor Exception: {e}")
+
+    system_prompt, user_prompt = _generation_prompts(state, math_context)
+    retry_count = state.get("retry_count", 0)
+    if (config or {}).get("configurable", {}).get("stream_tokens"):
+        response = await _astream_answer(llm, user_prompt, system_prompt, retry_count + 1)
+    else:
+        response = await llm.async_generate(
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            max_tokens=8192,
+        )
+    return {"generation": response, "retry_count": retry_count + 1}
 
 
 # ---------------------------------------------------------------------------
@@ -775,35 +985,16 @@ def check_source_explains_contradiction(context: str) -> tuple:
 # NODE: audit_node
 # ---------------------------------------------------------------------------
 
-def audit_node(state: AgentState):
-    """
-    Multi-stage auditor:
-      Stage 1 (fast, no LLM) — fabrication detection against ALL documents.
-                               Returns immediately on violation — no LLM call.
-      Stage 2 (constraint)   — logical predicate consistency check.
-                               Runs ONLY for explicit predicate questions.
-                               Skipped for factual/math/synthesis prompts where
-                               omission is not a contradiction.
-      Stage 3 (LLM)          — hallucination audit (only reached if 1+2 pass).
-
-    Pre-audit shortcut saves ~0.6 LLM calls per query on average.
-    """
-    svc = get_services()
-    llm                = svc["audit_llm"]
-    constraint_checker = svc["constraint_checker"]
-
-    print("--- 🕵️ AUDITING ANSWER ---")
-    question      = state["question"]
-    answer        = state["generation"]
-    question_type = state.get("question_type", "factual")
+def _audit_precheck(state: AgentState) -> Optional[dict]:
+    """Early exits before any LLM call — returns an audit result, or None to continue."""
+    question = state["question"]
+    answer   = state["generation"]
 
     if "I don't know" in answer or "not found" in answer.lower():
         return {"audit_feedback": ""}
 
-    all_docs = state["documents"]
     # Full context for fabrication detection AND audit — auditor must see all evidence
-    full_context  = "\n".join(all_docs)
-    audit_context = full_context
+    full_context = "\n".join(state["documents"])
 
     # --- STAGE 1: FAST FABRICATION PRE-CHECK (no LLM cost) ---
     print("   ⚡ Running fast fabrication pre-check...")
@@ -823,56 +1014,55 @@ def audit_node(state: AgentState):
             )
         }
 
-    # --- STAGE 2: CONSTRAINT CHECKING ---
-    # Run Stage 2 only for explicit predicate questions. Factual questions often
-    # receive short, correct answers that need not restate every retrieved fact.
-    # Treating omitted context as a constraint violation creates false retries and
-    # wastes query budget.
-    if question_type == "predicate":
-        print("   🔍 Extracting logic constraints...")
-        predicates = constraint_checker.extract_predicates(question, audit_context)
-
-        if predicates:
-            is_consistent, explanation = constraint_checker.check_consistency(predicates, audit_context)
-
-            if not is_consistent:
-                print(f"   ❌ INCONSISTENT: {explanation}")
-
-                source_explains, explanation_type = check_source_explains_contradiction(full_context)
-
-                if explanation_type == "documented_conflict":
-                    # Document itself flags this conflict — answer is correct to describe both sides.
-                    # Do NOT retry. Mark has_contradiction so main.py can signal the UI.
-                    print("   ✅ DOCUMENTED CONFLICT — answer correctly describes flagged inconsistency")
-                    return {"audit_feedback": "", "has_contradiction": True}
-
-                elif explanation_type == "revision":
-                    return {
-                        "audit_feedback": (
-                            f"CONTRADICTION DETECTED: {explanation}. "
-                            "The source provides a revision — use the corrected value."
-                        )
-                    }
-                else:
-                    return {
-                        "audit_feedback": (
-                            f"UNRESOLVED CONTRADICTION: {explanation}. "
-                            "The source does not explain this discrepancy. "
-                            "State this explicitly — DO NOT INVENT an explanation."
-                        )
-                    }
-
-            is_valid, violation = constraint_checker.validate_answer_against_constraints(answer, predicates)
-            if not is_valid and not violation.startswith("VALIDATION_ERROR:"):
-                print(f"   ❌ INVALID ANSWER: {violation}")
-                return {"audit_feedback": f"Answer violates logic constraint: {violation}"}
-    else:
-        print(f"   ⏭️  Stage 2 skipped — question_type={question_type}")
+    return None
 
-    # --- STAGE 3: STANDARD LLM HALLUCINATION AUDIT ---
-    # Only reached when fabrication pre-check passes AND no constraint violations.
-    # ~60-70% of clean answers never reach this stage.
-    print("   🔍 Running full LLM audit...")
+
+def _constraint_stage(constraint_checker, question: str, answer: str,
+                      audit_context: str) -> Optional[dict]:
+    """Stage 2 — returns an audit result on a constraint failure, else None."""
+    print("   🔍 Extracting logic constraints...")
+    predicates = constraint_checker.extract_predicates(question, audit_context)
+
+    if predicates:
+        is_consistent, explanation = constraint_checker.check_consistency(predicates, audit_context)
+
+        if not is_consistent:
+            print(f"   ❌ INCONSISTENT: {explanation}")
+
+            source_explains, explanation_type = check_source_explains_contradiction(audit_context)
+
+            if explanation_type == "documented_conflict":
+                # Document itself flags this conflict — answer is correct to describe both sides.
+                # Do NOT retry. Mark has_contradiction so main.py can signal the UI.
+                print("   ✅ DOCUMENTED CONFLICT — answer correctly describes flagged inconsistency")
+                return {"audit_feedback": "", "has_contradiction": True}
+
+            elif explanation_type == "revision":
+                return {
+                    "audit_feedback": (
+                        f"CONTRADICTION DETECTED: {explanation}. "
+                        "The source provides a revision — use the corrected value."
+                    )
+                }
+            else:
+                return {
+                    "audit_feedback": (
+                        f"UNRESOLVED CONTRADICTION: {explanation}. "
+                        "The source does not explain this discrepancy. "
+                        "State this explicitly — DO NOT INVENT an explanation."
+                    )
+                }
+
+        is_valid, violation = constraint_checker.validate_answer_against_constraints(answer, predicates)
+        if not is_valid and not violation.startswith("VALIDATION_ERROR:"):
+            print(f"   ❌ INVALID ANSWER: {violation}")
+            return {"audit_feedback": f"Answer violates logic constraint: {violation}"}
+
+    return None
+
+
+def _llm_audit_prompts(question: str, answer: str, audit_context: str) -> tuple:
+    """Stage 3 prompts — returns (system_prompt, user_prompt)."""
     auditor_system_prompt = """You are a Strict Quality Control Auditor.
 Check the 'Answer' against the 'Context'.
 
@@ -900,8 +1090,10 @@ If FAIL: Return a concise description of the error.
 {answer}
 """
 
-    audit_result = llm.generate(prompt=user_prompt, system_prompt=auditor_system_prompt)
+    return auditor_system_prompt, user_prompt
+
 
+def _audit_verdict(audit_result: str) -> dict:
     if "PASS" in audit_result.upper():
         print("   ✅ Audit PASSED")
         return {"audit_feedback": ""}
@@ -910,6 +1102,58 @@ If FAIL: Return a concise description of the error.
         return {"audit_feedback": audit_result}
 
 
+async def aaudit_node(state: AgentState):
+    """
+    Multi-stage auditor:
+      Stage 1 (fast, no LLM) — fabrication detection against ALL documents.
+                               Returns immediately on violation — no LLM call.
+      Stage 2 (constraint)   — logical predicate consistency check.
+                               Runs ONLY for explicit predicate questions.
+                               Skipped for factual/math/synthesis prompts where
+                               omission is not a contradiction. Several
+                               sequential sync LLM calls — runs on a worker thread.
+      Stage 3 (LLM)          — hallucination audit (only reached if 1+2 pass).
+
+    Pre-audit shortcut saves ~0.6 LLM calls per query on average.
+    """
+    svc = get_services()
+    llm                = svc["audit_llm"]
+    constraint_checker = svc["constraint_checker"]
+
+    print("--- 🕵️ AUDITING ANSWER ---")
+    question      = state["question"]
+    answer        = state["generation"]
+    question_type = state.get("question_type", "factual")
+
+    early = _audit_precheck(state)
+    if early is not None:
+        return early
+
+    audit_context = "\n".join(state["documents"])
+
+    # --- STAGE 2: CONSTRAINT CHECKING ---
+    # Run Stage 2 only for explicit predicate questions. Factual questions often
+    # receive short, correct answers that need not restate every retrieved fact.
+    # Treating omitted context as a constraint violation creates false retries and
+    # wastes query budget.
+    if question_type == "predicate":
+        verdict = await asyncio.to_thread(
+            _constraint_stage, constraint_checker, question, answer, audit_context
+        )
+        if verdict is not None:
+            return verdict
+    else:
+        print(f"   ⏭️  Stage 2 skipped — question_type={question_type}")
+
+    # --- STAGE 3: STANDARD LLM HALLUCINATION AUDIT ---
+    # Only reached when fabrication pre-check passes AND no constraint violations.
+    # ~60-70% of clean answers never reach this stage.
+    print("   🔍 Running full LLM audit...")
+    system_prompt, user_prompt = _llm_audit_prompts(question, answer, audit_context)
+    audit_result = await llm.async_generate(prompt=user_prompt, system_prompt=system_prompt)
+    return _audit_verdict(audit_result)
+
+
 # ---------------------------------------------------------------------------
 # CONDITIONAL EDGES
 # ---------------------------------------------------------------------------
@@ -928,24 +1172,42 @@ def decide_next_step(state: AgentState):
 # GRAPH ASSEMBLY
 # ---------------------------------------------------------------------------
 
-workflow = StateGraph(AgentState)
+def _build_graph(route, decompose, retrieve, generate, audit):
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("route",     route)
+    workflow.add_node("decompose", decompose)
+    workflow.add_node("retrieve",  retrieve)
+    workflow.add_node("generate",  generate)
+    workflow.add_node("audit",     audit)
+
+    workflow.set_entry_point("route")
+    workflow.add_edge("route",     "decompose")
+    workflow.add_edge("decompose", "retrieve")
+    workflow.add_edge("retrieve",  "generate")
+    workflow.add_edge("generate",  "audit")
+
+    workflow.add_conditional_edges(
+        "audit",
+        decide_next_step,
+        {"retry": "generate", "end": END}
+    )
 
-workflow.add_node("route",     route_question_node)
-workflow.add_node("decompose", decompose_query_node)
-workflow.add_node("retrieve",  retrieve_node)
-workflow.add_node("generate",  generate_node)
-workflow.add_node("audit",     audit_node)
+    return workflow.compile()
 
-workflow.set_entry_point("route")
-workflow.add_edge("route",     "decompose")
-workflow.add_edge("decompose", "retrieve")
-workflow.add_edge("retrieve",  "generate")
-workflow.add_edge("generate",  "audit")
 
-workflow.add_conditional_edges(
-    "audit",
-    decide_next_step,
-    {"retry": "generate", "end": END}
+# /query drives this with ainvoke() so an in-flight query holds no threadpool
+# thread while it waits on LLM, Qdrant, Neo4j or the reranker.
+async_app_graph = _build_graph(
+    aroute_question_node, adecompose_query_node, aretrieve_node, agenerate_node, aaudit_node,
 )
 
-app_graph = workflow.compile()
+
+class _SyncGraph:
+    """app_graph.invoke() for synchronous callers — runs async_app_graph on a fresh loop."""
+
+    def invoke(self, inputs: dict, config: Optional[RunnableConfig] = None) -> dict:
+        return asyncio.run(async_app_graph.ainvoke(inputs, config))
+
+
+app_graph = _SyncGraph()
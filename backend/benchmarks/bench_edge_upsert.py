@@ -0,0 +1,108 @@
+"""
+Benchmark: label-scoped vs unlabelled edge upserts against a live Neo4j.
+
+The legacy EDGE_UPSERT matched endpoints with `MATCH (a {name: ...})`, which
+cannot use an index and scans every node in the store. The current template
+puts the node label on both sides so the planner uses the per-label name index.
+
+Seeds N Person/Organization nodes, then times the same edge batch with both
+templates. Everything it writes is tagged with BENCH_DOC and removed at the end.
+
+Usage (from backend/):
+    NEO4J_PASSWORD=... python benchmarks/bench_edge_upsert.py [--sizes 1000 10000 50000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from knowledge_graph import KnowledgeBase  # noqa: E402
+
+BENCH_DOC = "__bench_edge_upsert__"
+EDGE_SAMPLE = 200
+
+LEGACY_EDGE_UPSERT = """
+MATCH (a {name: $source_name})
+MATCH (b {name: $target_name})
+MERGE (a)-[r:BENCH_WORKS_AT]->(b)
+ON CREATE SET r.document_id = $document_id
+"""
+
+LABELLED_EDGE_UPSERT = """
+MATCH (a:Person {name: $source_name})
+MATCH (b:Organization {name: $target_name})
+MERGE (a)-[r:BENCH_WORKS_AT]->(b)
+ON CREATE SET r.document_id = $document_id
+"""
+
+SEED_NODES = """
+UNWIND range(0, $n - 1) AS i
+MERGE (p:Person {name: 'Bench Person ' + i})
+  ON CREATE SET p.document_id = $document_id
+MERGE (o:Organization {name: 'Bench Org ' + i})
+  ON CREATE SET o.document_id = $document_id
+"""
+
+CLEANUP = """
+MATCH (n {document_id: $document_id})
+CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 5000 ROWS
+"""
+
+DROP_EDGES = "MATCH ()-[r:BENCH_WORKS_AT]->() DELETE r"
+
+
+def _time_edges(session, query: str, n: int) -> list:
+    timings = []
+    step = max(1, n // EDGE_SAMPLE)
+    for i in range(0, n, step):
+        start = time.perf_counter()
+        session.run(
+            query,
+            source_name=f"Bench Person {i}",
+            target_name=f"Bench Org {i}",
+            document_id=BENCH_DOC,
+        ).consume()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(timings: list) -> str:
+    ordered = sorted(timings)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(ordered):7.2f} ms | p50 {p50:7.2f} ms | p95 {p95:7.2f} ms"
+
+
+def run(sizes: list) -> None:
+    kb = KnowledgeBase()
+    if not kb.driver:
+        print("❌ Neo4j unavailable — check NEO4J_URI / NEO4J_PASSWORD")
+        return
+
+    try:
+        for n in sizes:
+            print(f"\n📊 {n:,} nodes per label")
+            with kb.driver.session() as session:
+                session.run(SEED_NODES, n=n, document_id=BENCH_DOC).consume()
+
+                for label, query in (("unlabelled", LEGACY_EDGE_UPSERT),
+                                     ("labelled", LABELLED_EDGE_UPSERT)):
+                    session.run(DROP_EDGES).consume()
+                    timings = _time_edges(session, query, n)
+                    print(f"   {label:<11} {_summary(timings)}")
+    finally:
+        with kb.driver.session() as session:
+            session.run(DROP_EDGES).consume()
+            session.run(CLEANUP, document_id=BENCH_DOC).consume()
+        kb.close()
+        print("\n🧹 Benchmark data removed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    run(parser.parse_args().sizes)
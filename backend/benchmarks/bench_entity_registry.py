@@ -0,0 +1,176 @@
+"""
+Benchmark: blocked cdist entity clustering vs the legacy pairwise loop.
+
+The legacy _build_entity_registry scored every name against every other name
+with fuzz.token_sort_ratio in a Python double loop. The current version finds
+candidate pairs with length-banded rapidfuzz cdist and replays the same greedy
+clustering inside union-find components. Both are run on the same synthetic
+Person/Organization names and their outputs are checked for equality.
+
+The legacy loop is O(n²) Python calls, so it only runs up to --legacy-max names.
+
+No services needed — runs entirely locally.
+
+Usage (from backend/):
+    python benchmarks/bench_entity_registry.py [--sizes 1000 10000 50000] [--legacy-max 10000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import graph_agent  # noqa: E402
+from graph_agent import _build_entity_registry, _person_name_parts, should_block_merge  # noqa: E402
+
+FIRST = ["Sarah", "James", "Maria", "Wei", "Olu", "Priya", "Gerald", "Anna", "Tom",
+         "Fatima", "Lucas", "Ingrid", "Kenji", "Rosa", "Ahmed", "Elena", "Noah", "Zara"]
+SYLLABLES = ["an", "ber", "cha", "dor", "el", "fon", "gar", "hal", "ik", "jor", "kov",
+             "lan", "mor", "nak", "ost", "per", "quin", "ros", "sten", "tor", "ul", "vik",
+             "wen", "xan", "yor", "zel"]
+TITLES = ["Dr. ", "Prof. ", "Ms. ", "Mr. "]
+ORG_SUFFIX = ["Systems", "Holdings", "Capital", "Labs", "Partners", "Group", "Industries"]
+ORG_FORM = [" Inc.", " LLC", " Ltd.", " Corporation", ", Inc."]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+
+def _synthetic_graph(n: int, seed: int = 7) -> dict:
+    """
+    n unique names: identities with 1-4 surface forms each, the way a long
+    document mentions them — "Dr. Sarah Vikostel", "Sarah Vikostel",
+    "S. Vikostel", "Vikostel" / "Helixor Capital", "Helixor Capital Inc."
+    """
+    rng = random.Random(seed)
+    names = {}
+    while len(names) < n:
+        if rng.random() < 0.6:
+            first, last = rng.choice(FIRST), _word(rng)
+            forms = [f"{first} {last}", f"{rng.choice(TITLES)}{first} {last}",
+                     f"{first[0]}. {last}", last]
+            kind = "Person"
+        else:
+            base = f"{_word(rng)} {rng.choice(ORG_SUFFIX)}"
+            forms = [base] + [base + form for form in ORG_FORM]
+            kind = "Organization"
+        for name in rng.sample(forms, rng.randint(1, 4)):
+            names.setdefault(name, kind)
+    nodes = [{"id": str(i), "name": name, "type": t, "properties": {}}
+             for i, (name, t) in enumerate(list(names.items())[:n])]
+    return {"nodes": nodes, "edges": []}
+
+
+def legacy_build_entity_registry(all_graphs, target_types=None):
+    """The pre-blocking implementation, kept verbatim for comparison."""
+    from rapidfuzz import fuzz
+
+    if target_types is None:
+        target_types = {"Person", "Organization"}
+
+    name_set = {}
+    for graph in all_graphs:
+        for node in graph.get("nodes", []):
+            if node["type"] in target_types:
+                name_set[node["name"]] = node["type"]
+
+    names = list(name_set.keys())
+    if len(names) < 2:
+        return {}, []
+
+    assigned = set()
+    clusters = []
+
+    for i, name_a in enumerate(names):
+        if name_a in assigned:
+            continue
+        cluster = [name_a]
+        assigned.add(name_a)
+        for name_b in names[i + 1:]:
+            if name_b in assigned:
+                continue
+            if fuzz.token_sort_ratio(name_a, name_b) >= 60:
+                if name_set.get(name_a) == "Person" and name_set.get(name_b) == "Person":
+                    if should_block_merge(name_a, name_b):
+                        continue
+                cluster.append(name_b)
+                assigned.add(name_b)
+
+        if len(cluster) > 1:
+            has_conflict = any(
+                name_set.get(x) == "Person"
+                and name_set.get(y) == "Person"
+                and should_block_merge(x, y)
+                for x, y in combinations(cluster, 2)
+            )
+            if has_conflict:
+                for name in cluster[1:]:
+                    assigned.discard(name)
+                continue
+            clusters.append(cluster)
+
+    auto_registry = {}
+    ambiguous_clusters = []
+    for cluster in clusters:
+        max_sim = max(
+            fuzz.token_sort_ratio(cluster[i], cluster[j])
+            for i in range(len(cluster))
+            for j in range(i + 1, len(cluster))
+        )
+        canonical = max(cluster, key=len)
+        if max_sim >= 85:
+            for name in cluster:
+                if name != canonical:
+                    auto_registry[name] = canonical
+        else:
+            ambiguous_clusters.append(cluster)
+
+    return auto_registry, ambiguous_clusters
+
+
+def _timed(fn, graphs):
+    _person_name_parts.cache_clear()  # cold name-parse cache for both runs
+    start = time.perf_counter()
+    result = fn(graphs)
+    return result, time.perf_counter() - start
+
+
+def run(sizes: list, legacy_max: int) -> None:
+    logging.disable(logging.INFO)  # per-merge log lines would dominate the timing
+
+    for n in sizes:
+        graphs = [_synthetic_graph(n)]
+        print(f"\n📊 {n:,} names")
+
+        (auto, ambiguous), t_new = _timed(_build_entity_registry, graphs)
+        print(f"   {'blocked':<8} {t_new:8.2f} s  "
+              f"({len(auto)} auto-merged, {len(ambiguous)} ambiguous clusters)")
+
+        if n > legacy_max:
+            print(f"   {'legacy':<8}  skipped (> --legacy-max {legacy_max:,})")
+            continue
+
+        # The legacy path also parsed every name with HumanName on every
+        # should_block_merge call — run it without the per-name parse cache.
+        graph_agent._person_name_parts = _person_name_parts.__wrapped__
+        try:
+            legacy, t_old = _timed(legacy_build_entity_registry, graphs)
+        finally:
+            graph_agent._person_name_parts = _person_name_parts
+        identical = legacy == (auto, ambiguous)
+        print(f"   {'legacy':<8} {t_old:8.2f} s  "
+              f"→ {t_old / t_new:.1f}x | identical output: {'✅' if identical else '❌'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
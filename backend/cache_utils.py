@@ -0,0 +1,632 @@
+import os
+import time
+import asyncio
+import hashlib
+import inspect
+import json
+import functools
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Sequence, Hashable
+
+import numpy as np
+
+# ── Embedding cache configuration ─────────────────────────────────────────────
+# Content-addressed: key = (embed model, dimension, sha256(text)).
+# Re-ingesting an unchanged document hits the cache for every chunk and only
+# the misses are sent to the NIM API.
+#
+# EMBED_CACHE_BACKEND:
+#   disk  — local diskcache store, LRU-evicted once EMBED_CACHE_SIZE_MB is hit (default)
+#   redis — shared across API + worker pods, entries expire after EMBED_CACHE_TTL_S.
+#           Stored in the cache Redis at CACHE_REDIS_URL, never the Celery broker.
+#   off   — no caching
+# EMBED_CACHE_DTYPE: float32 (exact) or float16 (half the bytes, ~1e-3 error —
+#   harmless for cosine search on L2-normalised vectors).
+EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "disk").lower()
+EMBED_CACHE_DIR     = os.getenv("EMBED_CACHE_DIR", "/tmp/documind_embed_cache")
+EMBED_CACHE_SIZE_MB = int(os.getenv("EMBED_CACHE_SIZE_MB", "2048"))
+EMBED_CACHE_TTL_S   = int(os.getenv("EMBED_CACHE_TTL_S", str(30 * 24 * 3600)))
+EMBED_CACHE_DTYPE   = os.getenv("EMBED_CACHE_DTYPE", "float32").lower()
+
+# Counters are mirrored here so the API process can report hits from workers.
+EMBED_CACHE_STATS_KEY = "documind:metrics:embed_cache"
+
+# ── Graph extraction cache configuration ──────────────────────────────────────
+# Key = (extraction model, prompt version, sha256(chunk text)) → validated
+# {nodes, edges} without per-document provenance. Re-ingests and unchanged
+# sections of a new contract version skip the extraction LLM entirely.
+# Same backends and eviction as the embedding cache: disk = LRU capped at
+# EXTRACT_CACHE_SIZE_MB, redis = TTL (plus the cache Redis's maxmemory policy).
+EXTRACT_CACHE_BACKEND = os.getenv("EXTRACT_CACHE_BACKEND", "disk").lower()
+EXTRACT_CACHE_DIR     = os.getenv("EXTRACT_CACHE_DIR", "/tmp/documind_extract_cache")
+EXTRACT_CACHE_SIZE_MB = int(os.getenv("EXTRACT_CACHE_SIZE_MB", "1024"))
+EXTRACT_CACHE_TTL_S   = int(os.getenv("EXTRACT_CACHE_TTL_S", str(90 * 24 * 3600)))
+
+EXTRACT_CACHE_STATS_KEY = "documind:metrics:extract_cache"
+
+# ── Query-path caches (in-process) ────────────────────────────────────────────
+# L1: normalised query text → dense query vector (never stale for a fixed model)
+# L2: (query, filters, limit, collection generation) → fused RRF hits
+QUERY_VECTOR_CACHE_SIZE  = int(os.getenv("QUERY_VECTOR_CACHE_SIZE", "2048"))
+QUERY_VECTOR_CACHE_TTL_S = int(os.getenv("QUERY_VECTOR_CACHE_TTL_S", str(24 * 3600)))
+SEARCH_CACHE_SIZE        = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL_S       = int(os.getenv("SEARCH_CACHE_TTL_S", "600"))
+# Graph: (keywords, doc filter) → formatted subgraph, invalidated per document
+SUBGRAPH_CACHE_SIZE      = int(os.getenv("SUBGRAPH_CACHE_SIZE", "1024"))
+SUBGRAPH_CACHE_TTL_S     = int(os.getenv("SUBGRAPH_CACHE_TTL_S", "3600"))
+
+
+# ── In-process TTL cache ──────────────────────────────────────────────────────
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry TTL. maxsize <= 0 disables caching."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ── Request coalescing ────────────────────────────────────────────────────────
+# A cache only helps once the first call has finished. SingleFlight covers the
+# window before that: callers asking for the same key while a call is in flight
+# wait for it instead of issuing their own. Sync callers (threads) and async
+# callers (tasks on any loop) share the same in-flight table.
+
+_flights: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent identical calls within this process.
+
+    The first caller for a key runs the call; everyone arriving before it
+    completes receives the same result or exception. Nothing is remembered
+    afterwards — pair it with a cache for that.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, tuple] = {}  # key → (future, leader's loop or None)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        _flights[name] = self
+
+    def _join(self, key: Hashable, loop=None):
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                return entry, False
+            entry = (concurrent.futures.Future(), loop)
+            self._calls[key] = entry
+            self.calls += 1
+            return entry, True
+
+    def _settle(self, key: Hashable, future: concurrent.futures.Future,
+                result: Any = None, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn, *args, **kwargs) -> Any:
+        """Blocking form: run fn(*args, **kwargs) or wait for the in-flight call."""
+        (future, leader_loop), leader = self._join(key)
+        if not leader:
+            if leader_loop is not None and leader_loop is _running_loop():
+                # Blocking here would stall the loop the in-flight call needs
+                return fn(*args, **kwargs)
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, exc=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ado(self, key: Hashable, coro_fn, *args, **kwargs) -> Any:
+        """
+        Async form: await coro_fn(*args, **kwargs) or the in-flight call.
+        The call runs as its own task, so cancelling the caller that started
+        it does not cancel it for the others.
+        """
+        (future, _), leader = self._join(key, asyncio.get_running_loop())
+        if leader:
+            try:
+                task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            except BaseException as e:
+                self._settle(key, future, exc=e)
+                raise
+
+            def _done(t: asyncio.Task) -> None:
+                if t.cancelled():
+                    self._settle(key, future, exc=asyncio.CancelledError())
+                elif t.exception() is not None:
+                    self._settle(key, future, exc=t.exception())
+                else:
+                    self._settle(key, future, t.result())
+
+            task.add_done_callback(_done)
+        # shield: a cancelled waiter must not cancel the shared future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def singleflight(flight: SingleFlight, key_fn):
+    """
+    Decorator form for methods: key_fn receives the call's arguments.
+    Sync and async methods sharing a flight and key coalesce with each other.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await flight.ado(key_fn(*args, **kwargs), fn, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key_fn(*args, **kwargs), fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def singleflight_stats() -> Dict[str, Dict]:
+    """Per-flight call and coalesce counts for this process."""
+    return {name: flight.stats() for name, flight in _flights.items()}
+
+
+# ── Generation counters ───────────────────────────────────────────────────────
+
+class GenerationCounter:
+    """
+    Monotonic version number for a data set, used to invalidate derived caches.
+
+    Stored in Redis so a bump in a Celery worker is seen by the API process.
+    Without Redis it degrades to a per-process counter.
+    """
+
+    def __init__(self, key: str, client=None):
+        self.key = key
+        self._client = client
+        self._local = 0
+
+    def current(self) -> int:
+        if self._client is not None:
+            try:
+                return int(self._client.get(self.key) or 0)
+            except Exception:
+                pass
+        return self._local
+
+    def bump(self) -> int:
+        self._local += 1
+        if self._client is not None:
+            try:
+                return int(self._client.incr(self.key))
+            except Exception as e:
+                print(f"⚠️ Could not bump cache generation {self.key}: {e}")
+        return self._local
+
+
+class KeyedGenerations:
+    """
+    A generation counter per field (document id, name token, ...) in one Redis
+    hash, so a cache entry can record the versions of exactly what it was
+    built from and be invalidated only when one of those changes.
+    Without Redis it degrades to per-process counters.
+    """
+
+    def __init__(self, key: str, client=None):
+        self.key = key
+        self._client = client
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def current(self, fields: Sequence[str]) -> Dict[str, int]:
+        fields = list(dict.fromkeys(fields))
+        if not fields:
+            return {}
+        if self._client is not None:
+            try:
+                values = self._client.hmget(self.key, fields)
+                return {f: int(v or 0) for f, v in zip(fields, values)}
+            except Exception:
+                pass
+        with self._lock:
+            return {f: self._local.get(f, 0) for f in fields}
+
+    def bump(self, fields: Sequence[str]) -> None:
+        fields = list(dict.fromkeys(fields))
+        if not fields:
+            return
+        with self._lock:
+            for f in fields:
+                self._local[f] = self._local.get(f, 0) + 1
+        if self._client is not None:
+            try:
+                with self._client.pipeline(transaction=False) as pipe:
+                    for f in fields:
+                        pipe.hincrby(self.key, f, 1)
+                    pipe.execute()
+            except Exception as e:
+                print(f"⚠️ Could not bump cache generations {self.key}: {e}")
+
+
+# ── Blob stores ───────────────────────────────────────────────────────────────
+
+class DiskBlobStore:
+    """Local LRU byte store backed by diskcache. Safe across processes on one host."""
+
+    def __init__(self, directory: str, size_limit_mb: int):
+        import diskcache
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit_mb * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+        self.name = "disk"
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self._cache.get(k) for k in keys]
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        for k, v in items.items():
+            self._cache.set(k, v)
+
+
+class RedisBlobStore:
+    """Shared byte store in Redis. Bounded by TTL and the server's maxmemory policy."""
+
+    def __init__(self, client, ttl_s: int):
+        self._client = client
+        self._ttl_s = ttl_s
+        self.name = "redis"
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return self._client.mget(list(keys))
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        with self._client.pipeline(transaction=False) as pipe:
+            for k, v in items.items():
+                pipe.setex(k, self._ttl_s, v)
+            pipe.execute()
+
+
+def get_redis_client(decode_responses: bool = False):
+    """Return a connected Redis client, or None if REDIS_URL is unreachable."""
+    import redis
+    try:
+        client = redis.Redis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=decode_responses,
+        )
+        client.ping()
+        return client
+    except Exception as e:
+        print(f"⚠️ Redis not available for caching: {e}")
+        return None
+
+
+# ── Cache Redis ───────────────────────────────────────────────────────────────
+# Blob caches (embeddings, extractions, LLM responses) are large and long-lived,
+# so they go to their own Redis with a maxmemory cap and allkeys-lru — never to
+# REDIS_URL, which is the Celery broker and holds state that must not be evicted.
+# Unset: backend=redis caches fall back to disk / in-process.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+_cache_redis_client = None
+_cache_redis_lock = threading.Lock()
+
+
+def get_cache_redis_client():
+    """Shared client for CACHE_REDIS_URL, or None if unset or unreachable."""
+    global _cache_redis_client
+    if not CACHE_REDIS_URL:
+        return None
+    with _cache_redis_lock:
+        if _cache_redis_client is None:
+            import redis
+            try:
+                client = redis.Redis.from_url(CACHE_REDIS_URL)
+                client.ping()
+                _cache_redis_client = client
+            except Exception as e:
+                print(f"⚠️ Cache Redis not available: {e}")
+        return _cache_redis_client
+
+
+def _build_blob_store(backend: str, directory: str, size_mb: int, ttl_s: int, label: str):
+    """Disk or Redis blob store for a content-addressed cache; None if disabled."""
+    if backend == "off":
+        return None
+    try:
+        if backend == "redis":
+            cache_client = get_cache_redis_client()
+            if cache_client is not None:
+                return RedisBlobStore(cache_client, ttl_s)
+            print(f"⚠️ {label} backend=redis but no cache Redis (CACHE_REDIS_URL) — falling back to disk")
+        return DiskBlobStore(directory, size_mb)
+    except Exception as e:
+        print(f"⚠️ {label} disabled: {e}")
+        return None
+
+
+class _SharedCounters:
+    """Hit/miss counters mirrored to a Redis hash so every process can report them."""
+
+    stats_key = ""
+
+    def _publish(self, ints: Dict[str, int], floats: Dict[str, float]) -> None:
+        if not self._stats_client:
+            return
+        try:
+            with self._stats_client.pipeline(transaction=False) as pipe:
+                for field, value in ints.items():
+                    if value:
+                        pipe.hincrby(self.stats_key, field, value)
+                for field, value in floats.items():
+                    if value:
+                        pipe.hincrbyfloat(self.stats_key, field, value)
+                pipe.execute()
+        except Exception:
+            pass  # metrics are best-effort
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        self._publish({"hits": hits, "misses": misses}, {})
+
+
+# ── Embedding cache ───────────────────────────────────────────────────────────
+
+class EmbeddingCache(_SharedCounters):
+    """
+    Content-addressed passage-embedding cache.
+
+    Vectors are stored as raw float32/float16 bytes. The dtype is recovered
+    from the blob length (dim * 4 or dim * 2), so changing EMBED_CACHE_DTYPE
+    does not invalidate existing entries.
+    """
+
+    stats_key = EMBED_CACHE_STATS_KEY
+
+    def __init__(self, model: str, dim: int, store, dtype: str = "float32",
+                 stats_client=None):
+        self.model = model
+        self.dim = dim
+        self.store = store
+        self.dtype = np.float16 if dtype == "float16" else np.float32
+        self._stats_client = stats_client
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.api_seconds = 0.0
+        self.api_texts = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"documind:emb:{self.model}:{self.dim}:{digest}"
+
+    def _encode(self, vector: List[float]) -> bytes:
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def _decode(self, blob: bytes) -> Optional[List[float]]:
+        if len(blob) == self.dim * 4:
+            dtype = np.float32
+        elif len(blob) == self.dim * 2:
+            dtype = np.float16
+        else:
+            return None  # truncated or foreign entry — treat as a miss
+        return np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors aligned with texts; None marks a miss."""
+        try:
+            blobs = self.store.get_many([self._key(t) for t in texts])
+        except Exception as e:
+            print(f"⚠️ Embedding cache read failed: {e}")
+            blobs = [None] * len(texts)
+
+        vectors = [self._decode(b) if b is not None else None for b in blobs]
+        hits = sum(1 for v in vectors if v is not None)
+        self._count(hits=hits, misses=len(texts) - hits)
+        return vectors
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[List[float]]) -> None:
+        try:
+            self.store.set_many({
+                self._key(t): self._encode(v) for t, v in zip(texts, vectors)
+            })
+        except Exception as e:
+            print(f"⚠️ Embedding cache write failed: {e}")
+
+    def record_api_call(self, n_texts: int, seconds: float) -> None:
+        """Track real API latency so saved time can be estimated per hit."""
+        with self._lock:
+            self.api_texts += n_texts
+            self.api_seconds += seconds
+        self._publish({"api_texts": n_texts}, {"api_seconds": seconds})
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            per_text = self.api_seconds / self.api_texts if self.api_texts else 0.0
+            return {
+                "backend": self.store.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "api_seconds": round(self.api_seconds, 3),
+                "api_seconds_saved_est": round(self.hits * per_text, 3),
+            }
+
+
+def read_shared_stats(client, key: str) -> Dict:
+    """Read a Redis metrics hash written via HINCRBY/HINCRBYFLOAT."""
+    if client is None:
+        return {}
+    try:
+        raw = client.hgetall(key)
+    except Exception:
+        return {}
+    stats = {}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = value.decode() if isinstance(value, bytes) else value
+        stats[field] = float(value) if "." in value else int(value)
+    return stats
+
+
+def build_embedding_cache(model: str, dim: int, redis_client=None) -> Optional[EmbeddingCache]:
+    """Construct the configured embedding cache, or None when disabled/unavailable."""
+    store = _build_blob_store(EMBED_CACHE_BACKEND, EMBED_CACHE_DIR, EMBED_CACHE_SIZE_MB,
+                              EMBED_CACHE_TTL_S, "Embedding cache")
+    if store is None:
+        return None
+
+    print(f"💾 Embedding cache: {store.name} ({EMBED_CACHE_DTYPE})")
+    return EmbeddingCache(model, dim, store, EMBED_CACHE_DTYPE, stats_client=redis_client)
+
+
+# ── Graph extraction cache ────────────────────────────────────────────────────
+
+class ExtractionCache(_SharedCounters):
+    """
+    Content-addressed cache of validated graph extractions.
+
+    Entries hold the graph exactly as _validate_graph returned it, before
+    document_id / chunk_id are stamped — callers re-stamp on every hit, so one
+    entry serves any document containing the same chunk text.
+    """
+
+    stats_key = EXTRACT_CACHE_STATS_KEY
+
+    def __init__(self, model: str, prompt_version: str, store, stats_client=None):
+        self.model = model
+        self.prompt_version = prompt_version
+        self.store = store
+        self._stats_client = stats_client
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"documind:extract:{self.model}:{self.prompt_version}:{digest}"
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[Dict]]:
+        """Return cached graphs aligned with texts; None marks a miss."""
+        try:
+            blobs = self.store.get_many([self._key(t) for t in texts])
+        except Exception as e:
+            print(f"⚠️ Extraction cache read failed: {e}")
+            blobs = [None] * len(texts)
+
+        graphs = []
+        for blob in blobs:
+            try:
+                graph = json.loads(blob) if blob is not None else None
+            except ValueError:
+                graph = None  # corrupt entry — treat as a miss
+            graphs.append(graph)
+        hits = sum(1 for g in graphs if g is not None)
+        self._count(hits=hits, misses=len(texts) - hits)
+        return graphs
+
+    def put(self, text: str, graph: Dict) -> None:
+        try:
+            self.store.set_many({self._key(text): json.dumps(graph).encode("utf-8")})
+        except Exception as e:
+            print(f"⚠️ Extraction cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.store.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def build_extraction_cache(model: str, prompt_version: str,
+                           redis_client=None) -> Optional[ExtractionCache]:
+    """Construct the configured extraction cache, or None when disabled/unavailable."""
+    store = _build_blob_store(EXTRACT_CACHE_BACKEND, EXTRACT_CACHE_DIR, EXTRACT_CACHE_SIZE_MB,
+                              EXTRACT_CACHE_TTL_S, "Extraction cache")
+    if store is None:
+        return None
+
+    print(f"💾 Extraction cache: {store.name} (prompt {prompt_version})")
+    return ExtractionCache(model, prompt_version, store, stats_client=redis_client)
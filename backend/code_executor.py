@@ -3,14 +3,22 @@ Code Execution Layer for DocuMind
 Prevents LLM arithmetic hallucinations by forcing Python code execution.
 """
 
+import ast
 import asyncio
+import atexit
 import hashlib
 import json
+import operator
 import os
 import re
+import queue
 import resource
+import select
+import signal
 import subprocess
 import tempfile
+import threading
+import time
 from typing import Dict, List, Optional
 
 # ---------------------------------------------------------------------------
@@ -48,6 +56,427 @@ def _set_subprocess_limits():
 # so a permissions failure doesn't crash the module at import time.
 _SANDBOX_TMP_DIR = os.getenv("MATH_SANDBOX_TMP_DIR", "/tmp/documind_sandbox")
 
+# ---------------------------------------------------------------------------
+# Sandbox worker pool
+# Spawning a fresh interpreter per execution costs 40–80 ms before any
+# arithmetic runs. The pool keeps MATH_SANDBOX_POOL_SIZE long-lived python3
+# template workers with the usual modules already imported. A template never
+# runs generated code itself: for every execution it fork()s a fresh child,
+# which closes the reply channel and request pipe before exec, so nothing a
+# run does (monkey-patching, leftover modules, writes to the channel) can
+# reach the template or later runs. A template is replaced after
+# MATH_SANDBOX_MAX_RUNS executions, on any crash, and on any timeout.
+# MATH_SANDBOX_POOL_SIZE=0 restores spawn-per-call.
+# ---------------------------------------------------------------------------
+MATH_SANDBOX_POOL_SIZE = int(os.getenv("MATH_SANDBOX_POOL_SIZE", "2"))
+MATH_SANDBOX_MAX_RUNS  = int(os.getenv("MATH_SANDBOX_MAX_RUNS", "50"))
+
+_SANDBOX_CPU_S = 10  # per-execution CPU cap, same as _set_subprocess_limits
+
+
+def _set_pool_worker_limits():
+    """
+    preexec_fn for pool templates. RLIMIT_AS matches _set_subprocess_limits
+    and is inherited by every forked child. CPU time is counted per process,
+    so each child sets its own 10s RLIMIT_CPU after fork — the same budget
+    as a fresh process.
+    """
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (256 * 1024 * 1024, 256 * 1024 * 1024))
+    except Exception:
+        pass  # Non-Linux or insufficient permissions — degrade gracefully
+
+
+# Runs inside each template. Protocol: one JSON request per stdin line
+# ({"code": ...}), one JSON reply per line on a private dup of fd 1. The
+# template forks a child per request; the child gets fresh pipes on fd 1/2,
+# /dev/null on fd 0 and no other descriptors, runs the code and exits. The
+# template reads the raw output, reaps the child and serializes the reply —
+# executed code only ever runs in a throwaway process.
+_WORKER_SOURCE = r"""
+import ctypes, io, json, os, resource, select, sys, traceback
+import math, statistics, decimal, fractions  # warm the usual imports
+
+CPU_S = int(sys.argv[1])
+channel = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 1)
+os.dup2(devnull, 2)
+try:
+    # Not ptrace-able and /proc/<pid>/fd not reopenable by the children
+    ctypes.CDLL(None).prctl(4, 0, 0, 0, 0)  # PR_SET_DUMPABLE
+except Exception:
+    pass
+
+def run_child(code, out_w, err_w):
+    os.dup2(devnull, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (CPU_S, CPU_S))
+    except Exception:
+        pass
+    sys.stdin = open(os.devnull)
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), write_through=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), write_through=True)
+    status = 0
+    try:
+        exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__"})
+    except SystemExit as e:
+        status = 0 if e.code in (None, 0) else 1
+    except BaseException:
+        status = 1
+        traceback.print_exc()
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status)
+
+def drain(out_r, err_r):
+    bufs = {out_r: [], err_r: []}
+    open_fds = [out_r, err_r]
+    while open_fds:
+        for fd in select.select(open_fds, [], [])[0]:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                bufs[fd].append(chunk)
+            else:
+                open_fds.remove(fd)
+                os.close(fd)
+    return (b"".join(bufs[out_r]).decode(errors="replace"),
+            b"".join(bufs[err_r]).decode(errors="replace"))
+
+for line in sys.stdin:
+    code = json.loads(line)["code"]
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        run_child(code, out_w, err_w)
+    os.close(out_w)
+    os.close(err_w)
+    stdout, stderr = drain(out_r, err_r)
+    _, wait_status = os.waitpid(pid, 0)
+    ok = os.WIFEXITED(wait_status) and os.WEXITSTATUS(wait_status) == 0
+    if os.WIFSIGNALED(wait_status):
+        stderr += "sandbox child killed by signal %d\n" % os.WTERMSIG(wait_status)
+    channel.write(json.dumps({"ok": ok, "stdout": stdout, "stderr": stderr}) + "\n")
+    channel.flush()
+"""
+
+
+class SandboxCrashed(Exception):
+    """The worker exited or broke protocol mid-execution."""
+
+
+class _SandboxWorker:
+    """One long-lived template interpreter; each run happens in a forked child."""
+
+    def __init__(self, sandbox_dir: str):
+        self.proc = subprocess.Popen(
+            ["python3", "-c", _WORKER_SOURCE, str(_SANDBOX_CPU_S)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=sandbox_dir,
+            preexec_fn=_set_pool_worker_limits,
+            start_new_session=True,  # close() kills the template and its children together
+        )
+        self.runs = 0
+
+    def run(self, code: str, timeout: float) -> Dict:
+        self.runs += 1
+        try:
+            self.proc.stdin.write((json.dumps({"code": code}) + "\n").encode())
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise SandboxCrashed(str(e))
+
+        fd = self.proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        buf = b""
+        while not buf.endswith(b"\n"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise subprocess.TimeoutExpired("sandbox", timeout)
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise SandboxCrashed(f"worker exited (code {self._exit_code()})")
+            buf += chunk
+        try:
+            return json.loads(buf)
+        except ValueError as e:
+            raise SandboxCrashed(f"bad reply: {e}")
+
+    def _exit_code(self) -> Optional[int]:
+        try:
+            return self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def close(self) -> None:
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except Exception:
+            pass
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=1)
+        except Exception:
+            pass
+
+
+class SandboxPool:
+    """
+    Fixed-size pool of sandbox templates, safe to share between threads.
+    Templates are started up front; an execution borrows one, which forks a
+    fresh child for the code. A template that crashed, timed out or reached
+    max_runs is replaced by a fresh one.
+    """
+
+    def __init__(self, size: int, max_runs: int, sandbox_dir: str):
+        self.max_runs = max_runs
+        self.sandbox_dir = sandbox_dir
+        self._idle: "queue.Queue[Optional[_SandboxWorker]]" = queue.Queue()
+        self.recycled = 0
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> Optional[_SandboxWorker]:
+        try:
+            return _SandboxWorker(self.sandbox_dir)
+        except Exception as e:
+            print(f"   ⚠️ Sandbox worker spawn failed: {e}")
+            return None  # slot is retried on next checkout
+
+    def execute(self, code: str, timeout: float) -> Dict:
+        worker = self._idle.get()
+        if worker is None:
+            worker = self._spawn()
+            if worker is None:
+                self._idle.put(None)
+                raise SandboxCrashed("no sandbox worker available")
+
+        keep = False
+        try:
+            reply = worker.run(code, timeout)
+            keep = worker.runs < self.max_runs
+            if reply["ok"]:
+                return {"success": True, "output": reply["stdout"].strip(), "error": None}
+            return {"success": False, "output": None, "error": reply["stderr"]}
+        finally:
+            if keep:
+                self._idle.put(worker)
+            else:
+                worker.close()
+                self.recycled += 1
+                self._idle.put(self._spawn())
+
+    def close(self) -> None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                worker.close()
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+_sandbox_pool_lock = threading.Lock()
+
+
+def _sandbox_dir() -> str:
+    """MATH_SANDBOX_TMP_DIR, falling back to /tmp if it can't be created."""
+    try:
+        os.makedirs(_SANDBOX_TMP_DIR, exist_ok=True)
+        return _SANDBOX_TMP_DIR
+    except Exception:
+        return "/tmp"
+
+
+def get_sandbox_pool() -> Optional[SandboxPool]:
+    """Process-wide pool, started on first use. None when MATH_SANDBOX_POOL_SIZE=0."""
+    global _sandbox_pool
+    if MATH_SANDBOX_POOL_SIZE <= 0:
+        return None
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = SandboxPool(MATH_SANDBOX_POOL_SIZE, MATH_SANDBOX_MAX_RUNS, _sandbox_dir())
+            atexit.register(_sandbox_pool.close)
+            print(f"🧪 Math sandbox pool: {MATH_SANDBOX_POOL_SIZE} workers")
+        return _sandbox_pool
+
+
+# ---------------------------------------------------------------------------
+# In-process fast path
+# Most generated code is a few assignments over the extracted variables and
+# one print. Code that passes this strict AST whitelist is evaluated by a
+# tree-walking interpreter — no compile/exec, no process. Everything else
+# (imports, loops, attribute access, unknown calls, ...) goes to the sandbox.
+# ---------------------------------------------------------------------------
+MATH_FAST_PATH = os.getenv("MATH_FAST_PATH", "true").lower() == "true"
+
+_FAST_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_FAST_UNARYOPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+_FAST_FUNCS = {"round": round, "abs": abs, "min": min, "max": max, "sum": sum}
+
+# Bounds that keep a whitelisted expression cheap (10 ** 10 ** 10 is
+# "simple arithmetic" too). Exceeding them hands the code to the sandbox.
+_FAST_MAX_INT_BITS = 4096
+_FAST_MAX_EXPONENT = 1024
+# f-string specs run in this process with no RLIMIT — {x:1000000000} would
+# allocate a 1 GB string — so width and precision are capped too.
+_FAST_MAX_SPEC_WIDTH = 100
+_FORMAT_SPEC = re.compile(
+    r"(?:.?[<>=^])?[-+ ]?z?#?0?(?P<width>\d*)[,_]?(?:\.(?P<precision>\d+))?[bcdeEfFgGnosxX%]?",
+    re.DOTALL,
+)
+
+
+class _NotSimpleArithmetic(Exception):
+    """Code is outside the fast-path whitelist — run it in the sandbox."""
+
+
+class _ArithmeticEvaluator:
+    """Evaluates whitelisted assignment/print code over a private namespace."""
+
+    def __init__(self):
+        self.names: Dict[str, object] = {}
+        self.printed: Optional[str] = None
+
+    def run(self, tree: ast.Module) -> str:
+        for stmt in tree.body:
+            self._stmt(stmt)
+        return self.printed or ""
+
+    # ── statements ──
+    def _stmt(self, node: ast.stmt) -> None:
+        if isinstance(node, ast.Assign):
+            value = self._expr(node.value)
+            for target in node.targets:
+                self.names[self._target(target)] = value
+        elif isinstance(node, ast.AugAssign) and type(node.op) in _FAST_BINOPS:
+            name = self._target(node.target)
+            if name not in self.names:
+                raise _NotSimpleArithmetic(f"unbound name {name}")
+            self.names[name] = self._binop(node.op, self.names[name], self._expr(node.value))
+        elif (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+              and isinstance(node.value.func, ast.Name) and node.value.func.id == "print"):
+            self._print(node.value)
+        else:
+            raise _NotSimpleArithmetic(type(node).__name__)
+
+    def _target(self, node: ast.expr) -> str:
+        if not isinstance(node, ast.Name) or node.id in _FAST_FUNCS or node.id == "print":
+            raise _NotSimpleArithmetic("assignment target")
+        return node.id
+
+    def _print(self, call: ast.Call) -> None:
+        if self.printed is not None or call.keywords:
+            raise _NotSimpleArithmetic("more than one print, or print kwargs")
+        self.printed = " ".join(self._print_arg(arg) for arg in call.args)
+
+    def _print_arg(self, node: ast.expr) -> str:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, ast.JoinedStr):
+            return self._fstring(node)
+        return str(self._expr(node))
+
+    def _fstring(self, node: ast.JoinedStr) -> str:
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant) and isinstance(value.value, str):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and value.conversion == -1:
+                spec = self._fstring(value.format_spec) if value.format_spec else ""
+                parts.append(format(self._expr(value.value), self._checked_spec(spec)))
+            else:
+                raise _NotSimpleArithmetic("f-string conversion")
+        return "".join(parts)
+
+    @staticmethod
+    def _checked_spec(spec: str) -> str:
+        match = _FORMAT_SPEC.fullmatch(spec) if spec else None
+        if spec and not match:
+            raise _NotSimpleArithmetic(f"format spec {spec!r}")
+        if match and any(int(match[g] or 0) > _FAST_MAX_SPEC_WIDTH for g in ("width", "precision")):
+            raise _NotSimpleArithmetic(f"format spec {spec!r} too wide")
+        return spec
+
+    # ── expressions ──
+    def _expr(self, node: ast.expr):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id not in self.names:
+                raise _NotSimpleArithmetic(f"unbound name {node.id}")
+            return self.names[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in _FAST_BINOPS:
+            return self._binop(node.op, self._expr(node.left), self._expr(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _FAST_UNARYOPS:
+            return _FAST_UNARYOPS[type(node.op)](self._number(self._expr(node.operand)))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _FAST_FUNCS and not node.keywords):
+            args = [self._call_arg(arg) for arg in node.args]
+            return self._bounded(_FAST_FUNCS[node.func.id](*args))
+        raise _NotSimpleArithmetic(type(node).__name__)
+
+    def _call_arg(self, node: ast.expr):
+        # List/tuple literals only as direct arguments, e.g. sum([a, b, c])
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self._number(self._expr(elt)) for elt in node.elts]
+        return self._expr(node)
+
+    def _binop(self, op: ast.operator, left, right):
+        left, right = self._number(left), self._number(right)
+        if isinstance(op, ast.Pow) and abs(right) > _FAST_MAX_EXPONENT:
+            raise _NotSimpleArithmetic("exponent too large")
+        return self._bounded(_FAST_BINOPS[type(op)](left, right))
+
+    @staticmethod
+    def _number(value):
+        if type(value) not in (int, float, bool):
+            raise _NotSimpleArithmetic(f"non-numeric operand {type(value).__name__}")
+        return value
+
+    @staticmethod
+    def _bounded(value):
+        if isinstance(value, int) and value.bit_length() > _FAST_MAX_INT_BITS:
+            raise _NotSimpleArithmetic("integer too large")
+        if type(value) not in (int, float, bool):
+            raise _NotSimpleArithmetic(f"non-numeric result {type(value).__name__}")
+        return value
+
+
+def evaluate_simple_arithmetic(code: str) -> Optional[Dict]:
+    """
+    Evaluate code in-process if it is plain arithmetic over assignments with
+    at most one print. Returns an execute_code_safely()-shaped result, or None
+    when the code is outside the whitelist and must run in the sandbox.
+    """
+    try:
+        tree = ast.parse(code)
+        output = _ArithmeticEvaluator().run(tree)
+    except (_NotSimpleArithmetic, SyntaxError, TypeError, RecursionError):
+        return None
+    except (ArithmeticError, ValueError) as e:
+        # Genuine runtime error (division by zero, bad format spec) — the
+        # sandbox would fail the same way, so report it without a round trip.
+        return {"success": False, "output": None, "error": f"{type(e).__name__}: {e}"}
+    return {"success": True, "output": output.strip(), "error": None}
+
 
 class MathExecutor:
     """
@@ -282,15 +711,31 @@ Code:"""
     # Fix 7 — subprocess resource limits via preexec_fn
     # -----------------------------------------------------------------------
     def execute_code_safely(self, code: str, timeout: int = 10) -> Dict:
-        """Execute Python code in subprocess sandbox with resource limits."""
+        """
+        Execute Python code: plain arithmetic in-process, anything else in a
+        pooled sandbox worker or a fresh subprocess.
+        """
+        if MATH_FAST_PATH:
+            fast = evaluate_simple_arithmetic(code)
+            if fast is not None:
+                print("   ⚡ Simple arithmetic — evaluated in-process")
+                return fast
+
+        pool = get_sandbox_pool()
+        if pool is not None:
+            try:
+                return pool.execute(code, timeout)
+            except subprocess.TimeoutExpired:
+                return {"success": False, "output": None, "error": "Timeout"}
+            except SandboxCrashed as e:
+                return {"success": False, "output": None, "error": f"Sandbox crashed: {e}"}
+        return self._execute_in_subprocess(code, timeout)
+
+    def _execute_in_subprocess(self, code: str, timeout: int = 10) -> Dict:
+        """Execute Python code in a one-off subprocess sandbox with resource limits."""
         # Ensure sandbox directory exists — done here not at module level so a
         # permissions failure doesn't crash the module on import.
-        # Falls back to /tmp if the configured path can't be created.
-        sandbox_dir = _SANDBOX_TMP_DIR
-        try:
-            os.makedirs(sandbox_dir, exist_ok=True)
-        except Exception:
-            sandbox_dir = "/tmp"
+        sandbox_dir = _sandbox_dir()
 
         # Fix 1 — initialise before try so finally never hits NameError
         temp_file = None
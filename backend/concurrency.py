@@ -0,0 +1,280 @@
+import os
+import re
+import time
+import socket
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# ── Adaptive ingest concurrency ───────────────────────────────────────────────
+# One AIMD limiter per worker process caps concurrent upstream calls made by
+# ingestion (graph extraction, embedding batches, the alias pre-pass):
+#   - every call that finishes under its latency target adds 1/limit
+#     (≈ +1 per round of calls), up to INGEST_CONCURRENCY_MAX
+#   - a 429 / quota error multiplies the limit by INGEST_THROTTLE_BACKOFF and
+#     holds new calls until Retry-After (or INGEST_THROTTLE_PAUSE_S) has passed
+#   - other errors back off by INGEST_ERROR_BACKOFF once the recent error rate
+#     exceeds INGEST_ERROR_RATE_MAX
+# Cloud providers start at INGEST_CONCURRENCY_INITIAL; local providers are pinned to 1.
+INGEST_CONCURRENCY_INITIAL = int(os.getenv("INGEST_CONCURRENCY_INITIAL", "5"))
+INGEST_CONCURRENCY_MIN     = int(os.getenv("INGEST_CONCURRENCY_MIN", "1"))
+INGEST_CONCURRENCY_MAX     = int(os.getenv("INGEST_CONCURRENCY_MAX", "16"))
+INGEST_THROTTLE_BACKOFF    = float(os.getenv("INGEST_THROTTLE_BACKOFF", "0.5"))
+INGEST_THROTTLE_PAUSE_S    = float(os.getenv("INGEST_THROTTLE_PAUSE_S", "2.0"))
+INGEST_ERROR_BACKOFF       = float(os.getenv("INGEST_ERROR_BACKOFF", "0.75"))
+INGEST_ERROR_RATE_MAX      = float(os.getenv("INGEST_ERROR_RATE_MAX", "0.2"))
+
+# Latency above which a successful call stops growing the limit
+INGEST_LLM_LATENCY_TARGET_S   = float(os.getenv("INGEST_LLM_LATENCY_TARGET_S", "45"))
+INGEST_EMBED_LATENCY_TARGET_S = float(os.getenv("INGEST_EMBED_LATENCY_TARGET_S", "5"))
+
+# Each worker mirrors its limiter state to its own hash (expiring, so dead
+# workers drop out); the API's /metrics reads them all.
+CONCURRENCY_STATS_PREFIX = "documind:metrics:concurrency:"
+_STATS_TTL_S = 300
+
+_ERROR_EWMA_ALPHA = 0.1
+_RETRY_AFTER_TEXT = re.compile(
+    r"(?:retry[- ]after|try again in|retry in)\D{0,3}(\d+(?:\.\d+)?)\s*(ms|s|sec|seconds)?",
+    re.IGNORECASE,
+)
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """429 / rate-limit / quota errors from any provider SDK or HTTP client."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status == 429:
+        return True
+    text = str(exc).lower()
+    return "429" in text or "rate limit" in text or "quota" in text or "too many requests" in text
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Retry-After header (seconds form) or a "retry after Ns" hint in the message."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+            if value is not None:
+                return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass  # HTTP-date form — fall through to the message / default pause
+    match = _RETRY_AFTER_TEXT.search(str(exc))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if (match.group(2) or "").lower() == "ms" else seconds
+    return None
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease cap on concurrent calls.
+    Used from one event loop; the wrapped blocking calls run via asyncio.to_thread.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int,
+                 stats_client=None):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.throttled = 0
+        self.error_rate = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop = None
+        self._stats_client = stats_client
+        self._stats_key = f"{CONCURRENCY_STATS_PREFIX}{socket.gethostname()}:{os.getpid()}:{name}"
+
+    def _condition(self) -> asyncio.Condition:
+        # Celery workers reuse one loop; tests and scripts may not
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond, self._loop = asyncio.Condition(), loop
+        return self._cond
+
+    async def call(self, fn: Callable, *args, latency_target_s: float = INGEST_LLM_LATENCY_TARGET_S,
+                   **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in a thread once a slot is free, and adapt the limit."""
+        cond = self._condition()
+        async with cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    cond.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await cond.acquire()
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await cond.wait()
+            self.in_flight += 1
+        self._publish()
+
+        start = time.monotonic()
+        try:
+            result = await asyncio.to_thread(fn, *args, **kwargs)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self._on_error(e)
+            raise
+        else:
+            self._on_success(time.monotonic() - start, latency_target_s)
+            return result
+        finally:
+            async with cond:
+                self.in_flight -= 1
+                cond.notify_all()
+            self._publish()
+
+    def _on_success(self, latency_s: float, latency_target_s: float) -> None:
+        self.completed += 1
+        self.error_rate *= 1 - _ERROR_EWMA_ALPHA
+        if latency_s <= latency_target_s:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _on_error(self, exc: Exception) -> None:
+        now = time.monotonic()
+        self.error_rate = self.error_rate * (1 - _ERROR_EWMA_ALPHA) + _ERROR_EWMA_ALPHA
+        if is_throttle_error(exc):
+            self.throttled += 1
+            pause = retry_after_seconds(exc)
+            pause = INGEST_THROTTLE_PAUSE_S if pause is None else pause
+            self._paused_until = max(self._paused_until, now + pause)
+            self._decrease(INGEST_THROTTLE_BACKOFF, now, pause)
+            print(f"   🚦 {self.name}: throttled — limit {self.limit:.1f}, "
+                  f"pausing new calls {pause:.1f}s")
+        else:
+            self.errors += 1
+            if self.error_rate > INGEST_ERROR_RATE_MAX:
+                self._decrease(INGEST_ERROR_BACKOFF, now, INGEST_THROTTLE_PAUSE_S)
+
+    def _decrease(self, factor: float, now: float, window_s: float) -> None:
+        # A wave of in-flight calls failing together counts as one congestion signal
+        if now - self._last_decrease < max(window_s, 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "max_limit": self.max_limit,
+            "completed": self.completed,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "error_rate": round(self.error_rate, 3),
+            "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+    def _publish(self) -> None:
+        if not self._stats_client:
+            return
+        try:
+            with self._stats_client.pipeline(transaction=False) as pipe:
+                pipe.hset(self._stats_key, mapping=self.stats())
+                pipe.expire(self._stats_key, _STATS_TTL_S)
+                pipe.execute()
+        except Exception:
+            pass  # metrics are best-effort
+
+
+def read_concurrency_stats(client) -> Dict[str, Dict]:
+    """Every live worker's limiter snapshot, keyed by host:pid:name."""
+    from cache_utils import read_shared_stats
+
+    if client is None:
+        return {}
+    try:
+        keys = list(client.scan_iter(match=f"{CONCURRENCY_STATS_PREFIX}*", count=100))
+    except Exception:
+        return {}
+    stats = {}
+    for key in keys:
+        key = key.decode() if isinstance(key, bytes) else key
+        stats[key[len(CONCURRENCY_STATS_PREFIX):]] = read_shared_stats(client, key)
+    return stats
+
+
+
+# ── Per-event-loop async clients ──────────────────────────────────────────────
+# Async clients (Neo4j driver, gRPC Qdrant channel, httpx pool, redis.asyncio)
+# are bound to the loop they were created on. The API runs one long-lived loop,
+# but Celery's asyncio.run fallback and app_graph.invoke() start a fresh loop per
+# call. LoopScoped keeps one client per live loop and closes it on that loop as
+# the loop shuts down (asyncio.run cancels leftover tasks before closing), so a
+# short-lived loop never leaks its pool and never hands a dead one to the next.
+
+class LoopScoped:
+    """factory() → client for the running loop; aclose(client) releases it."""
+
+    def __init__(self, factory: Callable[[], Any], aclose: Callable[[Any], Any]):
+        self._factory = factory
+        self._aclose = aclose
+        self._clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._closers: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                # Loops closed without cancelling their tasks can't run a close
+                for dead in [lp for lp in self._clients if lp.is_closed()]:
+                    self._clients.pop(dead)
+                    self._closers.pop(dead, None)
+                client = self._clients[loop] = self._factory()
+                self._closers[loop] = loop.create_task(self._close_on_shutdown(loop, client))
+            return client
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop, client: Any) -> None:
+        try:
+            await asyncio.Future()
+        finally:
+            with self._lock:
+                if self._clients.get(loop) is client:
+                    self._clients.pop(loop)
+                    self._closers.pop(loop, None)
+            try:
+                await self._aclose(client)
+            except Exception:
+                pass  # closing is best-effort
+
+    async def aclose(self) -> None:
+        """Close the running loop's client now (e.g. API lifespan shutdown)."""
+        with self._lock:
+            closer = self._closers.get(asyncio.get_running_loop())
+        if closer is not None:
+            closer.cancel()
+            await asyncio.gather(closer, return_exceptions=True)
+
+
+# ── Singleton ─────────────────────────────────────────────────────────────────
+
+_ingest_limiter: Optional[AIMDLimiter] = None
+
+
+def get_ingest_limiter(is_cloud: bool = True) -> AIMDLimiter:
+    """Shared by every ingest call site in this worker process."""
+    global _ingest_limiter
+    if _ingest_limiter is None:
+        from cache_utils import get_redis_client
+
+        if is_cloud:
+            bounds = (INGEST_CONCURRENCY_INITIAL, INGEST_CONCURRENCY_MIN, INGEST_CONCURRENCY_MAX)
+        else:
+            bounds = (1, 1, 1)  # local inference — one request at a time
+        _ingest_limiter = AIMDLimiter("ingest", *bounds, stats_client=get_redis_client())
+    return _ingest_limiter
@@ -0,0 +1,408 @@
+import os
+import re
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from cache_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# ── Persistent entity registry configuration ──────────────────────────────────
+# Canonical Person/Organization names, their aliases and exact blocking keys,
+# shared by every ingest worker through Redis. Each worker loads the registry
+# once and then only reads the change log written since its last refresh, so
+# "Vantage Systems Inc" in filing B resolves to the node filing A created.
+# Names are recorded only once their document's nodes are written, and are
+# reference-counted by document: deleting (or cleaning up) the last document
+# that uses a name drops it, so the hashes grow with live documents only.
+#
+# ENTITY_REGISTRY_ENABLED:        "false" keeps entity dedup per-document only
+# ENTITY_REGISTRY_MAX_POSTINGS:   tokens shared by more canonicals than this
+#                                 ("capital", "holdings") are not used to find
+#                                 fuzzy candidates — keeps lookups near-constant
+# ENTITY_REGISTRY_LOG_MAXLEN:     approximate change-log length kept in Redis;
+#                                 workers that fall further behind reload fully
+ENTITY_REGISTRY_ENABLED      = os.getenv("ENTITY_REGISTRY_ENABLED", "true").lower() == "true"
+ENTITY_REGISTRY_MAX_POSTINGS = int(os.getenv("ENTITY_REGISTRY_MAX_POSTINGS", "200"))
+ENTITY_REGISTRY_LOG_MAXLEN   = int(os.getenv("ENTITY_REGISTRY_LOG_MAXLEN", "100000"))
+
+_KEYS_HASH      = "documind:entity_registry:keys"       # "{type}|{key}" → canonical
+_CANONICAL_HASH = "documind:entity_registry:canonical"  # canonical → type
+_ALIAS_HASH     = "documind:entity_registry:alias"      # alias → canonical
+_LOG_STREAM     = "documind:entity_registry:log"
+_REFS_HASH      = "documind:entity_registry:refs"       # "c|{canonical}" / "a|{alias}" → documents
+_DOC_PREFIX     = "documind:entity_registry:doc:"       # + document → {ref: blocking key}
+
+# Replaces one document's references with ARGV[2:] (ref/blocking-key pairs) and
+# drops every name no document references any more — atomically, so a worker
+# recording the same name concurrently either keeps it alive or re-adds it after.
+# KEYS: document hash, refs, keys, canonical, alias, log stream. ARGV[1]: log maxlen.
+_SET_REFS_LUA = """
+local prev, new = {}, {}
+local old = redis.call('HGETALL', KEYS[1])
+for i = 1, #old, 2 do prev[old[i]] = old[i + 1] end
+for i = 2, #ARGV, 2 do new[ARGV[i]] = ARGV[i + 1] end
+for ref, _ in pairs(new) do
+  if not prev[ref] then redis.call('HINCRBY', KEYS[2], ref, 1) end
+end
+local dropped = 0
+for ref, blocking_key in pairs(prev) do
+  if not new[ref] and redis.call('HINCRBY', KEYS[2], ref, -1) <= 0 then
+    redis.call('HDEL', KEYS[2], ref)
+    local kind, name = string.sub(ref, 1, 1), string.sub(ref, 3)
+    if kind == 'c' then
+      redis.call('HDEL', KEYS[4], name)
+      if redis.call('HGET', KEYS[3], blocking_key) == name then
+        redis.call('HDEL', KEYS[3], blocking_key)
+      end
+    else
+      redis.call('HDEL', KEYS[5], name)
+    end
+    redis.call('XADD', KEYS[6], 'MAXLEN', '~', ARGV[1], '*', 'e',
+               cjson.encode({op = 'drop', kind = kind, name = name}))
+    dropped = dropped + 1
+  end
+end
+redis.call('DEL', KEYS[1])
+for ref, blocking_key in pairs(new) do redis.call('HSET', KEYS[1], ref, blocking_key) end
+return dropped
+"""
+
+# Same thresholds as the per-document clustering in graph_agent.py
+_AUTO_MERGE_SCORE = 85
+_CANDIDATE_SCORE  = 60
+
+_TITLES = {"dr", "mr", "mrs", "ms", "miss", "prof", "sir", "dame"}
+_LEGAL_FORMS = {
+    "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation",
+    "co", "company", "plc", "lp", "llp", "gmbh", "ag", "sa", "nv", "bv",
+}
+
+
+def registry_key(name: str, node_type: str) -> str:
+    """
+    Exact blocking key: lowercase alphanumeric tokens without person titles or
+    trailing legal forms. "Vantage Systems, Inc." and "Vantage Systems Inc"
+    share "vantage systems"; "Dr. Sarah Chen, PhD" and "Sarah Chen" share "sarah chen".
+    """
+    if node_type == "Person":
+        # Imported here — graph_agent imports this module at load time
+        from graph_agent import _strip_suffixes
+        name = _strip_suffixes(name)
+    tokens = re.sub(r"[^0-9a-z]+", " ", name.lower()).split()
+    if node_type == "Person":
+        while len(tokens) > 1 and tokens[0] in _TITLES:
+            tokens = tokens[1:]
+    elif node_type == "Organization":
+        while len(tokens) > 1 and tokens[-1] in _LEGAL_FORMS:
+            tokens = tokens[:-1]
+    return " ".join(tokens)
+
+
+class PersistentEntityRegistry:
+    """
+    In-memory view of the shared registry, kept current from a Redis stream.
+
+    Lookups are dict hits (exact alias, exact blocking key) plus fuzzy scoring
+    against the few canonicals that share a rare token with the new name — the
+    cost per name does not grow with the size of the registry.
+    Without Redis the registry still works, but only within this process.
+    """
+
+    def __init__(self, redis_client=None, max_postings: int = ENTITY_REGISTRY_MAX_POSTINGS):
+        self._redis = redis_client
+        self._max_postings = max_postings
+        self._lock = threading.Lock()
+        self._last_id = "0-0"
+        self._set_refs = redis_client.register_script(_SET_REFS_LUA) if redis_client is not None else None
+        # Reference counts when running without Redis
+        self._doc_refs: Dict[str, Dict[str, str]] = {}
+        self._ref_counts: Dict[str, int] = {}
+        self._reset()
+        self.load()
+
+    def _reset(self) -> None:
+        self._canonical: Dict[str, str] = {}              # canonical → type
+        self._alias: Dict[str, str] = {}                  # alias → canonical
+        self._by_key: Dict[Tuple[str, str], str] = {}     # (type, key) → canonical
+        self._postings: Dict[Tuple[str, str], set] = {}   # (type, token) → canonicals
+
+    # ── Loading ───────────────────────────────────────────────────────────────
+
+    def load(self) -> None:
+        """Full load from Redis. The stream position is read first so nothing is missed."""
+        if self._redis is None:
+            return
+        try:
+            newest = self._redis.xrevrange(_LOG_STREAM, count=1)
+            canonical = self._redis.hgetall(_CANONICAL_HASH)
+            aliases = self._redis.hgetall(_ALIAS_HASH)
+        except Exception as e:
+            logger.warning("Entity registry load failed: %s", e)
+            return
+        with self._lock:
+            self._reset()
+            for name, node_type in canonical.items():
+                self._index_canonical(name, node_type)
+            self._alias.update(aliases)
+            self._last_id = newest[0][0] if newest else "0-0"
+        print(f"📇 Entity registry loaded: {len(self._canonical)} canonical names, "
+              f"{len(self._alias)} aliases")
+
+    def refresh(self) -> None:
+        """Apply changes other workers logged since the last load/refresh."""
+        if self._redis is None:
+            return
+        try:
+            oldest = self._redis.xrange(_LOG_STREAM, count=1)
+            if oldest and self._last_id != "0-0" and _stream_id(oldest[0][0]) > _stream_id(self._last_id):
+                # Entries we never saw may have been trimmed away
+                self.load()
+                return
+            response = self._redis.xread({_LOG_STREAM: self._last_id})
+        except Exception as e:
+            logger.warning("Entity registry refresh failed: %s", e)
+            return
+        with self._lock:
+            for _, entries in response:
+                for entry_id, fields in entries:
+                    self._apply_entry(json.loads(fields["e"]))
+                    self._last_id = entry_id
+
+    def _apply_entry(self, entry: dict) -> None:
+        if entry["op"] == "canonical":
+            self._index_canonical(entry["name"], entry["type"])
+        elif entry["op"] == "alias":
+            self._alias[entry["name"]] = entry["canonical"]
+        elif entry["op"] == "drop":
+            if entry["kind"] == "c":
+                self._drop_canonical(entry["name"])
+            else:
+                self._alias.pop(entry["name"], None)
+
+    def _index_canonical(self, name: str, node_type: str) -> None:
+        key = registry_key(name, node_type)
+        self._canonical[name] = node_type
+        self._by_key.setdefault((node_type, key), name)
+        for token in set(key.split()):
+            self._postings.setdefault((node_type, token), set()).add(name)
+
+    def _drop_canonical(self, name: str) -> None:
+        node_type = self._canonical.pop(name, None)
+        if node_type is None:
+            return
+        key = registry_key(name, node_type)
+        if self._by_key.get((node_type, key)) == name:
+            del self._by_key[(node_type, key)]
+        for token in set(key.split()):
+            posting = self._postings.get((node_type, token))
+            if posting is not None:
+                posting.discard(name)
+                if not posting:
+                    del self._postings[(node_type, token)]
+
+    # ── Resolution ────────────────────────────────────────────────────────────
+
+    def prefer_stored(self, mapping: Dict[str, str]) -> Dict[str, str]:
+        """
+        Flip LLM mappings that would absorb a stored canonical into a new name.
+        The stored name already identifies a node in Neo4j, so it stays canonical.
+        """
+        flipped: Dict[str, str] = {}
+        with self._lock:
+            for name, canonical in mapping.items():
+                if name in self._canonical and canonical not in self._canonical:
+                    name, canonical = canonical, name
+                flipped.setdefault(name, canonical)
+        return flipped
+
+    def resolve(self, names: Dict[str, str]) -> Tuple[Dict[str, str], List[List[str]]]:
+        """
+        Match this document's names (name → type) against the registry.
+        Returns:
+            matches:   name → stored canonical (exact alias/key, or fuzzy >= 85)
+            ambiguous: [stored canonical, name] pairs scoring 60-84 — for the LLM
+        Names with no candidate are left for record() to register as new canonicals.
+        """
+        self.refresh()
+        matches: Dict[str, str] = {}
+        ambiguous: List[List[str]] = []
+        with self._lock:
+            for name, node_type in names.items():
+                if self._canonical.get(name) == node_type:
+                    continue
+                target = self._alias.get(name)
+                if target and self._canonical.get(target) == node_type:
+                    matches[name] = target
+                    continue
+                key = registry_key(name, node_type)
+                target = self._by_key.get((node_type, key))
+                if target:
+                    matches[name] = target
+                    continue
+                best = self._best_fuzzy(name, node_type, key)
+                if best is None:
+                    continue
+                target, score = best
+                if score >= _AUTO_MERGE_SCORE:
+                    matches[name] = target
+                else:
+                    ambiguous.append([target, name])
+        if matches or ambiguous:
+            logger.info("Entity registry: %d cross-document match(es), %d ambiguous",
+                        len(matches), len(ambiguous))
+        return matches, ambiguous
+
+    def _best_fuzzy(self, name: str, node_type: str, key: str) -> Optional[Tuple[str, float]]:
+        from rapidfuzz import fuzz
+        from graph_agent import should_block_merge
+
+        candidates = set()
+        for token in set(key.split()):
+            posting = self._postings.get((node_type, token))
+            if posting and len(posting) <= self._max_postings:
+                candidates |= posting
+        if not candidates:
+            return None
+
+        scored = sorted(
+            ((fuzz.token_sort_ratio(name, c), c) for c in candidates),
+            key=lambda sc: (-sc[0], sc[1]),
+        )
+        for score, candidate in scored:
+            if score < _CANDIDATE_SCORE:
+                break
+            if node_type == "Person" and should_block_merge(name, candidate):
+                continue
+            return candidate, score
+        return None
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def record(self, document_id: str, canonicals: Dict[str, str], aliases: Dict[str, str]) -> None:
+        """
+        Persist a document's final canonical names (name → type) and the names
+        it absorbed (alias → canonical) — call once its nodes are in Neo4j.
+        A canonical whose blocking key was claimed concurrently by another
+        worker becomes an alias of the winner. The document's references
+        replace any it recorded before, so a re-ingest does not count twice.
+        """
+        self.refresh()  # names another document's deletion dropped are new again
+        with self._lock:
+            new_canonicals = {n: t for n, t in canonicals.items() if n not in self._canonical}
+            new_aliases = {a: c for a, c in aliases.items() if self._alias.get(a) != c}
+        refs = {f"c|{n}": f"{t}|{registry_key(n, t)}" for n, t in canonicals.items()}
+        refs.update({f"a|{a}": "" for a in aliases})
+
+        if self._redis is None:
+            with self._lock:
+                for name, node_type in new_canonicals.items():
+                    self._index_canonical(name, node_type)
+                self._alias.update(new_aliases)
+                self._replace_local_refs(document_id, refs)
+            return
+
+        entries = []
+        try:
+            # HSETNX on the blocking key decides races between workers
+            with self._redis.pipeline(transaction=False) as pipe:
+                for name, node_type in new_canonicals.items():
+                    pipe.hsetnx(_KEYS_HASH, f"{node_type}|{registry_key(name, node_type)}", name)
+                claimed = pipe.execute()
+            lost = [f"{t}|{registry_key(n, t)}"
+                    for (n, t), won in zip(new_canonicals.items(), claimed) if not won]
+            winners = dict(zip(lost, self._redis.hmget(_KEYS_HASH, lost))) if lost else {}
+
+            with self._redis.pipeline(transaction=True) as pipe:
+                for (name, node_type), won in zip(new_canonicals.items(), claimed):
+                    winner = winners.get(f"{node_type}|{registry_key(name, node_type)}")
+                    if won or winner is None:
+                        pipe.hset(_CANONICAL_HASH, name, node_type)
+                        entries.append({"op": "canonical", "name": name, "type": node_type})
+                    elif winner != name:
+                        new_aliases[name] = winner
+                        refs[f"a|{name}"] = ""
+                if new_aliases:
+                    pipe.hset(_ALIAS_HASH, mapping=new_aliases)
+                entries += [{"op": "alias", "name": a, "canonical": c}
+                            for a, c in new_aliases.items()]
+                for entry in entries:
+                    pipe.xadd(_LOG_STREAM, {"e": json.dumps(entry)},
+                              maxlen=ENTITY_REGISTRY_LOG_MAXLEN, approximate=True)
+                self._replace_refs(document_id, refs, client=pipe)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("Entity registry write failed: %s", e)
+            return
+
+        # Our own entries come back through the next refresh(); apply them now
+        # so the next document in this worker sees them even if Redis lags.
+        with self._lock:
+            for entry in entries:
+                self._apply_entry(entry)
+        if entries:
+            print(f"   📇 Entity registry: +{sum(e['op'] == 'canonical' for e in entries)} canonical, "
+                  f"+{len(new_aliases)} alias(es)")
+
+    def forget(self, document_id: str) -> None:
+        """Release a deleted document's names; those no other document uses are dropped."""
+        if self._redis is None:
+            with self._lock:
+                dropped = self._replace_local_refs(document_id, {})
+        else:
+            try:
+                dropped = self._replace_refs(document_id, {})
+            except Exception as e:
+                logger.warning("Entity registry release failed for %s: %s", document_id, e)
+                return
+            self.refresh()
+        if dropped:
+            print(f"   📇 Entity registry: dropped {dropped} name(s) only {document_id} used")
+
+    def _replace_refs(self, document_id: str, refs: Dict[str, str], client=None):
+        keys = [f"{_DOC_PREFIX}{document_id}", _REFS_HASH, _KEYS_HASH,
+                _CANONICAL_HASH, _ALIAS_HASH, _LOG_STREAM]
+        args = [ENTITY_REGISTRY_LOG_MAXLEN, *(v for ref in refs.items() for v in ref)]
+        return self._set_refs(keys=keys, args=args, client=client)
+
+    def _replace_local_refs(self, document_id: str, refs: Dict[str, str]) -> int:
+        """_SET_REFS_LUA for the in-process registry; caller holds the lock."""
+        prev = self._doc_refs.pop(document_id, {})
+        for ref in refs.keys() - prev.keys():
+            self._ref_counts[ref] = self._ref_counts.get(ref, 0) + 1
+        dropped = 0
+        for ref in prev.keys() - refs.keys():
+            self._ref_counts[ref] -= 1
+            if self._ref_counts[ref] <= 0:
+                del self._ref_counts[ref]
+                self._apply_entry({"op": "drop", "kind": ref[0], "name": ref[2:]})
+                dropped += 1
+        if refs:
+            self._doc_refs[document_id] = refs
+        return dropped
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"canonical_names": len(self._canonical), "aliases": len(self._alias)}
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+# ── Singleton ─────────────────────────────────────────────────────────────────
+
+_registry_instance: Optional[PersistentEntityRegistry] = None
+
+
+def get_entity_registry() -> Optional[PersistentEntityRegistry]:
+    """Loaded once per worker process; None when ENTITY_REGISTRY_ENABLED is false."""
+    global _registry_instance
+    if not ENTITY_REGISTRY_ENABLED:
+        return None
+    if _registry_instance is None:
+        _registry_instance = PersistentEntityRegistry(get_redis_client(decode_responses=True))
+    return _registry_instance
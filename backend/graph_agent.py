@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import hashlib
 import asyncio
 import logging
 from functools import lru_cache
@@ -8,6 +9,12 @@ from itertools import combinations
 from typing import List, Dict, Optional, Tuple
 from nameparser import HumanName
 from llm_provider import get_llm_provider
+from cache_utils import (
+    EXTRACT_CACHE_STATS_KEY, TTLCache,
+    build_extraction_cache, get_redis_client, read_shared_stats,
+)
+from entity_registry import get_entity_registry
+from concurrency import is_throttle_error
 from langsmith import traceable
 
 logger = logging.getLogger(__name__)
@@ -40,7 +47,7 @@ LEGAL_TERM_EXPANSIONS: Dict[str, List[str]] = {
 # ALLOWED_EDGE_TYPES removed — LLM generates freely with formatting rules
 # Edge normalisation pass handles consistency after extraction
 
-EXTRACTION_PROMPT = """
+_EXTRACTION_RULES = """
 You are a graph extraction engine. Your only job is to extract entities and
 relationships from the text and return them as a JSON graph.
 
@@ -89,10 +96,39 @@ EXAMPLE OUTPUT:
     {{"source_id": "tesla", "target_id": "2003", "type": "DATED", "properties": {{}}}}
   ]
 }}
+""".strip()
+
+EXTRACTION_PROMPT = _EXTRACTION_RULES + """
 
 TEXT:
-{chunk_text}
-""".strip()
+{chunk_text}"""
+
+# Batched mode: several chunks share one copy of the rules above. Each section
+# is extracted independently and the answer is keyed by section so it maps
+# back to per-chunk graphs with their own chunk_id provenance.
+BATCH_EXTRACTION_PROMPT = _EXTRACTION_RULES + """
+
+BATCH MODE:
+The text below contains several independent sections, each starting with a
+line "=== SECTION <key> ===". Extract each section on its own — edges may only
+reference nodes from the same section.
+Return ONLY one JSON object keyed by section key, each value a graph in the
+schema above. Include every key; use empty lists for a section with no entities.
+{{"s0": {{"nodes": [...], "edges": [...]}}, "s1": {{"nodes": [...], "edges": [...]}}}}
+
+TEXT:
+{chunk_sections}"""
+
+# Part of the extraction cache key. Derived from the shared rules so editing
+# the prompt invalidates old entries automatically; bump the "v" prefix when
+# _validate_graph / normalisation output changes.
+EXTRACTION_PROMPT_VERSION = "v1-" + hashlib.sha256(_EXTRACTION_RULES.encode("utf-8")).hexdigest()[:10]
+
+# Packing limits for batched extraction. Tokens are estimated at 4 chars each.
+# Output grows with K too, so keep K * typical graph size under the provider's
+# max output tokens. GRAPH_EXTRACT_BATCH_MAX_CHUNKS=1 disables batching.
+GRAPH_EXTRACT_BATCH_TOKENS     = int(os.getenv("GRAPH_EXTRACT_BATCH_TOKENS", "6000"))
+GRAPH_EXTRACT_BATCH_MAX_CHUNKS = int(os.getenv("GRAPH_EXTRACT_BATCH_MAX_CHUNKS", "6"))
 
 QUERY_PROMPT = """
 Extract search keywords from this question for a knowledge graph lookup.
@@ -193,6 +229,31 @@ def _validate_graph(raw: dict) -> dict | None:
     return {"nodes": nodes, "edges": edges}
 
 
+def pack_chunks_by_tokens(
+    texts: List[str],
+    token_budget: int = GRAPH_EXTRACT_BATCH_TOKENS,
+    max_chunks: int = GRAPH_EXTRACT_BATCH_MAX_CHUNKS,
+) -> List[List[int]]:
+    """
+    Group chunk indices, in order, into batches of at most max_chunks whose
+    estimated prompt tokens stay under token_budget. An oversized chunk gets
+    a batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = len(text) // 4 + 1
+        if current and (len(current) >= max_chunks or current_tokens + tokens > token_budget):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
 # ── Merge Guards ──────────────────────────────────────────────────────────────
 
 def _strip_suffixes(name: str) -> str:
@@ -208,6 +269,18 @@ def _strip_suffixes(name: str) -> str:
     ).strip()
 
 
+@lru_cache(maxsize=65536)
+def _person_name_parts(name: str) -> tuple:
+    """
+    (tokens, lowercase tokens, first, last) of the suffix-stripped name.
+    HumanName parsing dominates should_block_merge, and the entity registry
+    asks about the same names many times over — parse each one once.
+    """
+    stripped = _strip_suffixes(name)
+    parsed = HumanName(stripped)
+    return tuple(stripped.split()), tuple(stripped.lower().split()), parsed.first, parsed.last
+
+
 def should_block_merge(a: str, b: str) -> bool:
     """
     Returns True if two Person names must NOT be merged.
@@ -220,25 +293,23 @@ def should_block_merge(a: str, b: str) -> bool:
       - One is surname-only                                → ALLOW  (topology pass handles this)
       - Neither has a parsed first name                   → ALLOW  (fall through to rapidfuzz)
     """
-    na = HumanName(_strip_suffixes(a))
-    nb = HumanName(_strip_suffixes(b))
+    a_tokens, a_lower, a_first, a_last = _person_name_parts(a)
+    b_tokens, b_lower, b_first, b_last = _person_name_parts(b)
 
     # Surname-only detection: if either name is a single token
     # and that token appears as a word in the other name,
     # this is a surname-only form — allow through for topology pass.
-    a_tokens = _strip_suffixes(a).split()
-    b_tokens = _strip_suffixes(b).split()
-    if len(a_tokens) == 1 and a_tokens[0].lower() in _strip_suffixes(b).lower().split():
+    if len(a_tokens) == 1 and a_tokens[0].lower() in b_lower:
         return False  # surname-only form of longer name — allow
-    if len(b_tokens) == 1 and b_tokens[0].lower() in _strip_suffixes(a).lower().split():
+    if len(b_tokens) == 1 and b_tokens[0].lower() in a_lower:
         return False  # surname-only form of longer name — allow
 
-    both_have_first = bool(na.first and nb.first)
+    both_have_first = bool(a_first and b_first)
     if not both_have_first:
         return False  # Can't compare — let rapidfuzz decide
 
-    first_differ = na.first.lower() != nb.first.lower()
-    last_differ  = na.last.lower()  != nb.last.lower()
+    first_differ = a_first.lower() != b_first.lower()
+    last_differ  = a_last.lower()  != b_last.lower()
 
     # Same first, different last → definitely different people
     if not first_differ and last_differ:
@@ -253,6 +324,83 @@ def should_block_merge(a: str, b: str) -> bool:
 
 # ── Entity Registry ───────────────────────────────────────────────────────────
 
+# rapidfuzz cdist threads for entity clustering (-1 = all cores).
+ENTITY_CLUSTER_WORKERS = int(os.getenv("ENTITY_CLUSTER_WORKERS", "-1"))
+_CLUSTER_CUTOFF = 60       # token_sort_ratio needed to join a cluster
+_CLUSTER_BLOCK_ROWS = 1024  # cdist rows per block — bounds the score matrix memory
+
+
+def _similar_name_pairs(names: List[str], cutoff: int = _CLUSTER_CUTOFF) -> List[List[int]]:
+    """
+    neighbours[i] = ascending indices j > i with token_sort_ratio(names[i], names[j]) >= cutoff.
+
+    Blocking is by length band, which is lossless: token_sort_ratio is an Indel
+    ratio over the token-sorted strings, so it is at most 200 * min_len /
+    (min_len + max_len), and a score >= 60 needs max_len <= 7/3 * min_len.
+    Names are sorted by that length and each block of rows is scored with
+    rapidfuzz cdist only against the columns inside its band.
+    """
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    lengths = np.array([len(" ".join(sorted(n.split()))) for n in names])
+    order = np.argsort(lengths, kind="stable")
+    sorted_lengths = lengths[order]
+    sorted_names = [names[k] for k in order]
+    ratio = cutoff / (200 - cutoff)  # min_len / max_len lower bound (3/7 at 60)
+
+    pair_blocks = []
+    for start in range(0, len(names), _CLUSTER_BLOCK_ROWS):
+        stop = min(start + _CLUSTER_BLOCK_ROWS, len(names))
+        # +1 char of slack so float rounding can never drop a pair
+        max_len = sorted_lengths[stop - 1] / ratio + 1
+        col_stop = int(np.searchsorted(sorted_lengths, max_len, side="right"))
+
+        scores = process.cdist(
+            sorted_names[start:stop],
+            sorted_names[start:col_stop],
+            scorer=fuzz.token_sort_ratio,
+            score_cutoff=cutoff,
+            dtype=np.uint8,
+            workers=ENTITY_CLUSTER_WORKERS,
+        )
+        rows, cols = np.nonzero(scores)
+        keep = cols > rows  # each unordered pair once — columns start at the row block
+        a, b = order[start + rows[keep]], order[start + cols[keep]]
+        pair_blocks.append((np.minimum(a, b), np.maximum(a, b)))
+
+    neighbours: List[List[int]] = [[] for _ in names]
+    if pair_blocks:
+        lo = np.concatenate([p[0] for p in pair_blocks])
+        hi = np.concatenate([p[1] for p in pair_blocks])
+        by_pair = np.lexsort((hi, lo))
+        for a, b in zip(lo[by_pair].tolist(), hi[by_pair].tolist()):
+            neighbours[a].append(b)
+    return neighbours
+
+
+def _name_components(neighbours: List[List[int]]) -> List[List[int]]:
+    """Union-find over the similarity edges; returns components of size > 1, members ascending."""
+    parent = list(range(len(neighbours)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, lst in enumerate(neighbours):
+        for b in lst:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(neighbours)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
 def _build_entity_registry(
     all_graphs: List[dict],
     target_types: set = None
@@ -279,53 +427,70 @@ def _build_entity_registry(
     if len(names) < 2:
         return {}, []
 
-    # Cluster by token_sort_ratio similarity
-    assigned = set()
-    clusters: List[List[str]] = []
-
-    for i, name_a in enumerate(names):
-        if name_a in assigned:
-            continue
-        cluster = [name_a]
-        assigned.add(name_a)
-        for name_b in names[i + 1:]:
-            if name_b in assigned:
+    # Greedy pivot clustering: each unassigned name, in order, pulls in every
+    # later unassigned name scoring >= 60 against it. Candidate pairs come from
+    # blocked cdist and the greedy pass is replayed only inside union-find
+    # components, since a cluster can never span two components — the result
+    # is identical to scoring every pair in a Python double loop.
+    neighbours = _similar_name_pairs(names)
+    block_memo: Dict[Tuple[str, str], bool] = {}
+
+    def blocked(x: str, y: str) -> bool:
+        if (x, y) not in block_memo:
+            block_memo[(x, y)] = should_block_merge(x, y)
+        return block_memo[(x, y)]
+
+    pivot_clusters: List[Tuple[int, List[str]]] = []
+    for component in _name_components(neighbours):
+        assigned = set()
+        for i in component:
+            if i in assigned:
                 continue
-            if fuzz.token_sort_ratio(name_a, name_b) >= 60:
+            name_a = names[i]
+            cluster, members = [name_a], [i]
+            assigned.add(i)
+            for j in neighbours[i]:
+                if j in assigned:
+                    continue
+                name_b = names[j]
                 # Nameparser guard — runs before any Person is added to a cluster.
                 # Blocks same-first/different-last merges (Gerald Ashford vs Gerald Fontaine).
                 # Only applies to Person nodes — Orgs use rapidfuzz + LLM path.
                 if name_set.get(name_a) == "Person" and name_set.get(name_b) == "Person":
-                    if should_block_merge(name_a, name_b):
+                    if blocked(name_a, name_b):
                         logger.info("🚫 Blocked merge: '%s' ≠ '%s' (nameparser guard)",
                                     name_a, name_b)
                         continue
                 cluster.append(name_b)
-                assigned.add(name_b)
-
-        # Post-cluster safety net — validates ALL pairs in the completed cluster.
-        # Catches cases where two blocked names entered the same cluster via
-        # a third bridging name. If any blocked pair is found, the entire cluster
-        # is discarded back to singletons — no partial merges.
-        if len(cluster) > 1:
-            has_conflict = any(
-                name_set.get(x) == "Person"
-                and name_set.get(y) == "Person"
-                and should_block_merge(x, y)
-                for x, y in combinations(cluster, 2)
-            )
-            if has_conflict:
-                logger.info(
-                    "🚫 Post-cluster conflict — splitting cluster back to singletons: %s",
-                    cluster
+                members.append(j)
+                assigned.add(j)
+
+            # Post-cluster safety net — validates ALL pairs in the completed cluster.
+            # Catches cases where two blocked names entered the same cluster via
+            # a third bridging name. If any blocked pair is found, the entire cluster
+            # is discarded back to singletons — no partial merges.
+            if len(cluster) > 1:
+                has_conflict = any(
+                    name_set.get(x) == "Person"
+                    and name_set.get(y) == "Person"
+                    and blocked(x, y)
+                    for x, y in combinations(cluster, 2)
                 )
-                # Remove non-pivot members from assigned so they can
-                # still form valid clusters with other names.
-                # The pivot (name_a) stays assigned — it was processed.
-                for name in cluster[1:]:
-                    assigned.discard(name)
-                continue
-            clusters.append(cluster)
+                if has_conflict:
+                    logger.info(
+                        "🚫 Post-cluster conflict — splitting cluster back to singletons: %s",
+                        cluster
+                    )
+                    # Remove non-pivot members from assigned so they can
+                    # still form valid clusters with other names.
+                    # The pivot (name_a) stays assigned — it was processed.
+                    for j in members[1:]:
+                        assigned.discard(j)
+                    continue
+                pivot_clusters.append((i, cluster))
+
+    # Same order as the sequential scan: by pivot position
+    clusters = [cluster for _, cluster in sorted(pivot_clusters, key=lambda pc: pc[0])]
 
     auto_registry: Dict[str, str] = {}
     ambiguous_clusters: List[List[str]] = []
@@ -351,6 +516,29 @@ def _build_entity_registry(
     return auto_registry, ambiguous_clusters
 
 
+def _compose_registries(*registries: Dict[str, str]) -> Dict[str, str]:
+    """
+    Merge name → canonical maps and follow chains to the final name: the
+    document-local "Vantage Systems" → "Vantage Systems, Inc." plus the
+    cross-document "Vantage Systems, Inc." → "Vantage Systems Inc" becomes
+    "Vantage Systems" → "Vantage Systems Inc". Earlier maps win: a later
+    mapping for a name already mapped, or one that would close a cycle, is dropped.
+    """
+    def final(name: str) -> str:
+        while name in merged:
+            name = merged[name]
+        return name
+
+    merged: Dict[str, str] = {}
+    for registry in registries:
+        for name, canonical in registry.items():
+            if name in merged or final(canonical) == name:
+                continue
+            merged[name] = canonical
+
+    return {name: final(name) for name in merged}
+
+
 def _apply_registry_to_graphs(
     all_graphs: List[dict],
     registry: Dict[str, str]
@@ -439,6 +627,29 @@ class GraphBuilder:
         # Initialise merge registry state — populated by apply_entity_registry()
         self.last_auto_registry: Dict[str, str] = {}
         self.last_llm_registry: Dict[str, str] = {}
+        # name → node type for every pre-merge name, so MERGED_INTO writes
+        # can MATCH on a label instead of scanning every node.
+        self.last_name_types: Dict[str, str] = {}
+        # (canonical → type, alias → canonical) for the entity registry
+        self.last_registry_names: Tuple[Dict[str, str], Dict[str, str]] = ({}, {})
+
+        # Query-time keyword extraction cache — shared by the sync and async paths
+        self._query_entity_cache = TTLCache(maxsize=512, ttl_s=24 * 3600)
+
+        # Persistent (model, prompt version, sha256(chunk)) → validated graph
+        self._redis = get_redis_client()
+        self.extraction_cache = build_extraction_cache(
+            self.model_name, EXTRACTION_PROMPT_VERSION, redis_client=self._redis
+        )
+
+        # Cross-document canonical names / aliases — loaded once per worker
+        self.entity_registry = get_entity_registry()
+
+    def _forget_response(self, prompt: str) -> None:
+        """Evict an unusable reply from the LLM response cache (if enabled) before retrying."""
+        forget = getattr(self.llm, "forget", None)
+        if forget is not None:
+            forget(prompt)
 
     def _parse_json_dict(self, response: str) -> dict:
         clean = re.sub(r'```(?:json)?', '', response).strip()
@@ -462,18 +673,8 @@ class GraphBuilder:
         except json.JSONDecodeError:
             return []
 
-    @traceable(name="graph_extraction")
-    def extract_relationships(
-        self,
-        text_chunk: str,
-        chunk_id: str = "",
-        document_id: str = ""
-    ) -> dict:
-        """
-        Full extraction pipeline for one chunk.
-        Returns graph dict {nodes, edges} ready for ingest_graph().
-        Never raises — returns empty graph on total failure.
-        """
+    def _extract_validated(self, text_chunk: str, chunk_id: str) -> Optional[dict]:
+        """Up to 3 single-chunk LLM attempts. Returns the validated graph or None."""
         prompt = EXTRACTION_PROMPT.format(chunk_text=text_chunk)
 
         for attempt in range(3):
@@ -483,25 +684,145 @@ class GraphBuilder:
                 graph = _validate_graph(raw)
 
                 if graph is not None:
-                    for node in graph["nodes"]:
-                        node["properties"]["document_id"] = document_id
-                        node["properties"]["chunk_id"] = chunk_id
-                    for edge in graph["edges"]:
-                        edge["properties"]["document_id"] = document_id
-                        edge["properties"]["chunk_id"] = chunk_id
                     return graph
 
                 logger.warning("Validation failed attempt %d chunk %s", attempt + 1, chunk_id)
+                self._forget_response(prompt)
 
             except json.JSONDecodeError as e:
                 logger.warning("JSON parse failed attempt %d chunk %s: %s",
                                attempt + 1, chunk_id, e)
             except Exception as e:
+                if is_throttle_error(e):
+                    raise  # the ingest limiter backs off and retries the whole batch
                 logger.warning("LLM call failed attempt %d chunk %s: %s",
                                attempt + 1, chunk_id, e)
 
         logger.error("Graph extraction failed after 3 attempts for chunk %s", chunk_id)
-        return {"nodes": [], "edges": []}
+        return None
+
+    def _extract_uncached(self, text_chunk: str, chunk_id: str, document_id: str) -> dict:
+        graph = self._extract_validated(text_chunk, chunk_id)
+        if graph is None:
+            return {"nodes": [], "edges": []}  # failures are never cached
+        self._cache_put(text_chunk, graph)
+        return self._stamp_provenance(graph, chunk_id, document_id)
+
+    def _cache_put(self, text_chunk: str, graph: dict) -> None:
+        # Stored before provenance is stamped — the entry is document-agnostic.
+        if self.extraction_cache is not None:
+            self.extraction_cache.put(text_chunk, graph)
+
+    @staticmethod
+    def _stamp_provenance(graph: dict, chunk_id: str, document_id: str) -> dict:
+        for item in graph["nodes"] + graph["edges"]:
+            props = item.setdefault("properties", {})
+            props["document_id"] = document_id
+            props["chunk_id"] = chunk_id
+        return graph
+
+    @traceable(name="graph_extraction")
+    def extract_relationships(
+        self,
+        text_chunk: str,
+        chunk_id: str = "",
+        document_id: str = "",
+        bypass_cache: bool = False
+    ) -> dict:
+        """
+        Full extraction pipeline for one chunk.
+        Returns graph dict {nodes, edges} ready for ingest_graph().
+        bypass_cache skips the cache lookup but still refreshes the entry.
+        Never raises — returns empty graph on total failure.
+        """
+        if self.extraction_cache is not None and not bypass_cache:
+            cached = self.extraction_cache.get_many([text_chunk])[0]
+            if cached is not None:
+                return self._stamp_provenance(cached, chunk_id, document_id)
+
+        return self._extract_uncached(text_chunk, chunk_id, document_id)
+
+    @traceable(name="graph_extraction_multi")
+    def extract_relationships_multi(
+        self,
+        chunks: List[Tuple[str, str]],
+        document_id: str = "",
+        bypass_cache: bool = False
+    ) -> List[dict]:
+        """
+        Extract several chunks in one LLM call (see BATCH_EXTRACTION_PROMPT).
+        chunks: [(text_chunk, chunk_id), ...] — pack with pack_chunks_by_tokens().
+        Returns one graph per chunk, in order. Cached chunks are served from
+        the extraction cache; only the misses go into the batched prompt. Any
+        section that is missing or fails _validate_graph is re-extracted on
+        its own. Raises only on rate limits (429 / quota), so the caller's
+        concurrency limiter can back off; other failures yield empty graphs.
+        """
+        graphs: List[Optional[dict]] = [None] * len(chunks)
+
+        if self.extraction_cache is not None and not bypass_cache:
+            cached = self.extraction_cache.get_many([text for text, _ in chunks])
+            for i, graph in enumerate(cached):
+                if graph is not None:
+                    graphs[i] = self._stamp_provenance(graph, chunks[i][1], document_id)
+
+        pending = [i for i, g in enumerate(graphs) if g is None]
+        if len(pending) < len(chunks):
+            print(f"      💾 Extraction cache: {len(chunks) - len(pending)}/{len(chunks)} chunks")
+
+        if len(pending) == 1:
+            text_chunk, chunk_id = chunks[pending[0]]
+            graphs[pending[0]] = self._extract_uncached(text_chunk, chunk_id, document_id)
+        elif pending:
+            self._extract_sections(chunks, pending, document_id, graphs)
+
+        return graphs
+
+    def _extract_sections(self, chunks: List[Tuple[str, str]], pending: List[int],
+                          document_id: str, graphs: List[Optional[dict]]) -> None:
+        """One batched LLM call for the chunks at the pending indices."""
+        keys = [f"s{n}" for n in range(len(pending))]
+        sections = "\n\n".join(
+            f"=== SECTION {key} ===\n{chunks[i][0]}" for key, i in zip(keys, pending)
+        )
+
+        try:
+            raw = self._parse_json_dict(
+                self.llm.generate(BATCH_EXTRACTION_PROMPT.format(chunk_sections=sections))
+            )
+        except Exception as e:
+            if is_throttle_error(e):
+                raise  # re-extracting every chunk alone would only add to the throttling
+            logger.warning("Batched extraction call failed for %d chunks: %s", len(pending), e)
+            raw = {}
+
+        if len(raw) < len(pending):
+            # Some section is missing — a cached copy of this reply would stay broken
+            self._forget_response(BATCH_EXTRACTION_PROMPT.format(chunk_sections=sections))
+
+        fallbacks = 0
+        for key, i in zip(keys, pending):
+            text_chunk, chunk_id = chunks[i]
+            section = raw.get(key)
+            graph = _validate_graph(section) if isinstance(section, dict) else None
+            if graph is None:
+                fallbacks += 1
+                logger.warning("Batched section %s invalid — re-extracting chunk %s alone",
+                               key, chunk_id)
+                graphs[i] = self._extract_uncached(text_chunk, chunk_id, document_id)
+            else:
+                self._cache_put(text_chunk, graph)
+                graphs[i] = self._stamp_provenance(graph, chunk_id, document_id)
+
+        print(f"      📦 Batched extraction: {len(pending)} chunks in 1 call"
+              f"{f' ({fallbacks} re-extracted alone)' if fallbacks else ''}")
+
+    def cache_stats(self) -> Dict:
+        """Extraction cache counters — this process, and summed across workers."""
+        return {
+            "local": self.extraction_cache.stats() if self.extraction_cache else None,
+            "shared": read_shared_stats(self._redis, EXTRACT_CACHE_STATS_KEY),
+        }
 
     async def extract_relationships_batch(
         self,
@@ -593,30 +914,57 @@ class GraphBuilder:
 
         Steps:
         1. Cluster entity names with rapidfuzz
-        2. Auto-merge high-confidence clusters
+        2. Auto-merge high-confidence clusters, then match against the
+           persistent cross-document registry (entity_registry.py)
         3. LLM resolves ambiguous clusters
-        4. Apply registry — rewrite all node names and edge ids
+        4. Apply registry — rewrite all node names and edge ids, record the
+           resulting canonicals and aliases for later documents
         5. Normalise edge types
         """
         if not all_graphs:
             return all_graphs
 
         total_nodes_before = sum(len(g.get("nodes", [])) for g in all_graphs)
+        name_types = {
+            node["name"]: node["type"]
+            for graph in all_graphs
+            for node in graph.get("nodes", [])
+        }
         print(f"   🔍 Entity registry: analysing {total_nodes_before} nodes across "
             f"{len(all_graphs)} chunks...")
 
         # Step 1+2: rapidfuzz clustering
         auto_registry, ambiguous_clusters = _build_entity_registry(all_graphs)
 
+        # Step 2b: resolve against canonical names from earlier documents
+        registry = self.entity_registry
+        cross_registry: Dict[str, str] = {}
+        if registry is not None:
+            cross_registry, cross_ambiguous = registry.resolve({
+                name: node_type for name, node_type in name_types.items()
+                if node_type in ALIAS_ENABLED_TYPES
+            })
+            # A local cluster whose names all resolved to one stored canonical is settled
+            ambiguous_clusters = [
+                cluster for cluster in ambiguous_clusters
+                if len({cross_registry.get(name, name) for name in cluster}) > 1
+            ] + cross_ambiguous
+
         # Step 3: LLM for ambiguous cases only
         llm_registry = self._resolve_ambiguous_with_llm(ambiguous_clusters)
+        if registry is not None:
+            auto_registry = registry.prefer_stored(auto_registry)
+            llm_registry = registry.prefer_stored(llm_registry)
 
-        # Step 4: Merge and apply
-        full_registry = {**auto_registry, **llm_registry}
+        # Step 4: Merge and apply — stored matches first, LLM over rapidfuzz as before
+        full_registry = _compose_registries(cross_registry, llm_registry, auto_registry)
+        llm_registry = {k: v for k, v in full_registry.items() if k in llm_registry}
+        auto_registry = {k: v for k, v in full_registry.items() if k not in llm_registry}
 
         if full_registry:
             print(f"   ✅ Entity registry: {len(full_registry)} name(s) resolved "
-                f"({len(auto_registry)} auto, {len(llm_registry)} via LLM)")
+                f"({len(auto_registry)} auto, {len(llm_registry)} via LLM, "
+                f"{sum(k in cross_registry for k in full_registry)} cross-document)")
         else:
             print(f"   ✅ Entity registry: no duplicates detected")
 
@@ -624,8 +972,27 @@ class GraphBuilder:
 
         # Step 4b: Store merge registries so ingest.py can write
         # MERGED_INTO provenance edges AFTER nodes exist in Neo4j.
+        # Canonicals from earlier documents keep the type of the name they absorbed.
+        for absorbed, canonical in full_registry.items():
+            name_types.setdefault(canonical, name_types.get(absorbed))
         self.last_auto_registry = auto_registry
         self.last_llm_registry = llm_registry
+        self.last_name_types = name_types
+
+        # Step 4c: this document's canonicals and aliases for the next one —
+        # ingest.py records them once the graph write has succeeded
+        self.last_registry_names = (
+            {
+                node["name"]: node["type"]
+                for graph in all_graphs
+                for node in graph.get("nodes", [])
+                if node["type"] in ALIAS_ENABLED_TYPES
+            },
+            {
+                absorbed: canonical for absorbed, canonical in full_registry.items()
+                if name_types.get(absorbed) in ALIAS_ENABLED_TYPES
+            },
+        )
 
         # Step 5: Edge type normalisation
         all_graphs = self._normalise_edge_types(all_graphs)
@@ -637,57 +1004,85 @@ class GraphBuilder:
 
         return all_graphs
 
-    @traceable(name="entity_extraction")
-    @lru_cache(maxsize=512)
-    def extract_query_entities(self, question: str) -> tuple:
+    def _query_entities_from_response(self, question: str, response_text: str) -> tuple:
         """
-        LLM-based keyword extraction for graph search at query time.
-        Returns tuple for lru_cache hashability.
-        Call site: list(agent.extract_query_entities(question))
+        Turn the QUERY_PROMPT response into graph search keywords.
 
         After LLM extraction, runs token-based expansion via LEGAL_TERM_EXPANSIONS
         to catch defined legal/financial terms that LLM NER misses (e.g. "IP Bridge
         Agreement" from a query phrased as "interim arrangement").
+        Falls back to long question words when the response has no JSON list.
+        """
+        result = self._parse_json_list(response_text)
+        if not result:
+            return tuple(w for w in question.split() if len(w) > 4)
+
+        keywords = list(result[:8])
+
+        # Token-based expansion — check every word in the original question
+        # against LEGAL_TERM_EXPANSIONS keys (lowercase single tokens).
+        question_tokens = question.lower().split()
+        expansions = []
+        for token in question_tokens:
+            clean_token = re.sub(r"[^a-z]", "", token)
+            if clean_token in LEGAL_TERM_EXPANSIONS:
+                expansions.extend(LEGAL_TERM_EXPANSIONS[clean_token])
+
+        if expansions:
+            # Deduplicate while preserving order — expansions appended after LLM keywords
+            seen = set(keywords)
+            for exp in expansions:
+                if exp not in seen:
+                    keywords.append(exp)
+                    seen.add(exp)
+            logger.info("Query expansion added: %s", expansions)
+
+        # Strip honorifics so "Mr. Raymond Voss" → "Raymond Voss"
+        # matches Neo4j fulltext which stores question-phrased names.
+        HONORIFICS = {"mr.", "ms.", "mrs.", "dr.", "prof.", "mx."}
+        def _strip_honorific(name: str) -> str:
+            parts = name.strip().split()
+            if parts and parts[0].lower().rstrip(".") + "." in HONORIFICS:
+                return " ".join(parts[1:])
+            return name
+
+        return tuple(_strip_honorific(k) for k in keywords)
+
+    @traceable(name="entity_extraction")
+    def extract_query_entities(self, question: str) -> tuple:
+        """
+        LLM-based keyword extraction for graph search at query time.
+        Returns a tuple; results are cached per question (shared with the async path).
+        Call site: list(agent.extract_query_entities(question))
         """
+        cached = self._query_entity_cache.get(question)
+        if cached is not None:
+            return cached
         try:
             response_text = self.llm.generate(
                 QUERY_PROMPT.format(question=question)
             )
-            result = self._parse_json_list(response_text)
-            if result:
-                keywords = list(result[:8])
-
-                # Token-based expansion — check every word in the original question
-                # against LEGAL_TERM_EXPANSIONS keys (lowercase single tokens).
-                question_tokens = question.lower().split()
-                expansions = []
-                for token in question_tokens:
-                    clean_token = re.sub(r"[^a-z]", "", token)
-                    if clean_token in LEGAL_TERM_EXPANSIONS:
-                        expansions.extend(LEGAL_TERM_EXPANSIONS[clean_token])
-
-                if expansions:
-                    # Deduplicate while preserving order — expansions appended after LLM keywords
-                    seen = set(keywords)
-                    for exp in expansions:
-                        if exp not in seen:
-                            keywords.append(exp)
-                            seen.add(exp)
-                    logger.info("Query expansion added: %s", expansions)
-
-                # Strip honorifics so "Mr. Raymond Voss" → "Raymond Voss"
-                # matches Neo4j fulltext which stores question-phrased names.
-                HONORIFICS = {"mr.", "ms.", "mrs.", "dr.", "prof.", "mx."}
-                def _strip_honorific(name: str) -> str:
-                    parts = name.strip().split()
-                    if parts and parts[0].lower().rstrip(".") + "." in HONORIFICS:
-                        return " ".join(parts[1:])
-                    return name
-
-                return tuple(_strip_honorific(k) for k in keywords)
         except Exception:
-            pass
-        return tuple(w for w in question.split() if len(w) > 4)
+            return tuple(w for w in question.split() if len(w) > 4)
+        entities = self._query_entities_from_response(question, response_text)
+        self._query_entity_cache.set(question, entities)
+        return entities
+
+    @traceable(name="entity_extraction")
+    async def aextract_query_entities(self, question: str) -> tuple:
+        """Async extract_query_entities() — awaits the provider's native async client."""
+        cached = self._query_entity_cache.get(question)
+        if cached is not None:
+            return cached
+        try:
+            response_text = await self.llm.async_generate(
+                QUERY_PROMPT.format(question=question)
+            )
+        except Exception:
+            return tuple(w for w in question.split() if len(w) > 4)
+        entities = self._query_entities_from_response(question, response_text)
+        self._query_entity_cache.set(question, entities)
+        return entities
 
 
 # ── Singleton ─────────────────────────────────────────────────────────────────
@@ -0,0 +1,487 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ── In-process adjacency snapshot ─────────────────────────────────────────────
+# Read-only copy of the Neo4j graph held by the API process: node names,
+# labels, aliases and owning document in compact arrays, edges as an
+# undirected CSR (offsets / neighbours / relationship-type codes). Once ready,
+# query_subgraph's 1–2 hop expansion and degree rankings run against it
+# without a Bolt round trip.
+#
+# Every graph writer appends one entry per write to a Redis change stream
+# (ingested document, deleted document, MERGED_INTO edge). A background
+# thread in the reading process polls the stream, re-reads only the affected
+# document from Neo4j, and publishes a new CSR. A full rebuild runs on start,
+# every GRAPH_SNAPSHOT_REBUILD_S and whenever the stream was trimmed past us.
+#
+# GRAPH_SNAPSHOT_ENABLED:     "false" (default) keeps query_subgraph on live Cypher
+#                             and the summary's top entities on GraphStats
+# GRAPH_SNAPSHOT_POLL_S:      change-stream poll interval — writes become
+#                             visible to snapshot queries within about this long
+# GRAPH_SNAPSHOT_REBUILD_S:   full rebuild interval; also compacts deleted nodes
+# GRAPH_SNAPSHOT_LOG_MAXLEN:  approximate change-stream length kept in Redis
+GRAPH_SNAPSHOT_ENABLED    = os.getenv("GRAPH_SNAPSHOT_ENABLED", "false").lower() == "true"
+GRAPH_SNAPSHOT_POLL_S     = float(os.getenv("GRAPH_SNAPSHOT_POLL_S", "2"))
+GRAPH_SNAPSHOT_REBUILD_S  = float(os.getenv("GRAPH_SNAPSHOT_REBUILD_S", "3600"))
+GRAPH_SNAPSHOT_LOG_MAXLEN = int(os.getenv("GRAPH_SNAPSHOT_LOG_MAXLEN", "10000"))
+
+_CHANGE_STREAM = "documind:graph:changes"
+
+# Same row cap and second-hop relationship types as KnowledgeBase._subgraph_query
+_SUBGRAPH_ROW_LIMIT = 50
+_LEAF_TYPES = ("RELATED_TO", "MENTIONS")
+
+_NODES_QUERY = """
+MATCH (n) WHERE n.name IS NOT NULL
+RETURN labels(n)[0] AS label, n.name AS name, n.aliases AS aliases, n.document_id AS doc
+"""
+_EDGES_QUERY = """
+MATCH (a)-[r]->(b) WHERE a.name IS NOT NULL AND b.name IS NOT NULL
+RETURN labels(a)[0] AS a_label, a.name AS a_name,
+       labels(b)[0] AS b_label, b.name AS b_name,
+       type(r) AS rel, r.document_id AS doc
+"""
+# One document's share of the graph — what an "ingest" entry re-reads
+_DOC_NODES_QUERY = """
+MATCH (n) WHERE n.document_id = $doc AND n.name IS NOT NULL
+RETURN labels(n)[0] AS label, n.name AS name, n.aliases AS aliases, n.document_id AS doc
+"""
+_DOC_EDGES_QUERY = """
+MATCH (a)-[r]->(b) WHERE r.document_id = $doc
+RETURN labels(a)[0] AS a_label, a.name AS a_name, a.aliases AS a_aliases, a.document_id AS a_doc,
+       labels(b)[0] AS b_label, b.name AS b_name, b.aliases AS b_aliases, b.document_id AS b_doc,
+       type(r) AS rel, r.document_id AS doc
+"""
+
+
+def _name_tokens(text: str) -> List[str]:
+    # Imported here — knowledge_graph imports this module at load time
+    from knowledge_graph import _name_tokens as tokens
+    return tokens(text)
+
+
+def log_graph_change(redis_client, entry: Dict) -> None:
+    """Append a write to the change stream snapshot holders poll. Never raises."""
+    if redis_client is None:
+        return
+    try:
+        redis_client.xadd(_CHANGE_STREAM, {"e": json.dumps(entry)},
+                          maxlen=GRAPH_SNAPSHOT_LOG_MAXLEN, approximate=True)
+    except Exception as e:
+        logger.warning("Graph change log append failed: %s", e)
+
+
+class _Codes:
+    """String ↔ small-int code table for labels, relationship types and documents."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value: str) -> int:
+        return self._codes.get(value, -1)
+
+
+class _Store:
+    """
+    Append-only arrays the refresher thread writes. Readers never touch them
+    directly — they get a _View whose numpy arrays are copies.
+    Node ids are stable for the life of the store; a deleted node is marked
+    dead and revived if the same (label, name) comes back.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.labels = array("h")
+        self.docs = array("i")           # owning document code, -1 = none
+        self.node_alive = array("b")
+        self.aliases: Dict[int, Tuple[str, ...]] = {}
+        self.index: Dict[Tuple[int, str], int] = {}   # (label code, name) → node id
+        self.tokens: Dict[str, List[int]] = {}        # name token → node ids
+        self.src = array("i")
+        self.dst = array("i")
+        self.rel = array("h")
+        self.edoc = array("i")
+        self.edge_alive = array("b")
+        self.label_codes = _Codes()
+        self.rel_codes = _Codes()
+        self.doc_codes = _Codes()
+        self.string_bytes = 0
+
+    def node(self, label: Optional[str], name: str, aliases=None, doc: Optional[str] = None) -> int:
+        label_code = self.label_codes.code(label or "")
+        node_id = self.index.get((label_code, name))
+        if node_id is None:
+            node_id = self.index[(label_code, name)] = len(self.names)
+            self.names.append(name)
+            self.labels.append(label_code)
+            self.docs.append(self.doc_codes.code(doc))
+            self.node_alive.append(1)
+            self.string_bytes += sys.getsizeof(name)
+            for token in set(_name_tokens(name)):
+                self.tokens.setdefault(token, []).append(node_id)
+        else:
+            self.node_alive[node_id] = 1
+            if doc is not None:
+                self.docs[node_id] = self.doc_codes.code(doc)
+        if aliases:
+            self.aliases[node_id] = tuple(aliases)
+        return node_id
+
+    def edge(self, src: int, dst: int, rel: str, doc: Optional[str]) -> None:
+        self.src.append(src)
+        self.dst.append(dst)
+        self.rel.append(self.rel_codes.code(rel))
+        self.edoc.append(self.doc_codes.code(doc))
+        self.edge_alive.append(1)
+
+    def drop_document_edges(self, doc: str) -> None:
+        code = self.doc_codes.get(doc)
+        if code < 0:
+            return
+        edoc = np.frombuffer(self.edoc, dtype=np.int32)
+        for i in np.flatnonzero(edoc == code):
+            self.edge_alive[i] = 0
+
+    def drop_orphans(self, doc: str) -> None:
+        """Same rule as delete_document: nodes doc created that no edge touches any more."""
+        code = self.doc_codes.get(doc)
+        if code < 0:
+            return
+        alive = np.frombuffer(self.edge_alive, dtype=np.int8).astype(bool)
+        ends = np.concatenate([np.frombuffer(self.src, dtype=np.int32)[alive],
+                               np.frombuffer(self.dst, dtype=np.int32)[alive]])
+        degree = np.bincount(ends, minlength=len(self.names))
+        owned = np.frombuffer(self.docs, dtype=np.int32) == code
+        for i in np.flatnonzero(owned & (degree == 0)):
+            self.node_alive[i] = 0
+
+
+class _View:
+    """One published, immutable CSR over a _Store."""
+
+    def __init__(self, store: _Store):
+        n = len(store.names)
+        self.store = store
+        self.n = n
+        self.labels = np.frombuffer(store.labels, dtype=np.int16).copy()
+        self.docs = np.frombuffer(store.docs, dtype=np.int32).copy()
+        self.node_alive = np.frombuffer(store.node_alive, dtype=np.int8).astype(bool)
+
+        edge_alive = np.frombuffer(store.edge_alive, dtype=np.int8).astype(bool)
+        src = np.frombuffer(store.src, dtype=np.int32)[edge_alive]
+        dst = np.frombuffer(store.dst, dtype=np.int32)[edge_alive]
+        rel = np.frombuffer(store.rel, dtype=np.int16)[edge_alive]
+        self.edges = int(src.size)
+
+        # Undirected CSR — each edge is listed under both endpoints, like (n)-[r]-(m)
+        ends = np.concatenate([src, dst])
+        order = np.argsort(ends, kind="stable")
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=n), out=self.offsets[1:])
+        self.neighbours = np.concatenate([dst, src])[order]
+        self.rel_types = np.concatenate([rel, rel])[order]
+        self.degree = np.diff(self.offsets)
+        self.leaf_codes = np.array(
+            [c for c in (store.rel_codes.get(t) for t in _LEAF_TYPES) if c >= 0], dtype=np.int16
+        )
+
+    def nbytes(self) -> Dict[str, int]:
+        return {name: getattr(self, name).nbytes
+                for name in ("offsets", "neighbours", "rel_types", "degree",
+                             "labels", "docs", "node_alive")}
+
+
+class GraphSnapshot:
+    """
+    Optional in-memory adjacency for read-heavy deployments.
+
+    Queries return None until the first build has been published, and
+    KnowledgeBase then falls back to live Cypher. The refresher thread owns
+    the store; readers take the current view with one attribute read, so a
+    query never waits for a refresh.
+    """
+
+    def __init__(self, driver, redis_client=None):
+        # redis_client must decode responses — stream ids and fields are used as str
+        self._driver = driver
+        self._redis = redis_client
+        self._view: Optional[_View] = None
+        self._store: Optional[_Store] = None
+        self._last_id = "0-0"
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._built_at = 0.0
+        self._counters = {"full_builds": 0, "changes_applied": 0,
+                          "last_build_ms": 0.0, "last_refresh_ms": 0.0}
+
+    @property
+    def ready(self) -> bool:
+        return self._view is not None
+
+    # ── Refresher ─────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the refresher thread once; the first full build runs on it."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="graph-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self._view is None or time.monotonic() - self._built_at > GRAPH_SNAPSHOT_REBUILD_S:
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.warning("Graph snapshot refresh failed: %s", e)
+            time.sleep(GRAPH_SNAPSHOT_POLL_S)
+
+    def build(self) -> None:
+        """Full read of the graph. The stream position is read first so nothing is missed."""
+        if self._driver is None:
+            return
+        started = time.perf_counter()
+        last_id = self._newest_change_id()
+        with self._driver.session() as session:
+            nodes = session.run(_NODES_QUERY)
+            store = self._load_nodes(nodes)
+            self._load_edges(store, session.run(_EDGES_QUERY))
+        self._store, self._last_id = store, last_id
+        self._publish()
+        self._built_at = time.monotonic()
+        self._counters["full_builds"] += 1
+        self._counters["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        view = self._view
+        print(f"🕸️ Graph snapshot built: {int(view.node_alive.sum())} nodes, {view.edges} edges "
+              f"({self._counters['last_build_ms']:.0f} ms)")
+
+    def load(self, nodes: Iterable[Dict], edges: Iterable[Dict]) -> None:
+        """Build from rows shaped like _NODES_QUERY / _EDGES_QUERY results."""
+        store = self._load_nodes(nodes)
+        self._load_edges(store, edges)
+        self._store = store
+        self._publish()
+
+    @staticmethod
+    def _load_nodes(rows: Iterable[Dict]) -> _Store:
+        store = _Store()
+        for r in rows:
+            store.node(r["label"], r["name"], r["aliases"], r["doc"])
+        return store
+
+    @staticmethod
+    def _load_edges(store: _Store, rows: Iterable[Dict]) -> None:
+        for r in rows:
+            store.edge(store.node(r["a_label"], r["a_name"]),
+                       store.node(r["b_label"], r["b_name"]), r["rel"], r["doc"])
+
+    def refresh(self) -> None:
+        """Apply the change-stream entries written since the last build/refresh."""
+        if self._redis is None or self._store is None:
+            return
+        oldest = self._redis.xrange(_CHANGE_STREAM, count=1)
+        if oldest and self._last_id != "0-0" and _stream_id(oldest[0][0]) > _stream_id(self._last_id):
+            self.build()  # entries we never saw may have been trimmed away
+            return
+        response = self._redis.xread({_CHANGE_STREAM: self._last_id})
+        if not response:
+            return
+        started = time.perf_counter()
+        applied = 0
+        for _, entries in response:
+            for entry_id, fields in entries:
+                self.apply_change(json.loads(fields["e"]), publish=False)
+                self._last_id = entry_id
+                applied += 1
+        self._publish()
+        self._counters["changes_applied"] += applied
+        self._counters["last_refresh_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def apply_change(self, entry: Dict, publish: bool = True) -> None:
+        store = self._store
+        if entry["op"] == "delete":
+            store.drop_document_edges(entry["doc"])
+            store.drop_orphans(entry["doc"])
+        elif entry["op"] == "ingest":
+            # Replace the document's edges wholesale — a re-ingest never duplicates them
+            store.drop_document_edges(entry["doc"])
+            with self._driver.session() as session:
+                for r in session.run(_DOC_NODES_QUERY, doc=entry["doc"]):
+                    store.node(r["label"], r["name"], r["aliases"], r["doc"])
+                for r in session.run(_DOC_EDGES_QUERY, doc=entry["doc"]):
+                    store.edge(store.node(r["a_label"], r["a_name"], r["a_aliases"], r["a_doc"]),
+                               store.node(r["b_label"], r["b_name"], r["b_aliases"], r["b_doc"]),
+                               r["rel"], r["doc"])
+        elif entry["op"] == "edge":
+            (a_label, a_name), (b_label, b_name) = entry["source"], entry["target"]
+            store.edge(store.node(a_label, a_name), store.node(b_label, b_name), entry["rel"], None)
+        if publish:
+            self._publish()
+
+    def _publish(self) -> None:
+        self._view = _View(self._store)
+
+    def _newest_change_id(self) -> str:
+        if self._redis is None:
+            return "0-0"
+        try:
+            newest = self._redis.xrevrange(_CHANGE_STREAM, count=1)
+        except Exception as e:
+            logger.warning("Graph change log read failed: %s", e)
+            return "0-0"
+        return newest[0][0] if newest else "0-0"
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def _seeds(self, view: _View, keywords: List[str],
+               source_filter: Optional[List[str]]) -> List[Tuple[float, int]]:
+        """
+        Nodes whose name contains a keyword as a whole-token phrase — the
+        snapshot's stand-in for the fulltext phrase query. Score is the share
+        of the name the phrase covers, so exact names rank first.
+        """
+        store = view.store
+        allowed = None
+        if source_filter:
+            allowed = {store.doc_codes.get(d) for d in source_filter} - {-1}
+        best: Dict[int, float] = {}
+        for keyword in keywords:
+            phrase = _name_tokens(keyword)
+            if not phrase:
+                continue
+            postings = [store.tokens.get(t, ()) for t in phrase]
+            candidates = set(min(postings, key=len))
+            for posting in postings:
+                candidates.intersection_update(posting)
+            for node_id in candidates:
+                if node_id >= view.n or not view.node_alive[node_id]:
+                    continue
+                if allowed is not None and view.docs[node_id] not in allowed:
+                    continue
+                name = _name_tokens(store.names[node_id])
+                if not _contains_phrase(name, phrase):
+                    continue
+                score = len(phrase) / len(name)
+                if score > best.get(node_id, 0.0):
+                    best[node_id] = score
+        return sorted(((s, i) for i, s in best.items()),
+                      key=lambda si: (-si[0], -int(view.degree[si[1]])))
+
+    def subgraph_rows(self, keywords: List[str],
+                      source_filter: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """
+        query_subgraph rows (n_name, n_aliases, rel, m_name, rel2, leaf_node,
+        score) from the snapshot; None when no snapshot has been published yet.
+        """
+        view = self._view
+        if view is None:
+            return None
+        store = view.store
+        rel_names = store.rel_codes.values
+        rows: List[Dict] = []
+        seen = set()
+        for score, node in self._seeds(view, keywords, source_filter):
+            n_name, n_aliases = store.names[node], store.aliases.get(node)
+            for k in range(view.offsets[node], view.offsets[node + 1]):
+                m = int(view.neighbours[k])
+                rel = rel_names[view.rel_types[k]]
+                m_lo, m_hi = view.offsets[m], view.offsets[m + 1]
+                leaf_slots = np.flatnonzero(np.isin(view.rel_types[m_lo:m_hi], view.leaf_codes)) + m_lo
+                second = [(rel_names[view.rel_types[j]], store.names[view.neighbours[j]])
+                          for j in leaf_slots] or [(None, None)]
+                for rel2, leaf in second:
+                    key = (node, rel, m, rel2, leaf)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    rows.append({"n_name": n_name, "n_aliases": list(n_aliases) if n_aliases else None,
+                                 "rel": rel, "m_name": store.names[m], "rel2": rel2,
+                                 "leaf_node": leaf, "score": score})
+                    if len(rows) >= _SUBGRAPH_ROW_LIMIT:
+                        return rows
+        return rows
+
+    def top_degree(self, k: int = 10, label: Optional[str] = None) -> Optional[List[Dict]]:
+        """Highest-degree entities as [{name, type, connections}]; None before the first build."""
+        view = self._view
+        if view is None:
+            return None
+        store = view.store
+        degree = np.where(view.node_alive, view.degree, 0)
+        if label is not None:
+            degree = np.where(view.labels == store.label_codes.get(label), degree, 0)
+        k = min(k, int(np.count_nonzero(degree)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-degree, k - 1)[:k]
+        top = top[np.argsort(-degree[top], kind="stable")]
+        return [{"name": store.names[i], "type": store.label_codes.values[view.labels[i]],
+                 "connections": int(degree[i])} for i in top]
+
+    # ── Reporting ─────────────────────────────────────────────────────────────
+
+    def memory_report(self) -> Dict:
+        """Node/edge counts and an estimate of the bytes this snapshot holds."""
+        view = self._view
+        if view is None:
+            return {"ready": False, **self._counters}
+        store = view.store
+        arrays = view.nbytes()
+        store_arrays = sum(a.itemsize * len(a) for a in (
+            store.labels, store.docs, store.node_alive, store.src, store.dst,
+            store.rel, store.edoc, store.edge_alive))
+        postings = list(store.tokens.values())
+        indexes = (sys.getsizeof(store.index) + sys.getsizeof(store.tokens)
+                   + sum(sys.getsizeof(p) for p in postings) + sys.getsizeof(store.names)
+                   + sys.getsizeof(store.aliases))
+        breakdown = {
+            "csr_arrays":   sum(arrays.values()),
+            "store_arrays": store_arrays,
+            "names":        store.string_bytes,
+            "indexes":      indexes,
+        }
+        alive_nodes = int(view.node_alive.sum())
+        return {
+            "ready":       True,
+            "nodes":       alive_nodes,
+            "dead_nodes":  view.n - alive_nodes,
+            "edges":       view.edges,
+            "bytes":       breakdown,
+            "total_mb":    round(sum(breakdown.values()) / 2**20, 2),
+            "age_s":       round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+            **self._counters,
+        }
+
+
+def _contains_phrase(tokens: List[str], phrase: List[str]) -> bool:
+    width = len(phrase)
+    return any(tokens[i:i + width] == phrase for i in range(len(tokens) - width + 1))
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
@@ -0,0 +1,294 @@
+import json
+import zlib
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ── Materialized graph statistics ─────────────────────────────────────────────
+# Node counts per label, edge counts per relationship type, entity degrees and
+# per-document node/edge counts. KnowledgeBase applies a delta after every
+# write and delete (taken from Neo4j's write counters), so /dashboard and
+# /graph read a few Redis keys instead of scanning the graph.
+# Shared by the API and every ingest worker; a Redis that has never held them
+# (fresh deployment, flushed cache) gets one full rebuild from Neo4j.
+_PREFIX    = "documind:graph_stats:"
+_LABELS    = _PREFIX + "labels"      # label → nodes
+_TYPES     = _PREFIX + "types"       # relationship type → edges
+_DEGREE    = _PREFIX + "degree"      # zset "label:name" → degree
+_DOC_NODES = _PREFIX + "doc_nodes"   # document_id → nodes it created
+_DOC_EDGES = _PREFIX + "doc_edges"   # document_id → edges it created
+_BUILT     = _PREFIX + "built"       # present once the counters are complete
+_REBUILD_LOCK = _PREFIX + "rebuild_lock"
+_REBUILD_LOCK_TTL_S = 300
+
+
+def degree_member(label: Optional[str], name: str) -> str:
+    return f"{label or ''}:{name}"
+
+
+class GraphStatsDelta:
+    """Count changes from one write or delete, applied to GraphStats in one round trip."""
+
+    def __init__(self):
+        self.labels: Counter = Counter()
+        self.types: Counter = Counter()
+        self.degree: Counter = Counter()
+        self.doc_nodes: Counter = Counter()
+        self.doc_edges: Counter = Counter()
+        self.removed_nodes: List[str] = []
+        self.removed_documents: List[str] = []
+
+    def nodes(self, label: str, document_id: Optional[str], n: int) -> None:
+        if n:
+            self.labels[label] += n
+            if document_id:
+                self.doc_nodes[document_id] += n
+
+    def edge(self, rel_type: str, source: str, target: str,
+             document_id: Optional[str] = None, sign: int = 1) -> None:
+        """source / target are degree_member() keys."""
+        self.types[rel_type] += sign
+        self.degree[source] += sign
+        self.degree[target] += sign
+        if document_id:
+            self.doc_edges[document_id] += sign
+
+    def node_removed(self, label: str, name: str) -> None:
+        self.labels[label] -= 1
+        self.removed_nodes.append(degree_member(label, name))
+
+    def document_removed(self, document_id: str) -> None:
+        self.removed_documents.append(document_id)
+
+    def __bool__(self) -> bool:
+        return bool(self.labels or self.types or self.degree or self.doc_nodes
+                    or self.doc_edges or self.removed_nodes or self.removed_documents)
+
+
+class GraphStats:
+    """
+    Counters behind get_graph_summary(). Without Redis they live in this
+    process only — enough for tests and single-process runs.
+    """
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._local = GraphStatsDelta()
+        self._local_built = False
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def apply(self, delta: GraphStatsDelta) -> None:
+        if not delta:
+            return
+        if self._redis is None:
+            self._apply_local(delta)
+            return
+        try:
+            with self._redis.pipeline(transaction=False) as pipe:
+                for key, counts in ((_LABELS, delta.labels), (_TYPES, delta.types),
+                                    (_DOC_NODES, delta.doc_nodes), (_DOC_EDGES, delta.doc_edges)):
+                    for field, n in counts.items():
+                        if n:
+                            pipe.hincrby(key, field, n)
+                for member, n in delta.degree.items():
+                    if n:
+                        pipe.zincrby(_DEGREE, n, member)
+                if delta.removed_nodes:
+                    pipe.zrem(_DEGREE, *delta.removed_nodes)
+                if delta.removed_documents:
+                    pipe.hdel(_DOC_NODES, *delta.removed_documents)
+                    pipe.hdel(_DOC_EDGES, *delta.removed_documents)
+                pipe.zremrangebyscore(_DEGREE, "-inf", 0)
+                pipe.execute()
+        except Exception as e:
+            # A lost delta only skews the dashboard until the next rebuild
+            logger.warning("Graph stats update failed: %s", e)
+
+    def _apply_local(self, delta: GraphStatsDelta) -> None:
+        local = self._local
+        for mine, theirs in ((local.labels, delta.labels), (local.types, delta.types),
+                             (local.degree, delta.degree), (local.doc_nodes, delta.doc_nodes),
+                             (local.doc_edges, delta.doc_edges)):
+            mine.update(theirs)
+        for member in delta.removed_nodes:
+            local.degree.pop(member, None)
+        for document_id in delta.removed_documents:
+            local.doc_nodes.pop(document_id, None)
+            local.doc_edges.pop(document_id, None)
+
+    # ── Rebuild ───────────────────────────────────────────────────────────────
+
+    def is_built(self) -> bool:
+        if self._redis is None:
+            return self._local_built
+        try:
+            return bool(self._redis.exists(_BUILT))
+        except Exception:
+            return False
+
+    def claim_rebuild(self) -> bool:
+        """One process rebuilds at a time; the others keep serving what is there."""
+        if self._redis is None:
+            return True
+        try:
+            return bool(self._redis.set(_REBUILD_LOCK, 1, nx=True, ex=_REBUILD_LOCK_TTL_S))
+        except Exception:
+            return False
+
+    def replace(self, snapshot: GraphStatsDelta) -> None:
+        """Swap in counters computed from a full scan of the graph."""
+        if self._redis is None:
+            self._local = GraphStatsDelta()
+            self._apply_local(snapshot)
+            self._local_built = True
+            return
+        try:
+            with self._redis.pipeline(transaction=True) as pipe:
+                pipe.delete(_LABELS, _TYPES, _DEGREE, _DOC_NODES, _DOC_EDGES)
+                for key, counts in ((_LABELS, snapshot.labels), (_TYPES, snapshot.types),
+                                    (_DOC_NODES, snapshot.doc_nodes), (_DOC_EDGES, snapshot.doc_edges)):
+                    if counts:
+                        pipe.hset(key, mapping=dict(counts))
+                if snapshot.degree:
+                    pipe.zadd(_DEGREE, dict(snapshot.degree))
+                pipe.set(_BUILT, 1)
+                pipe.delete(_REBUILD_LOCK)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("Graph stats rebuild could not be stored: %s", e)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def summary(self, top_k: int = 6) -> Dict:
+        if self._redis is None:
+            labels, types = dict(self._local.labels), dict(self._local.types)
+            top = self._local.degree.most_common(top_k)
+            doc_nodes, doc_edges = dict(self._local.doc_nodes), dict(self._local.doc_edges)
+        else:
+            with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(_LABELS)
+                pipe.hgetall(_TYPES)
+                pipe.zrevrange(_DEGREE, 0, top_k - 1, withscores=True)
+                pipe.hgetall(_DOC_NODES)
+                pipe.hgetall(_DOC_EDGES)
+                labels, types, top, doc_nodes, doc_edges = pipe.execute()
+            labels, types, doc_nodes, doc_edges = (
+                _int_map(m) for m in (labels, types, doc_nodes, doc_edges)
+            )
+            top = [(_text(member), score) for member, score in top]
+
+        labels = {k: v for k, v in labels.items() if v > 0}
+        types = {k: v for k, v in types.items() if v > 0}
+        top_entities = []
+        for member, score in top:
+            label, _, name = member.partition(":")
+            top_entities.append({"name": name, "type": label, "connections": int(score)})
+        return {
+            "total_nodes":    sum(labels.values()),
+            "total_links":    sum(types.values()),
+            "node_labels":    labels,
+            "relation_types": types,
+            "top_entities":   top_entities,
+            "documents": {
+                doc: {"nodes": doc_nodes.get(doc, 0), "edges": doc_edges.get(doc, 0)}
+                for doc in sorted(set(doc_nodes) | set(doc_edges))
+            },
+        }
+
+
+# ── Per-document write manifest ───────────────────────────────────────────────
+# Element ids of the nodes and edges each document created, recorded at ingest
+# so delete_document can seek them by id instead of scanning for document_id.
+# Stored as zlib-compressed JSON chunks (one per ingest write) — element ids
+# share a long prefix and compress to a few bytes each. Every key expires
+# ttl_s after the document's last write; the partial marker never does, so an
+# incomplete manifest can't later pass for a complete one.
+_MANIFEST_PREFIX = "documind:graph:manifest:"
+
+
+class GraphManifest:
+    """
+    Write manifests for delete_document. load() returns None unless every
+    write for the document was recorded — a partial manifest would leave
+    edges behind, so the caller falls back to the document_id indexes.
+    Without Redis they live in this process only.
+    """
+
+    def __init__(self, redis_client=None, ttl_s: Optional[int] = None):
+        self._redis = redis_client
+        self._ttl_s = ttl_s
+        self._local: Dict[str, Tuple[List[str], List[str]]] = {}
+
+    @staticmethod
+    def _keys(document_id: str) -> Tuple[str, str, str, str]:
+        base = _MANIFEST_PREFIX + document_id
+        return base + ":nodes", base + ":edges", base + ":complete", base + ":partial"
+
+    def record(self, document_id: str, node_ids: List[str], edge_ids: List[str]) -> None:
+        if not node_ids and not edge_ids:
+            return
+        if self._redis is None:
+            nodes, edges = self._local.setdefault(document_id, ([], []))
+            nodes.extend(node_ids)
+            edges.extend(edge_ids)
+            return
+        nodes_key, edges_key, complete_key, partial_key = self._keys(document_id)
+        try:
+            with self._redis.pipeline(transaction=True) as pipe:
+                if node_ids:
+                    pipe.rpush(nodes_key, zlib.compress(json.dumps(node_ids).encode()))
+                if edge_ids:
+                    pipe.rpush(edges_key, zlib.compress(json.dumps(edge_ids).encode()))
+                pipe.set(complete_key, 1)
+                if self._ttl_s:
+                    for key in (nodes_key, edges_key, complete_key):
+                        pipe.expire(key, self._ttl_s)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("Graph manifest write failed for %s: %s", document_id, e)
+            try:
+                self._redis.set(partial_key, 1)
+            except Exception:
+                pass
+
+    def load(self, document_id: str) -> Optional[Tuple[List[str], List[str]]]:
+        """(node_ids, edge_ids), or None when there is no complete manifest."""
+        if self._redis is None:
+            return self._local.get(document_id)
+        nodes_key, edges_key, complete_key, partial_key = self._keys(document_id)
+        try:
+            with self._redis.pipeline(transaction=False) as pipe:
+                pipe.exists(complete_key)
+                pipe.exists(partial_key)
+                pipe.lrange(nodes_key, 0, -1)
+                pipe.lrange(edges_key, 0, -1)
+                complete, partial, nodes, edges = pipe.execute()
+        except Exception as e:
+            logger.warning("Graph manifest read failed for %s: %s", document_id, e)
+            return None
+        if partial or not complete:
+            return None
+        return (
+            [i for chunk in nodes for i in json.loads(zlib.decompress(chunk))],
+            [i for chunk in edges for i in json.loads(zlib.decompress(chunk))],
+        )
+
+    def discard(self, document_id: str) -> None:
+        if self._redis is None:
+            self._local.pop(document_id, None)
+            return
+        try:
+            self._redis.delete(*self._keys(document_id))
+        except Exception as e:
+            logger.warning("Graph manifest delete failed for %s: %s", document_id, e)
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _int_map(mapping: Dict) -> Dict[str, int]:
+    return {_text(k): int(v) for k, v in mapping.items()}
@@ -3,19 +3,64 @@ import logging
 import re
 import json
 import hashlib
+import time
 import asyncio
 import redis
-from typing import List, Dict
+from typing import List, Dict, Optional
 from vector_store import VectorStore
 from parser import SmartPDFParser
-from graph_agent import get_graph_builder
+from graph_agent import get_graph_builder, pack_chunks_by_tokens
 from knowledge_graph import KnowledgeBase
+from llm_provider import llm_lane
+from concurrency import (
+    INGEST_EMBED_LATENCY_TARGET_S, get_ingest_limiter, is_throttle_error, retry_after_seconds,
+)
 
 logger = logging.getLogger(__name__)
 
 # "vllm" removed — vLLM provider is no longer part of the stack
 CLOUD_PROVIDERS = {"openai", "gemini", "groq", "anthropic", "cohere", "nvidia"}
 
+# ── Ingest pipeline ───────────────────────────────────────────────────────────
+# Parsed chunks feed two bounded queues: vector batches (embed + Qdrant upsert)
+# and token-packed graph batches (LLM extraction). Both stages drain in parallel,
+# so ingest takes roughly as long as the slowest stage rather than their sum.
+# INGEST_QUEUE_DEPTH:     batches buffered per stage ahead of its workers
+# INGEST_VECTOR_WORKERS:  concurrent embed/upsert batches per document
+# INGEST_VECTOR_BATCH:    chunks per embed/upsert batch
+INGEST_QUEUE_DEPTH    = int(os.getenv("INGEST_QUEUE_DEPTH", "8"))
+INGEST_VECTOR_WORKERS = int(os.getenv("INGEST_VECTOR_WORKERS", "2"))
+INGEST_VECTOR_BATCH   = int(os.getenv("INGEST_VECTOR_BATCH", "20"))
+
+
+class _StageMeter:
+    """Chunk count and wall-clock span (first start → last finish) of one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    def start(self) -> None:
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def done(self, chunks: int) -> None:
+        self.chunks += chunks
+        self.finished = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def report(self) -> str:
+        rate = self.chunks / self.seconds if self.seconds else 0.0
+        return (f"   📈 {self.name:<7} {self.chunks:>5} chunks in {self.seconds:6.1f}s "
+                f"({rate:.1f} chunks/s)")
+
 
 # ── Alias Pre-Pass (Stage 0) ──────────────────────────────────────────────────
 # Runs BEFORE chunking on every ingest.
@@ -213,9 +258,27 @@ def _apply_alias_resolution(raw_graphs: List[dict], alias_registry: Dict[str, st
     if not alias_registry:
         return raw_graphs
 
-    from rapidfuzz import process as fuzz_process
     from graph_agent import ALIAS_ENABLED_TYPES
 
+    # Resolve each distinct name once — the same few entities repeat across
+    # thousands of chunk graphs.
+    names = {
+        node["name"]
+        for graph in raw_graphs
+        for node in graph.get("nodes", [])
+        if node.get("type") in ALIAS_ENABLED_TYPES
+    }
+    resolved = _resolve_alias_names(names, alias_registry)
+    for name, (canonical, score) in sorted(resolved.items()):
+        if score is None:
+            print(f"   📎 Alias resolved: '{name}' → '{canonical}'")
+        else:
+            print(f"   📎 Fuzzy alias resolved: '{name}' → '{canonical}' (score: {score:.0f})")
+
+    def to_id(name: str) -> str:
+        return re.sub(r"[^a-z0-9_]", "", name.lower().replace(" ", "_").replace("-", "_"))
+
+    canonical_ids = {canonical: to_id(canonical) for canonical, _ in resolved.values()}
     substitutions = 0
 
     for graph in raw_graphs:
@@ -225,50 +288,16 @@ def _apply_alias_resolution(raw_graphs: List[dict], alias_registry: Dict[str, st
         id_remap: Dict[str, str] = {}
 
         for node in graph.get("nodes", []):
-            if node.get("type") not in ALIAS_ENABLED_TYPES:
-                continue
-
-            name = node["name"]
-            normalized = name.lower().strip()
-            if normalized.startswith("the "):
-                normalized = normalized[4:].strip()
-
-            # Exact match first
-            if normalized in alias_registry:
-                canonical = alias_registry[normalized]
-                old_id = node["id"]
-                new_id = re.sub(
-                    r"[^a-z0-9_]", "",
-                    canonical.lower().replace(" ", "_").replace("-", "_")
-                )
-                print(f"   📎 Alias resolved: '{name}' → '{canonical}'")
-                node["name"] = canonical
-                node["id"] = new_id
-                if old_id != new_id:
-                    id_remap[old_id] = new_id
-                substitutions += 1
+            if node.get("type") not in ALIAS_ENABLED_TYPES or node["name"] not in resolved:
                 continue
-
-            # Fuzzy match for OCR variants — high threshold to avoid false positives
-            match = fuzz_process.extractOne(
-                normalized,
-                alias_registry.keys(),
-                score_cutoff=95
-            )
-            if match:
-                canonical = alias_registry[match[0]]
-                old_id = node["id"]
-                new_id = re.sub(
-                    r"[^a-z0-9_]", "",
-                    canonical.lower().replace(" ", "_").replace("-", "_")
-                )
-                print(f"   📎 Fuzzy alias resolved: '{name}' → '{canonical}' "
-                      f"(score: {match[1]:.0f})")
-                node["name"] = canonical
-                node["id"] = new_id
-                if old_id != new_id:
-                    id_remap[old_id] = new_id
-                substitutions += 1
+            canonical = resolved[node["name"]][0]
+            old_id = node["id"]
+            new_id = canonical_ids[canonical]
+            node["name"] = canonical
+            node["id"] = new_id
+            if old_id != new_id:
+                id_remap[old_id] = new_id
+            substitutions += 1
 
         # Remap stale edge endpoints using old_id → new_id captured above.
         # Only runs when at least one id actually changed.
@@ -285,6 +314,55 @@ def _apply_alias_resolution(raw_graphs: List[dict], alias_registry: Dict[str, st
     return raw_graphs
 
 
+def _normalise_alias_name(name: str) -> str:
+    """Registry key form: lowercase, trimmed, leading "the " dropped."""
+    normalized = name.lower().strip()
+    if normalized.startswith("the "):
+        normalized = normalized[4:].strip()
+    return normalized
+
+
+def _resolve_alias_names(names, alias_registry: Dict[str, str]) -> Dict[str, tuple]:
+    """
+    name → (canonical, fuzzy score or None for an exact match) for every name
+    that resolves. Exact matches are dict lookups; the rest are scored against
+    every alias in one rapidfuzz cdist call — same WRatio scorer, >= 95 cutoff
+    and first-best tie-break as a per-name extractOne.
+    """
+    import numpy as np
+    from rapidfuzz import fuzz, process as fuzz_process
+
+    resolved: Dict[str, tuple] = {}
+    pending: Dict[str, List[str]] = {}  # normalized → original names
+    for name in names:
+        normalized = _normalise_alias_name(name)
+        if normalized in alias_registry:
+            resolved[name] = (alias_registry[normalized], None)
+        else:
+            pending.setdefault(normalized, []).append(name)
+
+    if not pending:
+        return resolved
+
+    queries = list(pending)
+    aliases = list(alias_registry.keys())
+    scores = fuzz_process.cdist(
+        queries, aliases, scorer=fuzz.WRatio, score_cutoff=95,
+        dtype=np.float64, workers=-1,
+    )
+    best = scores.argmax(axis=1)
+    for row, col in enumerate(best.tolist()):
+        score = scores[row, col]
+        if score >= 95:
+            for name in pending[queries[row]]:
+                resolved[name] = (alias_registry[aliases[col]], float(score))
+    return resolved
+
+
+def _print_delete_progress(phase: str, done: int, total: Optional[int]) -> None:
+    print(f"   - Graph delete: {done}{f'/{total}' if total is not None else ''} {phase}")
+
+
 class DocuMindIngest:
     def __init__(self):
         self.vector_db = VectorStore()
@@ -294,7 +372,6 @@ class DocuMindIngest:
 
         self.provider = os.getenv("LLM_PROVIDER", "nvidia").lower()
         self.is_cloud = self.provider in CLOUD_PROVIDERS
-        self.concurrency = 5 if self.is_cloud else 1
 
         # Redis client for the lifetime of this ingestor.
         # NOTE: no longer used for inference locking (Ollama lock removed).
@@ -303,10 +380,13 @@ class DocuMindIngest:
         redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
         self.redis_client = redis.Redis.from_url(redis_url)
 
-        # Global semaphore — controls concurrency across all documents
-        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # Adaptive (AIMD) limit on concurrent upstream calls across all documents:
+        # graph extraction, embedding batches and the alias pre-pass share it.
+        self.limiter = get_ingest_limiter(self.is_cloud)
 
-        print(f"⚙️ Ingestion Mode: {self.provider.upper()} | Cloud: {self.is_cloud} | Concurrency: {self.concurrency}x")
+        print(f"⚙️ Ingestion Mode: {self.provider.upper()} | Cloud: {self.is_cloud} | "
+              f"Concurrency: {self.limiter.limit:.0f}x adaptive "
+              f"({self.limiter.min_limit}-{self.limiter.max_limit})")
 
     async def cleanup(self, filename: str):
         """Wipes all traces of a file from all stores."""
@@ -318,61 +398,80 @@ class DocuMindIngest:
             print(f"   - Vector delete warning: {e}")
 
         try:
-            self.kb.delete_document(filename)
+            self.kb.delete_document(filename, progress=_print_delete_progress)
             print("   - Graph entries deleted")
         except Exception as e:
             print(f"   - Graph delete warning: {e}")
 
-    async def _call_with_retry(self, fn, *args, max_retries: int = 3, base_delay: float = 2.0):
+        if self.agent.entity_registry is not None:
+            self.agent.entity_registry.forget(filename)
+
+    async def _call_with_retry(self, fn, *args, max_retries: int = 3, base_delay: float = 2.0,
+                               latency_target_s: float | None = None):
         """
-        Retry a blocking call wrapped in asyncio.to_thread with exponential backoff.
-        Handles rate limits and transient errors.
+        Run a blocking call through the adaptive limiter, retrying failures.
+        Rate limits are not slept on here — the limiter halves its limit and
+        holds every new call (including this retry) until Retry-After passes.
+        Other errors retry with exponential backoff.
         """
+        extra = {} if latency_target_s is None else {"latency_target_s": latency_target_s}
         for attempt in range(max_retries):
             try:
-                return await asyncio.to_thread(fn, *args)
+                return await self.limiter.call(fn, *args, **extra)
             except Exception as e:
-                err_str = str(e).lower()
-                is_rate_limit = "429" in err_str or "rate limit" in err_str or "quota" in err_str
-                is_last = attempt == max_retries - 1
-
-                if is_last:
+                if attempt == max_retries - 1:
                     raise
 
-                delay = base_delay * (2 ** attempt)
-                if is_rate_limit:
-                    print(f"   ⏳ Rate limit — retrying in {delay:.0f}s ({attempt+2}/{max_retries})...")
-                else:
-                    print(f"   ⚠️ LLM error attempt {attempt+1} — retrying in {delay:.0f}s: {e}")
+                if is_throttle_error(e):
+                    wait = retry_after_seconds(e)
+                    hint = f"Retry-After {wait:.0f}s" if wait is not None else "limiter pause"
+                    print(f"   ⏳ Rate limit — retrying after {hint} ({attempt+2}/{max_retries})...")
+                    continue
 
+                delay = base_delay * (2 ** attempt)
+                print(f"   ⚠️ LLM error attempt {attempt+1} — retrying in {delay:.0f}s: {e}")
                 await asyncio.sleep(delay)
 
-    async def process_document(self, file_path: str, filename: str, cancellation_token):
-        """Orchestrates ingestion: Dedup -> Stage0(Alias) -> Parse -> Vector (batch) -> Graph (concurrent)"""
+    async def process_document(self, file_path: str, filename: str, cancellation_token,
+                               bypass_cache: bool = False):
+        """
+        Ingest one document. Every LLM call it makes — directly, in tasks or in
+        threads — runs in the bulk lane of the shared rate limiter, behind /query.
+        """
+        with llm_lane("bulk"):
+            return await self._process_document(file_path, filename, cancellation_token,
+                                                bypass_cache)
+
+    async def _process_document(self, file_path: str, filename: str, cancellation_token,
+                                bypass_cache: bool = False):
+        """
+        Orchestrates ingestion: Dedup -> Stage0(Alias) ‖ Parse -> Vector ‖ Graph -> Graph write
+        Stage 0 runs alongside parsing; vector indexing and graph extraction
+        drain their own bounded queues concurrently.
+        bypass_cache=True re-extracts every chunk instead of reusing cached graphs.
+        """
         print(f"🚀 Processing: {filename}")
+        pipeline_start = time.perf_counter()
+        alias_task = None
 
         try:
             # Dedup — always wipe prior data for clean re-ingest
             await self.cleanup(filename)
 
-            # ── Stage 0: Alias pre-pass ───────────────────────────────────────
-            # Runs on raw markdown BEFORE chunking so alias definitions that
-            # straddle chunk boundaries are never missed.
+            # ── Stage 0 ‖ Parse ───────────────────────────────────────────────
+            # Alias pre-pass runs on raw markdown BEFORE chunking so alias
+            # definitions that straddle chunk boundaries are never missed.
+            # It is only needed in Phase C, so it overlaps parsing, indexing
+            # and extraction instead of delaying them.
             # alias_registry is a local variable — never global, never shared
             # between documents, passed explicitly to _apply_alias_resolution.
-            alias_registry: Dict[str, str] = {}
-            try:
-                raw_text = await asyncio.to_thread(
-                    self.parser.get_alias_window, file_path
-                )
-                if raw_text:
-                    alias_window = _extract_alias_window(raw_text)
-                    alias_registry = _build_alias_registry(alias_window, self.agent.llm)
-            except Exception as e:
-                print(f"   ⚠️ Alias pre-pass failed (continuing without it): {e}")
+            alias_task = asyncio.create_task(self._alias_pre_pass(file_path))
 
             # Parse — offloaded to thread so event loop stays free
+            parse_meter = _StageMeter("parse")
+            parse_meter.start()
             chunks = await asyncio.to_thread(self.parser.parse_with_metadata, file_path)
+            parse_meter.done(len(chunks))
             print(f"   - Parsed {len(chunks)} chunks (Smart Layout)")
 
             if not chunks:
@@ -381,50 +480,83 @@ class DocuMindIngest:
             if cancellation_token():
                 return "cancelled"
 
-            # ── Phase A: Batch vector insert ──────────────────────────────────
-            batch_size = 20
+            # ── Phase A ‖ Phase B: vector indexing and graph extraction ───────
+            all_graphs = []
+            vector_meter = _StageMeter("vector")
+            graph_meter = _StageMeter("graph")
+
+            # Chunks are packed into token-budgeted batches — one LLM call
+            # per batch shares a single copy of the extraction instructions.
+            graph_batches = pack_chunks_by_tokens([c["text"] for c in chunks])
+            vector_batches = [
+                list(range(start, min(start + INGEST_VECTOR_BATCH, len(chunks))))
+                for start in range(0, len(chunks), INGEST_VECTOR_BATCH)
+            ]
+            print(f"   - Pipeline: {len(vector_batches)} vector batch(es) ‖ "
+                  f"{len(chunks)} chunks in {len(graph_batches)} LLM batch(es)")
+
+            vector_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_DEPTH)
+            graph_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_DEPTH)
+            vector_workers = max(1, INGEST_VECTOR_WORKERS)
+            # Enough workers to use the limiter's ceiling; the limiter decides how many run
+            graph_workers = self.limiter.max_limit
             vector_errors = 0
-            for batch_start in range(0, len(chunks), batch_size):
-                batch = chunks[batch_start:batch_start + batch_size]
-                texts = [c["text"] for c in batch]
-                metadatas = [{**c["metadata"], "source": filename} for c in batch]
-                try:
-                    self.vector_db.add_documents(
-                        texts=texts,
-                        metadatas=metadatas,
-                        filename=filename
-                    )
-                except Exception as e:
-                    print(f"   ⚠️ Vector batch error at chunk {batch_start}: {e}")
-                    vector_errors += 1
+
+            async def feed(queue: asyncio.Queue, batches: List[List[int]], workers: int):
+                for batch in batches:
+                    if cancellation_token():
+                        break
+                    await queue.put(batch)
+                for _ in range(workers):
+                    await queue.put(None)
+
+            async def index_vectors():
+                nonlocal vector_errors
+                while (batch := await vector_queue.get()) is not None:
+                    if cancellation_token():
+                        continue
+                    vector_meter.start()
+                    try:
+                        await self.limiter.call(
+                            self.vector_db.add_documents,
+                            texts=[chunks[i]["text"] for i in batch],
+                            metadatas=[{**chunks[i]["metadata"], "source": filename} for i in batch],
+                            filename=filename,
+                            latency_target_s=INGEST_EMBED_LATENCY_TARGET_S,
+                        )
+                    except Exception as e:
+                        print(f"   ⚠️ Vector batch error at chunk {batch[0]}: {e}")
+                        vector_errors += 1
+                    vector_meter.done(len(batch))
+
+            async def extract_graphs():
+                while (batch := await graph_queue.get()) is not None:
+                    if cancellation_token():
+                        continue
+                    graph_meter.start()
+                    await self._extract_graph_for_batch(batch, chunks, filename, all_graphs,
+                                                        bypass_cache)
+                    graph_meter.done(len(batch))
+
+            await asyncio.gather(
+                feed(vector_queue, vector_batches, vector_workers),
+                feed(graph_queue, graph_batches, graph_workers),
+                *(index_vectors() for _ in range(vector_workers)),
+                *(extract_graphs() for _ in range(graph_workers)),
+            )
 
             if vector_errors:
                 print(f"   ⚠️ {vector_errors} vector batch(es) failed — partial index")
-
             print(f"   ✅ Vector insert complete ({len(chunks)} chunks, {vector_errors} errors)")
 
             if cancellation_token():
                 await self.cleanup(filename)
                 return "cancelled"
 
-            # ── Phase B: Graph extraction (concurrent, LLM-driven) ────────────
-            all_graphs = []
-
-            async def extract_graph_safe(i, chunk):
-                async with self.semaphore:
-                    if cancellation_token():
-                        return
-                    await self._extract_graph_for_chunk(i, chunk, filename,
-                                                        cancellation_token, all_graphs)
-
-            tasks = [extract_graph_safe(i, chunk) for i, chunk in enumerate(chunks)]
-            await asyncio.gather(*tasks)
-
-            if cancellation_token():
-                await self.cleanup(filename)
-                return "cancelled"
+            alias_registry = await alias_task
 
             # ── Phase C: Alias resolution → Entity registry → bulk graph write ─
+            graph_failures = 0
             if all_graphs:
                 try:
                     # Step C1: deterministic alias resolution (before entity dedup)
@@ -435,17 +567,30 @@ class DocuMindIngest:
 
                     # Step C2: entity registry (rapidfuzz + nameparser + LLM dedup)
                     all_graphs = self.agent.apply_entity_registry(all_graphs)
-
-                    # Step C3: bulk Neo4j write
-                    self.kb.ingest_graph(all_graphs, filename)
+                    registry_names = self.agent.last_registry_names
+
+                    # Step C3: bulk Neo4j write (UNWIND batches per label / type)
+                    write_report = await self.kb.aingest_graph(all_graphs, filename)
+                    graph_failures = (write_report.get("nodes_failed", 0)
+                                      + write_report.get("edges_failed", 0))
+                    if graph_failures:
+                        print(f"   ⚠️ {graph_failures} graph row(s) failed to write — partial graph")
+
+                    # Step C3b: later documents may resolve to these names only
+                    # once every node carrying them is in Neo4j
+                    registry = self.agent.entity_registry
+                    if registry is not None and write_report.get("nodes_written") \
+                            and not write_report.get("nodes_failed"):
+                        await asyncio.to_thread(registry.record, filename, *registry_names)
 
                     # Step C4: MERGED_INTO provenance edges
-                    # Must run AFTER ingest_graph() so MATCH finds existing nodes.
+                    # Must run AFTER aingest_graph() so MATCH finds existing nodes.
                     # Uses the registries stored by apply_entity_registry().
                     # Each entry wrapped individually so one failure never
                     # aborts the rest.
                     auto_reg = self.agent.last_auto_registry
                     llm_reg  = self.agent.last_llm_registry
+                    name_types = self.agent.last_name_types
                     full_reg = {**auto_reg, **llm_reg}
                     for absorbed, canonical in full_reg.items():
                         # Check source BEFORE merging dicts to avoid shadow bug
@@ -457,7 +602,9 @@ class DocuMindIngest:
                                 method=method,
                                 score=85.0 if method == "rapidfuzz" else 0.0,
                                 evidence=[f"auto_merged_from_{method}"],
-                                confidence="confirmed"
+                                confidence="confirmed",
+                                absorbed_type=name_types.get(absorbed),
+                                canonical_type=name_types.get(canonical)
                             )
                         except Exception as e:
                             logger.warning(
@@ -468,7 +615,12 @@ class DocuMindIngest:
                     print(f"   ⚠️ Graph bulk write failed for {filename}: {e}")
                     print(f"   ℹ️ Vectors indexed successfully. Re-ingest to rebuild graph.")
 
-            status = "completed_partial" if vector_errors else "completed"
+            status = "completed_partial" if (vector_errors or graph_failures) else "completed"
+            for meter in (parse_meter, vector_meter, graph_meter):
+                print(meter.report())
+            elapsed = time.perf_counter() - pipeline_start
+            stage_sum = parse_meter.seconds + vector_meter.seconds + graph_meter.seconds
+            print(f"   📈 total   {elapsed:.1f}s end-to-end (stages sum to {stage_sum:.1f}s)")
             print(f"✅ Finished {filename}! Status: {status}")
             return status
 
@@ -476,23 +628,39 @@ class DocuMindIngest:
             print(f"   ❌ Fatal error for {filename}: {e}")
             await self.cleanup(filename)
             return f"failed: {e}"
+        finally:
+            # Early returns and failures leave the alias pre-pass unawaited
+            if alias_task is not None and not alias_task.done():
+                alias_task.cancel()
+
+    async def _alias_pre_pass(self, file_path: str) -> Dict[str, str]:
+        """Stage 0: alias → canonical map from the document's definition sections."""
+        try:
+            raw_text = await asyncio.to_thread(self.parser.get_alias_window, file_path)
+            if raw_text:
+                alias_window = _extract_alias_window(raw_text)
+                # Blocking LLM call — off the event loop, counted against the limiter
+                return await self.limiter.call(_build_alias_registry, alias_window, self.agent.llm)
+        except Exception as e:
+            print(f"   ⚠️ Alias pre-pass failed (continuing without it): {e}")
+        return {}
 
-    async def _extract_graph_for_chunk(self, i: int, chunk: Dict, filename: str,
-                                        cancellation_token, all_graphs: List):
-        text = chunk["text"]
-        metadata = chunk["metadata"]
-        page_num = metadata.get("page", 1)
-        chunk_id = f"{filename}::chunk_{i}::page_{page_num}"
+    async def _extract_graph_for_batch(self, batch: List[int], chunks: List[Dict],
+                                        filename: str, all_graphs: List,
+                                        bypass_cache: bool = False):
+        items = []
+        for i in batch:
+            page_num = chunks[i]["metadata"].get("page", 1)
+            items.append((chunks[i]["text"], f"{filename}::chunk_{i}::page_{page_num}"))
 
         try:
             # Ollama Redis inference lock removed — all providers are now cloud API.
-            # Concurrency is governed by self.semaphore in extract_graph_safe above.
-            graph = await self._call_with_retry(
-                self.agent.extract_relationships, text, chunk_id, filename
+            # Concurrency is governed by self.limiter inside _call_with_retry.
+            graphs = await self._call_with_retry(
+                self.agent.extract_relationships_multi, items, filename, bypass_cache
             )
 
-            if graph.get("nodes"):
-                all_graphs.append(graph)
+            all_graphs.extend(g for g in graphs if g.get("nodes"))
 
         except Exception as e:
-            print(f"      ⚠️ Chunk {i} Graph error: {e}")
+            print(f"      ⚠️ Chunks {batch[0]}-{batch[-1]} Graph error: {e}")
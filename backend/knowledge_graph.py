@@ -1,8 +1,21 @@
 import os
 import re
+import asyncio
+import json
+import time
+import base64
 import logging
-from typing import List, Dict, Optional
-from neo4j import GraphDatabase
+from itertools import groupby
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from neo4j import GraphDatabase, AsyncGraphDatabase, READ_ACCESS, WRITE_ACCESS
+
+from cache_utils import (
+    KeyedGenerations, TTLCache, get_redis_client,
+    SUBGRAPH_CACHE_SIZE, SUBGRAPH_CACHE_TTL_S,
+)
+from concurrency import LoopScoped
+from graph_stats import GraphManifest, GraphStats, GraphStatsDelta, degree_member
+from graph_snapshot import GRAPH_SNAPSHOT_ENABLED, GraphSnapshot, log_graph_change
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +30,71 @@ if not NEO4J_PASSWORD:
         "Add it to your k8s secret: documind-secrets"
     )
 
+# ── Driver / session config ───────────────────────────────────────────────────
+# The sync driver serves ingest workers and the sync agent path; the async
+# driver (one per event loop) serves aquery_subgraph and the other a* methods,
+# so graph reads overlap vector retrieval in the async agent path.
+# NEO4J_POOL_SIZE / NEO4J_ASYNC_POOL_SIZE:  max pooled Bolt connections
+# NEO4J_ACQUIRE_TIMEOUT_S:  wait for a free pooled connection before failing
+# NEO4J_FETCH_SIZE:         records pulled per round trip on read sessions
+# NEO4J_READ_ROUTING:       "read" lets read-only sessions go to followers /
+#                           read replicas when NEO4J_URI is a neo4j:// cluster
+#                           URI; "write" keeps them on the leader so reads
+#                           always see the latest ingest. No effect on bolt://.
+NEO4J_POOL_SIZE         = int(os.getenv("NEO4J_POOL_SIZE", "10"))
+NEO4J_ASYNC_POOL_SIZE   = int(os.getenv("NEO4J_ASYNC_POOL_SIZE", "50"))
+NEO4J_ACQUIRE_TIMEOUT_S = float(os.getenv("NEO4J_ACQUIRE_TIMEOUT_S", "30"))
+NEO4J_FETCH_SIZE        = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+NEO4J_READ_ROUTING      = os.getenv("NEO4J_READ_ROUTING", "read").lower()
+
+_READ_SESSION = {
+    "default_access_mode": READ_ACCESS if NEO4J_READ_ROUTING == "read" else WRITE_ACCESS,
+    "fetch_size":          NEO4J_FETCH_SIZE,
+}
+
+# ── Bulk write config ─────────────────────────────────────────────────────────
+# Rows per UNWIND statement. Each batch runs in its own explicit write
+# transaction — large enough to amortise Bolt round trips, small enough to
+# keep transaction memory bounded on 400-page filings.
+GRAPH_WRITE_BATCH_SIZE = int(os.getenv("GRAPH_WRITE_BATCH_SIZE", "500"))
+
+# Bulk UNWIND writer is the default. Set to "false" to fall back to the
+# per-row writer (one round trip per node/edge) when isolating a bad row.
+GRAPH_BULK_WRITE = os.getenv("GRAPH_BULK_WRITE", "true").lower() == "true"
+
+# ── Document delete config ────────────────────────────────────────────────────
+# delete_document removes a document's edges, then the nodes it created that
+# are left disconnected, GRAPH_DELETE_BATCH_SIZE rows per inner transaction
+# (CALL { } IN TRANSACTIONS) so transaction memory stays bounded on large
+# filings. Documents ingested with a GraphManifest are deleted by element id;
+# older ones are found through label- / type-scoped document_id indexes.
+# The manifest lists every node and edge an ingest wrote, created or merged,
+# since a merge moves an existing node's document_id to the new document.
+# Manifests live on REDIS_URL (a few bytes per id, zlib-compressed) and expire
+# after GRAPH_MANIFEST_TTL_S; an expired manifest falls back to the index scan.
+GRAPH_DELETE_BATCH_SIZE = int(os.getenv("GRAPH_DELETE_BATCH_SIZE", "5000"))
+GRAPH_MANIFEST_TTL_S    = int(os.getenv("GRAPH_MANIFEST_TTL_S", str(30 * 24 * 3600)))
+
+# ── Subgraph cache ────────────────────────────────────────────────────────────
+# query_subgraph results keyed by (keywords, doc filter). Each entry records
+# the generation of every document its rows came from and of every keyword
+# token; writers bump the documents they touched (the ingested one plus the
+# owners of existing nodes it merged into) and the tokens of every node name
+# they wrote, so only entries that could have changed are refetched.
+SUBGRAPH_GENERATIONS_KEY = "documind:graph:subgraph_generations"
+_ALL_WRITES = "*"  # bumped on every write — detects a write racing a cache fill
+
+
+def _name_tokens(text: str) -> List[str]:
+    return re.findall(r"[0-9a-z]+", text.lower())
+
+
+# ── Graph export config ───────────────────────────────────────────────────────
+# /graph/export walks source nodes in name order on each label's name index,
+# GRAPH_EXPORT_PAGE_NODES per query, and stops after the source node that
+# reaches the caller's max_edges — the returned cursor resumes from there.
+GRAPH_EXPORT_PAGE_NODES = int(os.getenv("GRAPH_EXPORT_PAGE_NODES", "500"))
+
 # ── Cypher templates ──────────────────────────────────────────────────────────
 
 NODE_UPSERT = """
@@ -25,21 +103,26 @@ ON CREATE SET n.id = $id, n.created_at = timestamp(),
               n.document_id = $document_id, n.chunk_id = $chunk_id
 ON MATCH SET  n.updated_at = timestamp()
 SET n += $properties
+RETURN n.document_id AS document_id, elementId(n) AS id
 """
 
+# Endpoints are matched by label + name so Neo4j can seek the per-label
+# uniqueness constraint / range index instead of scanning every node.
+# source_type / target_type come from the extracted graph (id → node type).
 EDGE_UPSERT = """
-MATCH (a {{name: $source_name}})
-MATCH (b {{name: $target_name}})
+MATCH (a:{source_type} {{name: $source_name}})
+MATCH (b:{target_type} {{name: $target_name}})
 MERGE (a)-[r:{edge_type}]->(b)
 ON CREATE SET r.created_at = timestamp(),
               r.document_id = $document_id, r.chunk_id = $chunk_id
+RETURN elementId(r) AS id
 """
 
 # Safe list-merge for aliases — never overwrites existing aliases from prior ingests.
 # Only runs for ALIAS_ENABLED_TYPES (Person, Organization).
 # Pure Cypher list comprehension — no APOC dependency required.
 ALIAS_UPSERT = """
-MATCH (n {name: $name})
+MATCH (n:{node_type} {{name: $name}})
 SET n.aliases =
   CASE
     WHEN n.aliases IS NULL THEN $aliases
@@ -50,52 +133,432 @@ SET n.aliases =
 # Merge provenance edge — written when a node is absorbed into a canonical.
 # method:     how the merge was decided (nameparser_guard / topology / rapidfuzz / llm)
 # confidence: blocked / uncertain / confirmed
+# Labels are optional here — a caller that does not know an endpoint's type
+# gets an unlabelled (full-scan) MATCH for that side only.
 MERGED_INTO_UPSERT = """
-MATCH (a {name: $absorbed_name})
-MATCH (b {name: $canonical_name})
+MATCH (a{absorbed_label} {{name: $absorbed_name}})
+MATCH (b{canonical_label} {{name: $canonical_name}})
 MERGE (a)-[m:MERGED_INTO]->(b)
 SET m.method     = $method,
     m.score      = $score,
     m.evidence   = $evidence,
     m.timestamp  = datetime(),
     m.confidence = $confidence
+RETURN labels(a)[0] AS absorbed_type, labels(b)[0] AS canonical_type,
+       a.document_id AS absorbed_doc, b.document_id AS canonical_doc
+"""
+
+# Bulk variants — one statement per label / relationship type per batch.
+# Semantics are identical to the per-row templates above; rows are applied
+# in list order so later chunks still win on SET n += properties.
+NODE_UPSERT_BATCH = """
+UNWIND $rows AS row
+MERGE (n:{node_type} {{name: row.name}})
+ON CREATE SET n.id = row.id, n.created_at = timestamp(),
+              n.document_id = $document_id, n.chunk_id = row.chunk_id
+ON MATCH SET  n.updated_at = timestamp()
+SET n += row.properties
+// ids of every node written, created or merged — row.properties carries
+// document_id, so a merged node now belongs to this document too
+WITH DISTINCT n
+RETURN collect(DISTINCT n.document_id) AS document_ids, collect(elementId(n)) AS ids
+"""
+
+EDGE_UPSERT_BATCH = """
+UNWIND $rows AS row
+MATCH (a:{source_type} {{name: row.source_name}})
+MATCH (b:{target_type} {{name: row.target_name}})
+MERGE (a)-[r:{edge_type}]->(b)
+ON CREATE SET r.created_at = timestamp(), r._new = true,
+              r.document_id = $document_id, r.chunk_id = row.chunk_id
+// The aggregation sees every row's MERGE before the marker is removed, so an
+// edge created by one row and matched by a later one still counts as created.
+// _new never outlives the transaction.
+WITH a, b, r, count(r._new) > 0 AS created
+REMOVE r._new
+RETURN a.name AS source, b.name AS target, elementId(r) AS id, created
+"""
+
+ALIAS_UPSERT_BATCH = """
+UNWIND $rows AS row
+MATCH (n:{node_type} {{name: row.name}})
+SET n.aliases =
+  CASE
+    WHEN n.aliases IS NULL THEN row.aliases
+    ELSE n.aliases + [x IN row.aliases WHERE NOT x IN n.aliases]
+  END
+"""
+
+# Batched deletes — auto-commit only (session.run), one inner transaction per
+# {batch} rows. Values are read before DELETE; a deleted entity has none.
+# Each template returns what GraphStatsDelta needs to undo the counts.
+_EDGE_DELETE_RETURN = """
+    WITH a, b, r, type(r) AS rel
+    DELETE r
+    RETURN labels(a)[0] AS source_type, a.name AS source,
+           labels(b)[0] AS target_type, b.name AS target, rel
+}} IN TRANSACTIONS OF {batch} ROWS
+RETURN source_type, source, target_type, target, rel
+"""
+_NODE_DELETE_RETURN = """
+    WITH n, labels(n)[0] AS label, n.name AS name
+    DELETE n
+    RETURN label, name
+}} IN TRANSACTIONS OF {batch} ROWS
+RETURN label, name
+"""
+
+EDGE_DELETE_BY_ID = """
+UNWIND $ids AS id
+CALL {{
+    WITH id
+    MATCH (a)-[r]->(b) WHERE elementId(r) = id AND r.document_id = $f
+""" + _EDGE_DELETE_RETURN
+
+EDGE_DELETE_BY_TYPE = """
+MATCH (a)-[r:{edge_type}]->(b) WHERE r.document_id = $f
+CALL {{
+    WITH a, b, r
+""" + _EDGE_DELETE_RETURN
+
+# Only nodes that belong to this document and are now disconnected —
+# shared nodes survive untouched.
+NODE_DELETE_BY_ID = """
+UNWIND $ids AS id
+CALL {{
+    WITH id
+    MATCH (n) WHERE elementId(n) = id AND n.document_id = $f AND NOT (n)--()
+""" + _NODE_DELETE_RETURN
+
+NODE_DELETE_BY_LABEL = """
+MATCH (n:{node_type}) WHERE n.document_id = $f AND NOT (n)--()
+CALL {{
+    WITH n
+""" + _NODE_DELETE_RETURN
+
+
+def _write_batch_tx(tx, query: str, rows: List[Dict], params: Dict):
+    """Unit of work for session.execute_write — one UNWIND statement."""
+    result = tx.run(query, rows=rows, **params)
+    records = result.data()
+    return records, result.consume().counters
+
+
+async def _awrite_batch_tx(tx, query: str, rows: List[Dict], params: Dict):
+    """_write_batch_tx() for AsyncSession.execute_write."""
+    result = await tx.run(query, rows=rows, **params)
+    records = await result.data()
+    summary = await result.consume()
+    return records, summary.counters
+
+
+def _record_batch(report: Dict, kind: str, key: str, batch: List[Dict],
+                  t0: float, error: Optional[Exception] = None) -> None:
+    """Count one UNWIND batch into the write report."""
+    if error is None:
+        report[f"{kind}_written"] += len(batch)
+    else:
+        report[f"{kind}_failed"] += len(batch)
+        logger.warning("Bulk %s batch failed (%s, %d rows): %s", kind, key, len(batch), error)
+    report["batches"].append({
+        "kind":  kind,
+        "key":   key,
+        "rows":  len(batch),
+        "ms":    round((time.perf_counter() - t0) * 1000, 2),
+        "error": None if error is None else str(error),
+    })
+
+
+def _encode_export_cursor(label: str, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([label, name]).encode()).decode()
+
+
+def _decode_export_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for anything _encode_export_cursor did not produce."""
+    try:
+        label, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid graph export cursor: {cursor!r}") from e
+    from graph_agent import ALLOWED_NODE_TYPES
+    if label not in ALLOWED_NODE_TYPES or not isinstance(name, str):
+        raise ValueError(f"Invalid graph export cursor: {cursor!r}")
+    return label, name
+
+
+def _node_props(node: Dict) -> Dict:
+    """
+    Node properties minus aliases.
+    aliases must never flow through SET n += $properties because that
+    overwrites existing alias lists — alias persistence has its own template.
+    """
+    return {k: v for k, v in node.get("properties", {}).items() if k != "aliases"}
+
+
+def _group_node_rows(graphs: List[Dict]) -> Dict[str, List[Dict]]:
+    """node_type → UNWIND rows, in chunk order."""
+    groups: Dict[str, List[Dict]] = {}
+    for graph in graphs:
+        for node in graph.get("nodes", []):
+            groups.setdefault(node["type"], []).append({
+                "name":       node["name"],
+                "id":         node["id"],
+                "chunk_id":   node.get("properties", {}).get("chunk_id", ""),
+                "properties": _node_props(node),
+            })
+    return groups
+
+
+def _group_edge_rows(graphs: List[Dict]) -> Tuple[Dict[Tuple[str, str, str], List[Dict]], int]:
+    """
+    (edge_type, source_type, target_type) → UNWIND rows, in chunk order.
+    Node ids are chunk-local, so endpoints are resolved per graph.
+    Returns (groups, skipped) — skipped counts edges with an unknown endpoint.
+    """
+    groups: Dict[Tuple[str, str, str], List[Dict]] = {}
+    skipped = 0
+    for graph in graphs:
+        id_to_node = {n["id"]: n for n in graph.get("nodes", [])}
+        for edge in graph.get("edges", []):
+            source = id_to_node.get(edge["source_id"])
+            target = id_to_node.get(edge["target_id"])
+            if not source or not target:
+                skipped += 1
+                continue
+            key = (edge["type"], source["type"], target["type"])
+            groups.setdefault(key, []).append({
+                "source_name": source["name"],
+                "target_name": target["name"],
+                "chunk_id":    edge.get("properties", {}).get("chunk_id", ""),
+            })
+    return groups, skipped
+
+
+def _group_alias_rows(graphs: List[Dict]) -> Dict[str, List[Dict]]:
+    """node_type → alias list-merge rows, for nodes that carry aliases."""
+    groups: Dict[str, List[Dict]] = {}
+    for graph in graphs:
+        for node in graph.get("nodes", []):
+            aliases = node.get("properties", {}).get("aliases")
+            if aliases:
+                groups.setdefault(node["type"], []).append(
+                    {"name": node["name"], "aliases": aliases}
+                )
+    return groups
+
+
+# COUNT { (n)--() } reads the node's degree; the total comes from the
+# count store — neither scans the graph.
+_EDGE_TOTAL_QUERY = "MATCH ()-[r]->() RETURN count(r) AS total"
+_VISUALIZATION_QUERY = """
+MATCH (s)-[r]->(o)
+RETURN
+    s.name AS source,
+    labels(s)[0] AS source_type,
+    COUNT { (s)--() } AS source_degree,
+    type(r) AS relation,
+    o.name AS target,
+    labels(o)[0] AS target_type,
+    COUNT { (o)--() } AS target_degree
+LIMIT $limit
 """
 
 
+def _visualization_limit(limit: int) -> int:
+    return min(max(limit, 1), 5000)
+
+
+def _visualization_payload(total: int, records) -> Dict:
+    nodes = {}
+    links = []
+    for rec in records:
+        nodes[rec["source"]] = {"id": rec["source"], "group": rec["source_type"],
+                                "degree": rec["source_degree"]}
+        nodes[rec["target"]] = {"id": rec["target"], "group": rec["target_type"],
+                                "degree": rec["target_degree"]}
+        links.append({
+            "source": rec["source"],
+            "target": rec["target"],
+            "label":  rec["relation"]
+        })
+    return {"nodes": list(nodes.values()), "links": links, "total": total}
+
+
+def _format_graph_statistics(summary: Dict) -> str:
+    total = sum(1 for counts in summary["documents"].values() if counts["nodes"])
+    stats = [f"TOTAL DOCS: {total}", "TOP ENTITIES:"] + \
+            [f"- {e['name']}: {e['connections']}" for e in summary["top_entities"]]
+    return "\n".join(stats)
+
+
+def _label(node_type: Optional[str]) -> str:
+    """':Type' label clause, or '' when the type is unknown."""
+    return f":{node_type}" if node_type else ""
+
+
+def _new_write_report(mode: str) -> Dict:
+    return {
+        "mode":            mode,
+        "nodes_written":   0,
+        "nodes_failed":    0,
+        "edges_written":   0,
+        "edges_failed":    0,
+        "edges_skipped":   0,
+        "aliases_written": 0,
+        "aliases_failed":  0,
+        "nodes_created":   0,
+        "edges_created":   0,
+        "batches":         [],
+        "elapsed_ms":      0.0,
+    }
+
+
+class _BulkWrite:
+    """
+    One bulk ingest: its UNWIND steps in write order, plus what the
+    committed batches report back (stats delta, written ids, touched docs).
+    Shared by the sync and async writers.
+    """
+
+    def __init__(self, graphs: List[Dict], document_id: str, batch_size: int):
+        self.graphs = graphs
+        self.document_id = document_id
+        self.batch_size = max(1, batch_size)
+        self.started = time.perf_counter()
+        self.report = _new_write_report("bulk")
+        self.delta = GraphStatsDelta()
+        self.touched_docs = {document_id}
+        self.node_ids: List[str] = []
+        self.edge_ids: List[str] = []
+
+        node_groups = _group_node_rows(graphs)
+        edge_groups, self.report["edges_skipped"] = _group_edge_rows(graphs)
+        alias_groups = _group_alias_rows(graphs)
+        self.edge_types = {edge_type for edge_type, _, _ in edge_groups}
+        params = {"document_id": document_id}
+
+        # (kind, key, query, rows, params, on_written) — _run_batches arguments
+        self.steps = [
+            ("nodes", node_type, NODE_UPSERT_BATCH.format(node_type=node_type), rows, params,
+             self._on_nodes(node_type))
+            for node_type, rows in node_groups.items()
+        ] + [
+            ("edges", f"{source_type}-{edge_type}->{target_type}",
+             EDGE_UPSERT_BATCH.format(edge_type=edge_type, source_type=source_type,
+                                      target_type=target_type),
+             rows, params, self._on_edges(edge_type, source_type, target_type))
+            for (edge_type, source_type, target_type), rows in edge_groups.items()
+        ] + [
+            ("aliases", node_type, ALIAS_UPSERT_BATCH.format(node_type=node_type), rows, {}, None)
+            for node_type, rows in alias_groups.items()
+        ]
+
+    def _on_nodes(self, node_type: str):
+        def on_nodes(records, counters):
+            for r in records:
+                self.touched_docs.update(r["document_ids"])
+                self.node_ids.extend(r["ids"])
+            self.report["nodes_created"] += counters.nodes_created
+            self.delta.nodes(node_type, self.document_id, counters.nodes_created)
+        return on_nodes
+
+    def _on_edges(self, edge_type: str, source_type: str, target_type: str):
+        def on_edges(records, counters):
+            self.edge_ids.extend(r["id"] for r in records)
+            for r in records:
+                if not r["created"]:
+                    continue
+                self.report["edges_created"] += 1
+                self.delta.edge(edge_type, degree_member(source_type, r["source"]),
+                                degree_member(target_type, r["target"]), self.document_id)
+        return on_edges
+
+
 class KnowledgeBase:
     def __init__(self):
         self.driver = None
+        # Async driver for the async agent graph — opened on first use in each
+        # event loop, since it binds to the loop it is created in.
+        self._async_drivers = LoopScoped(self._open_async_driver, lambda driver: driver.close())
+        redis_client = get_redis_client()
+        self._redis = redis_client
+        self.stats = GraphStats(redis_client)
+        self.manifest = GraphManifest(redis_client, ttl_s=GRAPH_MANIFEST_TTL_S)
+        self._edge_indexes: set = set()  # relationship types with a document_id index
+        self._subgraph_cache = TTLCache(maxsize=SUBGRAPH_CACHE_SIZE, ttl_s=SUBGRAPH_CACHE_TTL_S)
+        self._subgraph_generations = KeyedGenerations(SUBGRAPH_GENERATIONS_KEY, redis_client)
+        self._subgraph_stale = 0
         try:
             self.driver = GraphDatabase.driver(
                 NEO4J_URI,
                 auth=(NEO4J_USER, NEO4J_PASSWORD),
-                max_connection_pool_size=10,
-                connection_acquisition_timeout=30
+                max_connection_pool_size=NEO4J_POOL_SIZE,
+                connection_acquisition_timeout=NEO4J_ACQUIRE_TIMEOUT_S
             )
             self.driver.verify_connectivity()
             print("✅ Connected to Neo4j Graph Database")
             self._initialize_schema()
         except Exception as e:
             print(f"❌ Neo4j Connection Failed: {e}")
+        # Built on the first query_subgraph, not here — ingest workers never read it
+        self.snapshot = (GraphSnapshot(self.driver, get_redis_client(decode_responses=True))
+                         if GRAPH_SNAPSHOT_ENABLED and self.driver else None)
 
     def close(self):
         if self.driver:
             self.driver.close()
 
+    @property
+    def async_driver(self):
+        """Async driver for the running event loop — each loop gets its own pool."""
+        if not self.driver:
+            return None
+        return self._async_drivers.get()
+
+    def _open_async_driver(self):
+        return AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=NEO4J_ASYNC_POOL_SIZE,
+            connection_acquisition_timeout=NEO4J_ACQUIRE_TIMEOUT_S
+        )
+
+    async def aclose(self):
+        await self._async_drivers.aclose()
+
     def _initialize_schema(self):
+        from graph_agent import ALLOWED_NODE_TYPES
+
         constraints = [
             "CREATE CONSTRAINT person_name IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE",
             "CREATE CONSTRAINT org_name IF NOT EXISTS FOR (o:Organization) REQUIRE o.name IS UNIQUE",
             "CREATE CONSTRAINT location_name IF NOT EXISTS FOR (l:Location) REQUIRE l.name IS UNIQUE",
             "CREATE CONSTRAINT concept_name IF NOT EXISTS FOR (c:Concept) REQUIRE c.name IS UNIQUE",
         ]
+        # Label-scoped MATCH/MERGE on name needs an index for every node type.
+        # Constrained labels already have a backing range index — a second
+        # index on the same (label, property) is rejected by Neo4j, so only
+        # the unconstrained types get an explicit one.
+        constrained = {"Person", "Organization", "Location", "Concept"}
+        range_indexes = [
+            f"CREATE RANGE INDEX {node_type.lower()}_name IF NOT EXISTS "
+            f"FOR (n:{node_type}) ON (n.name)"
+            for node_type in sorted(ALLOWED_NODE_TYPES - constrained)
+        ]
+        # delete_document's fallback path (documents without a manifest) looks
+        # nodes up by document_id per label; relationship types get theirs on
+        # first write, see _ensure_edge_indexes().
+        document_indexes = [
+            f"CREATE RANGE INDEX {node_type.lower()}_document_id IF NOT EXISTS "
+            f"FOR (n:{node_type}) ON (n.document_id)"
+            for node_type in sorted(ALLOWED_NODE_TYPES)
+        ]
         fulltext_indexes = [
             """CREATE FULLTEXT INDEX entity_fulltext IF NOT EXISTS
                FOR (n:Person|Organization|Location|Technology|Product|Event|Concept|Document|Law|Date|Amount)
                ON EACH [n.name]""",
         ]
         with self.driver.session() as session:
-            for stmt in constraints + fulltext_indexes:
+            for stmt in constraints + range_indexes + document_indexes + fulltext_indexes:
                 try:
                     session.run(stmt)
                 except Exception as e:
@@ -104,76 +567,270 @@ class KnowledgeBase:
                         pass
                     else:
                         raise RuntimeError(f"Schema init failed: {e}") from e
+            self._edge_indexes = {
+                r["types"][0] for r in session.run(
+                    "SHOW INDEXES YIELD entityType, labelsOrTypes AS types, properties "
+                    "WHERE entityType = 'RELATIONSHIP' AND properties = ['document_id'] "
+                    "RETURN types"
+                )
+            }
+
+    def _ensure_edge_indexes(self, edge_types) -> None:
+        """
+        Relationship types come from extraction, not a fixed list, so each
+        new type gets its document_id index the first time it is written.
+        """
+        missing = set(edge_types) - self._edge_indexes
+        if not missing:
+            return
+        with self.driver.session() as session:
+            for edge_type in sorted(missing):
+                try:
+                    session.run(
+                        f"CREATE RANGE INDEX rel_{edge_type.lower()}_document_id IF NOT EXISTS "
+                        f"FOR ()-[r:{edge_type}]-() ON (r.document_id)"
+                    ).consume()
+                except Exception as e:
+                    err = str(e).lower()
+                    if "already exists" not in err and "equivalent" not in err:
+                        logger.warning("document_id index for %s failed: %s", edge_type, e)
+                        continue
+                self._edge_indexes.add(edge_type)
 
-    def ingest_graph(self, graphs: List[Dict], document_id: str) -> None:
+    def ingest_graph(
+        self,
+        graphs: List[Dict],
+        document_id: str,
+        bulk: Optional[bool] = None,
+        batch_size: Optional[int] = None
+    ) -> Dict:
         """
-        Bulk Neo4j write for all chunk graphs from one document.
+        Neo4j write for all chunk graphs from one document.
         graphs: list of {nodes, edges} dicts returned by extract_relationships().
-        Nodes written before edges. One session for the entire document.
-        chunk_id is read per-node from its own properties — no hoisting.
+        Nodes written before edges. chunk_id is read per-node from its own
+        properties — no hoisting.
+
+        bulk=True (default, GRAPH_BULK_WRITE) groups nodes by label and edges by
+        relationship type and sends each group as UNWIND batches of batch_size
+        rows, one explicit write transaction per batch.
+        bulk=False keeps the per-row writer (one round trip per node/edge).
+
+        Returns a write report: written/failed counts per kind plus per-batch
+        timings, so a failed batch never hides behind an overall success.
         """
         if not self.driver or not graphs:
-            return
+            return _new_write_report("skipped")
+
+        if bulk is None:
+            bulk = GRAPH_BULK_WRITE
+        if bulk:
+            return self._ingest_graph_bulk(graphs, document_id,
+                                           batch_size or GRAPH_WRITE_BATCH_SIZE)
+
+        report = _new_write_report("per_row")
+        started = time.perf_counter()
+        delta = GraphStatsDelta()
+        touched_docs = {document_id}
+        node_ids: List[str] = []
+        edge_ids: List[str] = []
+        self._ensure_edge_indexes({e["type"] for graph in graphs for e in graph.get("edges", [])})
 
         with self.driver.session() as session:
             for graph in graphs:
                 # Nodes first — chunk_id comes from each node's own properties
                 for node in graph.get("nodes", []):
                     try:
-                        # Strip aliases from properties before NODE_UPSERT.
-                        # aliases must never flow through SET n += $properties
-                        # because that overwrites existing alias lists.
                         # _ingest_aliases() handles alias persistence safely.
-                        props = {k: v for k, v in
-                                 node.get("properties", {}).items()
-                                 if k != "aliases"}
-                        session.run(
+                        result = session.run(
                             NODE_UPSERT.format(node_type=node["type"]),
                             name=node["name"],
                             id=node["id"],
                             document_id=document_id,
                             chunk_id=node.get("properties", {}).get("chunk_id", ""),
-                            properties=props
+                            properties=_node_props(node)
                         )
+                        record = result.single()
+                        touched_docs.add(record["document_id"])
+                        counters = result.consume().counters
+                        report["nodes_written"] += 1
+                        report["nodes_created"] += counters.nodes_created
+                        node_ids.append(record["id"])
+                        delta.nodes(node["type"], document_id, counters.nodes_created)
                     except Exception as e:
+                        report["nodes_failed"] += 1
                         logger.warning("Node upsert failed %s: %s", node.get("name"), e)
 
-                # Edges after all nodes in this chunk exist
-                id_to_name = {n["id"]: n["name"] for n in graph.get("nodes", [])}
+                # Edges after all nodes in this chunk exist.
+                # Endpoint types come from the same chunk graph as the ids.
+                id_to_node = {n["id"]: n for n in graph.get("nodes", [])}
                 for edge in graph.get("edges", []):
-                    source_name = id_to_name.get(edge["source_id"])
-                    target_name = id_to_name.get(edge["target_id"])
-                    if not source_name or not target_name:
+                    source = id_to_node.get(edge["source_id"])
+                    target = id_to_node.get(edge["target_id"])
+                    if not source or not target:
+                        report["edges_skipped"] += 1
                         continue
+                    source_name = source["name"]
+                    target_name = target["name"]
                     try:
-                        session.run(
-                            EDGE_UPSERT.format(edge_type=edge["type"]),
+                        result = session.run(
+                            EDGE_UPSERT.format(edge_type=edge["type"],
+                                               source_type=source["type"],
+                                               target_type=target["type"]),
                             source_name=source_name,
                             target_name=target_name,
                             document_id=document_id,
                             chunk_id=edge.get("properties", {}).get("chunk_id", "")
                         )
+                        record = result.single()
+                        counters = result.consume().counters
+                        report["edges_written"] += 1
+                        edge_ids.append(record["id"])
+                        if counters.relationships_created:
+                            report["edges_created"] += 1
+                            delta.edge(edge["type"],
+                                       degree_member(source["type"], source_name),
+                                       degree_member(target["type"], target_name),
+                                       document_id)
                     except Exception as e:
+                        report["edges_failed"] += 1
                         logger.warning("Edge upsert failed %s->%s: %s",
                                        source_name, target_name, e)
 
-        total_nodes = sum(len(g.get("nodes", [])) for g in graphs)
-        total_edges = sum(len(g.get("edges", [])) for g in graphs)
-        print(f"   -> Graph stored {total_nodes} nodes, {total_edges} edges for {document_id}")
+        print(f"   -> Graph stored {report['nodes_written']} nodes, "
+              f"{report['edges_written']} edges for {document_id}")
+        self.manifest.record(document_id, node_ids, edge_ids)
+        self.stats.apply(delta)
+        self._invalidate_subgraphs(touched_docs, graphs)
 
         # Write aliases for identity-bearing nodes (Person, Organization only)
-        self._ingest_aliases(graphs)
+        written, failed = self._ingest_aliases(graphs)
+        report["aliases_written"] = written
+        report["aliases_failed"] = failed
+        log_graph_change(self._redis, {"op": "ingest", "doc": document_id})
+        report["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        return report
+
+    def _ingest_graph_bulk(self, graphs: List[Dict], document_id: str, batch_size: int) -> Dict:
+        """
+        UNWIND-batched writer behind ingest_graph(bulk=True).
+        Order: every node group → every edge group → aliases, so edges from
+        chunk N can reference nodes first seen in chunk M > N.
+        A failed batch is logged and counted; remaining batches still run.
+        """
+        write = _BulkWrite(graphs, document_id, batch_size)
+        self._ensure_edge_indexes(write.edge_types)
+        with self.driver.session() as session:
+            for step in write.steps:
+                self._run_batches(session, write.report, *step, batch_size=write.batch_size)
+        return self._finish_bulk_write(write)
+
+    async def aingest_graph(
+        self,
+        graphs: List[Dict],
+        document_id: str,
+        batch_size: Optional[int] = None
+    ) -> Dict:
+        """
+        ingest_graph() on the async driver — same UNWIND batches, transactions
+        and write report, without holding a thread for the Bolt round trips.
+        The per-row writer (GRAPH_BULK_WRITE=false) runs on a worker thread.
+        """
+        if not self.driver or not graphs:
+            return _new_write_report("skipped")
+        if not GRAPH_BULK_WRITE:
+            return await asyncio.to_thread(self.ingest_graph, graphs, document_id, False, batch_size)
+
+        write = _BulkWrite(graphs, document_id, batch_size or GRAPH_WRITE_BATCH_SIZE)
+        await asyncio.to_thread(self._ensure_edge_indexes, write.edge_types)
+        async with self.async_driver.session() as session:
+            for step in write.steps:
+                await self._arun_batches(session, write.report, *step, batch_size=write.batch_size)
+        return self._finish_bulk_write(write)
+
+    def _finish_bulk_write(self, write: "_BulkWrite") -> Dict:
+        report, document_id = write.report, write.document_id
+        self.manifest.record(document_id, write.node_ids, write.edge_ids)
+        self.stats.apply(write.delta)
+        self._invalidate_subgraphs(write.touched_docs, write.graphs)
+        log_graph_change(self._redis, {"op": "ingest", "doc": document_id})
+        report["elapsed_ms"] = (time.perf_counter() - write.started) * 1000
+        failed = report["nodes_failed"] + report["edges_failed"] + report["aliases_failed"]
+        print(f"   -> Graph stored {report['nodes_written']} nodes, "
+              f"{report['edges_written']} edges for {document_id} "
+              f"({len(report['batches'])} batch(es), {report['elapsed_ms']:.0f} ms"
+              f"{f', {failed} row(s) failed' if failed else ''})")
+        if report["aliases_written"]:
+            print(f"   -> Alias merge: {report['aliases_written']} node(s) updated")
+        return report
+
+    def _run_batches(
+        self,
+        session,
+        report: Dict,
+        kind: str,
+        key: str,
+        query: str,
+        rows: List[Dict],
+        params: Dict,
+        on_written=None,
+        batch_size: int = GRAPH_WRITE_BATCH_SIZE
+    ) -> None:
+        """
+        Send rows in batch_size slices, recording timing and outcome per batch.
+        on_written(records, counters) sees each committed batch's RETURN rows
+        and Neo4j write counters.
+        """
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            t0 = time.perf_counter()
+            error = None
+            try:
+                records, counters = session.execute_write(_write_batch_tx, query, batch, params)
+                if on_written:
+                    on_written(records, counters)
+            except Exception as e:
+                error = e
+            _record_batch(report, kind, key, batch, t0, error)
+
+    async def _arun_batches(
+        self,
+        session,
+        report: Dict,
+        kind: str,
+        key: str,
+        query: str,
+        rows: List[Dict],
+        params: Dict,
+        on_written=None,
+        batch_size: int = GRAPH_WRITE_BATCH_SIZE
+    ) -> None:
+        """_run_batches() on an async session."""
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            t0 = time.perf_counter()
+            error = None
+            try:
+                records, counters = await session.execute_write(_awrite_batch_tx, query, batch, params)
+                if on_written:
+                    on_written(records, counters)
+            except Exception as e:
+                error = e
+            _record_batch(report, kind, key, batch, t0, error)
 
-    def _ingest_aliases(self, graphs: List[Dict]) -> None:
+    def _ingest_aliases(self, graphs: List[Dict]) -> Tuple[int, int]:
         """
         Persist aliases list to Neo4j for all nodes that have one.
         Uses safe list-merge Cypher — never overwrites aliases from prior ingests.
         Called after all nodes are guaranteed to exist in Neo4j.
+        Per-row path only — the bulk writer sends ALIAS_UPSERT_BATCH instead.
+        Returns (nodes_updated, nodes_failed) — same unit as the bulk report.
         """
         if not self.driver:
-            return
+            return 0, 0
 
         alias_count = 0
+        updated = 0
+        failed = 0
         with self.driver.session() as session:
             for graph in graphs:
                 for node in graph.get("nodes", []):
@@ -182,17 +839,20 @@ class KnowledgeBase:
                         continue
                     try:
                         session.run(
-                            ALIAS_UPSERT,
+                            ALIAS_UPSERT.format(node_type=node["type"]),
                             name=node["name"],
                             aliases=aliases
                         )
                         alias_count += len(aliases)
+                        updated += 1
                     except Exception as e:
+                        failed += 1
                         logger.warning("Alias upsert failed for %s: %s",
                                        node.get("name"), e)
 
         if alias_count:
             print(f"   -> Alias merge: {alias_count} alias(es) persisted")
+        return updated, failed
 
     def ingest_merged_into(
         self,
@@ -201,7 +861,9 @@ class KnowledgeBase:
         method: str,
         score: float,
         evidence: List[str],
-        confidence: str
+        confidence: str,
+        absorbed_type: Optional[str] = None,
+        canonical_type: Optional[str] = None
     ) -> None:
         """
         Write a MERGED_INTO provenance edge between an absorbed node and its canonical.
@@ -211,13 +873,18 @@ class KnowledgeBase:
         confidence: 'blocked' | 'uncertain' | 'confirmed'
         evidence:   list of strings describing why the merge was made/blocked
                     e.g. ['first_name_conflict'] or ['EMPLOYED_AT:Vantage Systems, Inc.']
+        absorbed_type / canonical_type: node labels, used for index-backed MATCH.
+                    None falls back to an unlabelled MATCH for that endpoint.
         """
         if not self.driver:
             return
         try:
             with self.driver.session() as session:
-                session.run(
-                    MERGED_INTO_UPSERT,
+                result = session.run(
+                    MERGED_INTO_UPSERT.format(
+                        absorbed_label=_label(absorbed_type),
+                        canonical_label=_label(canonical_type),
+                    ),
                     absorbed_name=absorbed_name,
                     canonical_name=canonical_name,
                     method=method,
@@ -225,14 +892,28 @@ class KnowledgeBase:
                     evidence=evidence,
                     confidence=confidence
                 )
+                record = result.single()
+                if record:
+                    self._subgraph_generations.bump(
+                        [_ALL_WRITES, f"doc:{record['absorbed_doc']}", f"doc:{record['canonical_doc']}"]
+                    )
+                if record and result.consume().counters.relationships_created:
+                    delta = GraphStatsDelta()
+                    delta.edge("MERGED_INTO",
+                               degree_member(record["absorbed_type"], absorbed_name),
+                               degree_member(record["canonical_type"], canonical_name))
+                    self.stats.apply(delta)
+                    log_graph_change(self._redis, {
+                        "op": "edge", "rel": "MERGED_INTO",
+                        "source": [record["absorbed_type"], absorbed_name],
+                        "target": [record["canonical_type"], canonical_name],
+                    })
         except Exception as e:
             logger.warning("MERGED_INTO upsert failed %s→%s: %s",
                            absorbed_name, canonical_name, e)
 
-    def query_subgraph(self, keywords: List[str], source_filter: List[str] = None) -> str:
-        if not self.driver or not keywords:
-            return ""
-
+    @staticmethod
+    def _subgraph_query(keywords: List[str], source_filter: List[str] = None) -> Tuple[str, Dict]:
         keyword_query = " OR ".join(f'"{kw}"' for kw in keywords if kw.strip())
         doc_filter_clause = "AND node.document_id IN $doc_ids" if source_filter else ""
         query = f"""
@@ -250,112 +931,387 @@ class KnowledgeBase:
         OPTIONAL MATCH (m)-[r2]-(leaf)
         WHERE type(r2) IN ['RELATED_TO', 'MENTIONS']
 
-        RETURN DISTINCT
+        // Grouping on the output columns keeps the old DISTINCT rows; docs
+        // lists every document they came from, for subgraph cache tagging.
+        RETURN
             node.name AS n_name,
             node.aliases AS n_aliases,
             type(r1) AS rel,
             m.name AS m_name,
             type(r2) AS rel2,
-            leaf.name AS leaf_node
+            leaf.name AS leaf_node,
+            max(score) AS score,
+            collect(DISTINCT node.document_id) + collect(DISTINCT r1.document_id)
+              + collect(DISTINCT m.document_id) + collect(DISTINCT r2.document_id)
+              + collect(DISTINCT leaf.document_id) AS docs
+        ORDER BY score DESC
         LIMIT 50
         """
+        query_params = {"keyword_query": keyword_query}
+        if source_filter:
+            query_params["doc_ids"] = source_filter
+        return query, query_params
+
+    @staticmethod
+    def _format_subgraph_row(r) -> str:
+        node_label = r['n_name']
+        aliases = r.get('n_aliases')
+        if aliases:
+            node_label += f" (aka: {', '.join(aliases)})"
+        base = f"({node_label}) -[{r['rel']}]-> ({r['m_name']})"
+        if r['rel2'] and r['leaf_node']:
+            base += f"\n  └─> [{r['rel2']}] --> ({r['leaf_node']})"
+        return base
+
+    # ── Subgraph cache ────────────────────────────────────────────────────────
+
+    def _subgraph_cache_lookup(self, keywords: List[str], source_filter: Optional[List[str]]):
+        """
+        Returns (key, cached text or None, generations read before the query).
+        An entry whose recorded generations no longer match is dropped.
+        """
+        terms = tuple(sorted({kw.strip().lower() for kw in keywords if kw.strip()}))
+        key = (terms, tuple(sorted(set(source_filter or []))))
+        entry = self._subgraph_cache.get(key)
+        if entry is not None:
+            text, versions = entry
+            if self._subgraph_generations.current(list(versions)) == versions:
+                return key, text, None
+            self._subgraph_cache.pop(key)
+            self._subgraph_stale += 1
+        fields = [_ALL_WRITES] + [f"tok:{t}" for term in terms for t in _name_tokens(term)]
+        return key, None, self._subgraph_generations.current(fields)
+
+    def _subgraph_cache_store(self, key, before: Dict[str, int], docs: set, text: str) -> None:
+        docs = set(docs) | set(key[1])
+        after = self._subgraph_generations.current(
+            [_ALL_WRITES] + [f"doc:{d}" for d in docs if d]
+        )
+        if after[_ALL_WRITES] != before[_ALL_WRITES]:
+            return  # a write landed while we queried — the rows may predate it
+        versions = {f: v for f, v in {**before, **after}.items() if f != _ALL_WRITES}
+        self._subgraph_cache.set(key, (text, versions))
+
+    def _invalidate_subgraphs(self, document_ids: set, graphs: List[Dict]) -> None:
+        """Called after a write: the documents it touched and every node name it wrote."""
+        tokens = {t for graph in graphs for node in graph.get("nodes", [])
+                  for t in _name_tokens(node["name"])}
+        self._subgraph_generations.bump(
+            [_ALL_WRITES]
+            + [f"doc:{d}" for d in document_ids if d]
+            + [f"tok:{t}" for t in tokens]
+        )
+
+    def subgraph_cache_stats(self) -> Dict:
+        return {**self._subgraph_cache.stats(), "invalidated": self._subgraph_stale}
+
+    def _snapshot_subgraph(self, keywords: List[str], source_filter: Optional[List[str]]) -> Optional[str]:
+        """query_subgraph from the in-process snapshot; None → use live Cypher."""
+        if self.snapshot is None:
+            return None
+        self.snapshot.start()
+        rows = self.snapshot.subgraph_rows(keywords, source_filter)
+        if rows is None:
+            return None
+        return "\n".join(self._format_subgraph_row(r) for r in rows)
+
+    def graph_snapshot_stats(self) -> Optional[Dict]:
+        """Memory footprint and refresh counters of the snapshot; None when disabled."""
+        return self.snapshot.memory_report() if self.snapshot is not None else None
+
+    def query_subgraph(self, keywords: List[str], source_filter: List[str] = None) -> str:
+        if not self.driver or not keywords:
+            return ""
+
+        text = self._snapshot_subgraph(keywords, source_filter)
+        if text is not None:
+            return text
+        key, cached, before = self._subgraph_cache_lookup(keywords, source_filter)
+        if cached is not None:
+            return cached
+        query, query_params = self._subgraph_query(keywords, source_filter)
         try:
-            with self.driver.session() as session:
-                results = []
-                query_params = {"keyword_query": keyword_query}
-                if source_filter:
-                    query_params["doc_ids"] = source_filter
-                for r in session.run(query, **query_params):
-                    node_label = r['n_name']
-                    aliases = r.get('n_aliases')
-                    if aliases:
-                        node_label += f" (aka: {', '.join(aliases)})"
-                    base = f"({node_label}) -[{r['rel']}]-> ({r['m_name']})"
-                    if r['rel2'] and r['leaf_node']:
-                        base += f"\n  └─> [{r['rel2']}] --> ({r['leaf_node']})"
-                    results.append(base)
-            return "\n".join(results) if results else ""
+            with self.driver.session(**_READ_SESSION) as session:
+                rows = list(session.run(query, **query_params))
+        except Exception as e:
+            print(f"Graph query error: {e}")
+            return ""
+        text = "\n".join(self._format_subgraph_row(r) for r in rows)
+        self._subgraph_cache_store(key, before, {d for r in rows for d in r["docs"]}, text)
+        return text
+
+    async def aquery_subgraph(self, keywords: List[str], source_filter: List[str] = None) -> str:
+        """Async query_subgraph() on the async Bolt driver."""
+        if not self.driver or not keywords:
+            return ""
+
+        text = self._snapshot_subgraph(keywords, source_filter)
+        if text is not None:
+            return text
+        key, cached, before = self._subgraph_cache_lookup(keywords, source_filter)
+        if cached is not None:
+            return cached
+        query, query_params = self._subgraph_query(keywords, source_filter)
+        try:
+            async with self.async_driver.session(**_READ_SESSION) as session:
+                result = await session.run(query, **query_params)
+                rows = [r async for r in result]
         except Exception as e:
             print(f"Graph query error: {e}")
             return ""
+        text = "\n".join(self._format_subgraph_row(r) for r in rows)
+        self._subgraph_cache_store(key, before, {d for r in rows for d in r["docs"]}, text)
+        return text
 
     def get_visualization_data(self, limit: int = 1000):
         if not self.driver:
             return {"nodes": [], "links": [], "total": 0}
 
-        limit = min(max(limit, 1), 5000)
+        with self.driver.session(**_READ_SESSION) as session:
+            total = session.run(_EDGE_TOTAL_QUERY).single()["total"]
+            records = list(session.run(_VISUALIZATION_QUERY, limit=_visualization_limit(limit)))
+        return _visualization_payload(total, records)
 
-        query = """
-        MATCH (s)-[r]->(o)
-        WITH s, r, o, COUNT { MATCH ()-[]->() } AS total
-        RETURN
-            s.name AS source,
-            labels(s)[0] AS source_type,
-            type(r) AS relation,
-            o.name AS target,
-            labels(o)[0] AS target_type,
-            total
-        LIMIT $limit
+    async def aget_visualization_data(self, limit: int = 1000):
+        """get_visualization_data() on the async driver."""
+        if not self.driver:
+            return {"nodes": [], "links": [], "total": 0}
+
+        async with self.async_driver.session(**_READ_SESSION) as session:
+            total = (await (await session.run(_EDGE_TOTAL_QUERY)).single())["total"]
+            result = await session.run(_VISUALIZATION_QUERY, limit=_visualization_limit(limit))
+            records = [r async for r in result]
+        return _visualization_payload(total, records)
+
+    def iter_graph_export(self, cursor: Optional[str] = None,
+                          max_edges: Optional[int] = None) -> Iterator[Dict]:
         """
+        The whole graph as a stream of records for /graph/export:
+            {"type": "meta", "total_nodes", "total_links"}       first
+            {"type": "node", "id", "group", "degree"}            first time this response sees a node
+            {"type": "link", "source", "target", "label"}        every edge
+            {"type": "end", "cursor", "links"}                   last
+        Source nodes are read label by label in name order, a page at a time,
+        off each label's name index — no sort and no SKIP, so page N costs the
+        same as page 1. After max_edges the stream ends at a source-node
+        boundary and "cursor" resumes from there; it is None once the whole
+        graph has been sent.
+        Raises ValueError for a malformed cursor before anything is read.
+        """
+        start = _decode_export_cursor(cursor) if cursor else None
+        if not self.driver:
+            return iter([{"type": "meta", "total_nodes": 0, "total_links": 0},
+                         {"type": "end", "cursor": None, "links": 0}])
+        return self._export_records(start, max_edges)
 
-        nodes = {}
-        links = []
-        total = 0
+    def _export_records(self, start: Optional[Tuple[str, str]],
+                        max_edges: Optional[int]) -> Iterator[Dict]:
+        from graph_agent import ALLOWED_NODE_TYPES
 
-        with self.driver.session() as session:
-            for rec in session.run(query, limit=limit):
-                total = rec["total"]
-                nodes[rec["source"]] = {"id": rec["source"], "group": rec["source_type"]}
-                nodes[rec["target"]] = {"id": rec["target"], "group": rec["target_type"]}
-                links.append({
-                    "source": rec["source"],
-                    "target": rec["target"],
-                    "label":  rec["relation"]
-                })
-
-        return {"nodes": list(nodes.values()), "links": links, "total": total}
+        labels = sorted(ALLOWED_NODE_TYPES)
+        if start:
+            labels = labels[labels.index(start[0]):]
+        seen = set()
+        sent = 0
+
+        with self.driver.session(**_READ_SESSION) as session:
+            totals = session.run(
+                "CALL { MATCH (n) RETURN count(n) AS nodes } "
+                "CALL { MATCH ()-[r]->() RETURN count(r) AS links } "
+                "RETURN nodes, links"
+            ).single()
+            yield {"type": "meta", "total_nodes": totals["nodes"], "total_links": totals["links"]}
+
+            for label in labels:
+                after = start[1] if start and label == start[0] else ""
+                while True:
+                    rows = session.run(f"""
+                        MATCH (s:{label}) WHERE s.name > $after
+                        WITH s ORDER BY s.name ASC LIMIT $page
+                        OPTIONAL MATCH (s)-[r]->(o)
+                        RETURN s.name AS source, COUNT {{ (s)--() }} AS source_degree,
+                               type(r) AS relation, o.name AS target,
+                               labels(o)[0] AS target_type, COUNT {{ (o)--() }} AS target_degree
+                        ORDER BY source
+                    """, after=after, page=GRAPH_EXPORT_PAGE_NODES).data()
+                    if not rows:
+                        break
+                    for source, edges in groupby(rows, key=lambda r: r["source"]):
+                        for r in edges:
+                            if r["relation"] is None:
+                                continue  # no outgoing edges — incoming ones come with their source
+                            for node_id, group, degree in ((source, label, r["source_degree"]),
+                                                           (r["target"], r["target_type"], r["target_degree"])):
+                                if node_id not in seen:  # ids are names, as in get_visualization_data
+                                    seen.add(node_id)
+                                    yield {"type": "node", "id": node_id, "group": group, "degree": degree}
+                            yield {"type": "link", "source": source, "target": r["target"],
+                                   "label": r["relation"]}
+                            sent += 1
+                        if max_edges and sent >= max_edges:
+                            yield {"type": "end", "cursor": _encode_export_cursor(label, source),
+                                   "links": sent}
+                            return
+                    after = rows[-1]["source"]
+
+        yield {"type": "end", "cursor": None, "links": sent}
+
+    # ── Materialized statistics ───────────────────────────────────────────────
+
+    def get_graph_summary(self, top_k: int = 6) -> Dict:
+        """
+        Node/edge counts per label and type, top-degree entities and
+        per-document counts, read from the incrementally maintained GraphStats.
+        With GRAPH_SNAPSHOT_ENABLED the top entities come from the snapshot's
+        CSR degrees once it is built.
+        """
+        if not self.stats.is_built() and self.driver and self.stats.claim_rebuild():
+            self.rebuild_graph_stats()
+        summary = self.stats.summary(top_k)
+        if self.snapshot is not None:
+            self.snapshot.start()
+            top = self.snapshot.top_degree(top_k)
+            if top is not None:
+                summary["top_entities"] = top
+        return summary
+
+    def rebuild_graph_stats(self) -> None:
+        """One full scan to (re)seed GraphStats — run when its counters are missing."""
+        if not self.driver:
+            return
+        started = time.perf_counter()
+        snapshot = GraphStatsDelta()
+        with self.driver.session(**_READ_SESSION) as session:
+            for r in session.run("MATCH (n) RETURN labels(n)[0] AS label, count(*) AS c"):
+                if r["label"]:
+                    snapshot.labels[r["label"]] = r["c"]
+            for r in session.run("MATCH ()-[r]->() RETURN type(r) AS type, count(*) AS c"):
+                snapshot.types[r["type"]] = r["c"]
+            for r in session.run(
+                "MATCH (n) WITH n, COUNT { (n)--() } AS d WHERE d > 0 "
+                "RETURN labels(n)[0] AS label, n.name AS name, d"
+            ):
+                snapshot.degree[degree_member(r["label"], r["name"])] = r["d"]
+            for r in session.run(
+                "MATCH (n) WHERE n.document_id IS NOT NULL "
+                "RETURN n.document_id AS doc, count(*) AS c"
+            ):
+                snapshot.doc_nodes[r["doc"]] = r["c"]
+            for r in session.run(
+                "MATCH ()-[r]->() WHERE r.document_id IS NOT NULL "
+                "RETURN r.document_id AS doc, count(*) AS c"
+            ):
+                snapshot.doc_edges[r["doc"]] = r["c"]
+        self.stats.replace(snapshot)
+        print(f"📈 Graph statistics rebuilt: {sum(snapshot.labels.values())} nodes, "
+              f"{sum(snapshot.types.values())} edges "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms)")
 
     def get_graph_statistics(self):
         if not self.driver:
             return "Graph DB Disconnected."
         try:
-            with self.driver.session() as session:
-                # Bug 2 fix — count via nodes, more reliable than edge provenance
-                total = session.run(
-                    "MATCH (n) WHERE n.document_id IS NOT NULL "
-                    "RETURN count(DISTINCT n.document_id) as c"
-                ).single()["c"]
-                top = session.run(
-                    "MATCH (n) RETURN n.name as name, "
-                    "size((n)--()) as d ORDER BY d DESC LIMIT 5"
-                )
-                stats = [f"TOTAL DOCS: {total}", "TOP ENTITIES:"] + \
-                        [f"- {r['name']}: {r['d']}" for r in top]
-                return "\n".join(stats)
+            return _format_graph_statistics(self.get_graph_summary(top_k=5))
         except Exception as e:
             print(f"⚠️ Graph stats error: {e}")
             return "Stats unavailable"
 
-    def delete_document(self, filename: str) -> None:
+    async def aget_graph_statistics(self):
+        """
+        get_graph_statistics() for async callers. The summary is a few Redis
+        reads; only a first-time rebuild scans Neo4j, on a worker thread.
+        """
+        if not self.driver:
+            return "Graph DB Disconnected."
+        try:
+            return _format_graph_statistics(await asyncio.to_thread(self.get_graph_summary, 5))
+        except Exception as e:
+            print(f"⚠️ Graph stats error: {e}")
+            return "Stats unavailable"
+
+    def delete_document(
+        self,
+        filename: str,
+        progress: Optional[Callable[[str, int, Optional[int]], None]] = None
+    ) -> None:
+        """
+        Remove a document's edges, then its nodes that are left disconnected. Runs as inner transactions of GRAPH_DELETE_BATCH_SIZE
+        rows: by element id from the document's manifest when it has a
+        complete one, otherwise through the document_id index of every
+        relationship type and node label.
+
+        progress(phase, done, total) is called after each batch and at the
+        end of each phase — phase is "edges" or "nodes", total is None when
+        there is no manifest to count from.
+        A delete that fails part way keeps what it removed; running it again
+        finishes the job.
+        """
         if not self.driver:
             return
 
-        def _delete_tx(tx, f):
-            # Delete all edges belonging to this document
-            tx.run("MATCH ()-[r]->() WHERE r.document_id = $f DELETE r", f=f)
+        manifest = self.manifest.load(filename)
+        edges: List[Dict] = []
+        nodes: List[Dict] = []
+        started = time.perf_counter()
+        ok = False
+        try:
+            with self.driver.session() as session:
+                batch = GRAPH_DELETE_BATCH_SIZE
+                if manifest is not None:
+                    node_ids, edge_ids = manifest
+                    edge_steps = [(EDGE_DELETE_BY_ID.format(batch=batch), {"ids": edge_ids})]
+                    node_steps = [(NODE_DELETE_BY_ID.format(batch=batch), {"ids": node_ids})]
+                    totals = {"edges": len(edge_ids), "nodes": len(node_ids)}
+                else:
+                    from graph_agent import ALLOWED_NODE_TYPES
+                    edge_steps = [
+                        (EDGE_DELETE_BY_TYPE.format(edge_type=r["relationshipType"], batch=batch), {})
+                        for r in session.run("CALL db.relationshipTypes() YIELD relationshipType "
+                                             "RETURN relationshipType")
+                    ]
+                    node_steps = [(NODE_DELETE_BY_LABEL.format(node_type=node_type, batch=batch), {})
+                                  for node_type in sorted(ALLOWED_NODE_TYPES)]
+                    totals = {"edges": None, "nodes": None}
 
-            # Bug 3 fix — only delete nodes exclusively owned by this document
-            # that are now disconnected. Shared nodes survive untouched.
-            tx.run("""
-                MATCH (n)
-                WHERE n.document_id = $f
-                AND NOT (n)--()
-                DELETE n
-            """, f=f)
+                for phase, steps, out in (("edges", edge_steps, edges), ("nodes", node_steps, nodes)):
+                    for query, params in steps:
+                        self._delete_in_batches(session, query, {"f": filename, **params}, out,
+                                                phase, totals[phase], progress)
+                    if progress:
+                        progress(phase, len(out), totals[phase])
+            ok = True
+            print(f"✅ Successfully purged graph data for: {filename} "
+                  f"({len(edges)} edges, {len(nodes)} nodes, "
+                  f"{'manifest' if manifest is not None else 'index scan'}, "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms)")
+        except Exception as e:
+            print(f"❌ Graph deletion failed for {filename} after {len(edges)} edges, "
+                  f"{len(nodes)} nodes: {e}")
 
-        with self.driver.session() as session:
-            try:
-                session.execute_write(_delete_tx, filename)
-                print(f"✅ Successfully purged graph data for: {filename}")
-            except Exception as e:
-                print(f"❌ Graph deletion transaction failed for {filename}: {e}")
\ No newline at end of file
+        if ok:
+            self.manifest.discard(filename)
+        elif not edges and not nodes:
+            return
+
+        delta = GraphStatsDelta()
+        for e in edges:
+            delta.edge(e["rel"], degree_member(e["source_type"], e["source"]),
+                       degree_member(e["target_type"], e["target"]), sign=-1)
+        for n in nodes:
+            delta.node_removed(n["label"], n["name"])
+        if ok:
+            delta.document_removed(filename)
+        self.stats.apply(delta)
+        self._subgraph_generations.bump([_ALL_WRITES, f"doc:{filename}"])
+        log_graph_change(self._redis, {"op": "delete", "doc": filename})
+
+    @staticmethod
+    def _delete_in_batches(session, query: str, params: Dict, out: List[Dict], phase: str,
+                           total: Optional[int], progress) -> None:
+        """Stream one CALL { } IN TRANSACTIONS delete, collecting its rows into out."""
+        if "ids" in params and not params["ids"]:
+            return
+        for record in session.run(query, **params):
+            out.append(record.data())
+            if progress and len(out) % GRAPH_DELETE_BATCH_SIZE == 0:
+                progress(phase, len(out), total)
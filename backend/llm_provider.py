@@ -1,7 +1,21 @@
 import os
 import re
+import sys
+import json
+import zlib
+import time
+import hashlib
 import asyncio
+import inspect
+import functools
+import threading
+import uuid
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional
+from cache_utils import SingleFlight, TTLCache, get_cache_redis_client, read_shared_stats, singleflight
+from concurrency import LoopScoped
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -17,6 +31,287 @@ from groq import AsyncGroq
 import anthropic
 
 
+# ── Streaming helpers ─────────────────────────────────────────────────────────
+
+class _ThinkTagFilter:
+    """
+    Incremental _strip_think_tags() for streamed deltas.
+
+    A tag can be split across chunks ("<thi" + "nk>"), so a possible partial
+    opening tag is held back until the next delta decides it. Text inside an
+    unclosed <think> block is dropped, as in the non-streaming path.
+    """
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self._buf = ""
+        self._in_think = False
+        self._started = False
+
+    def _partial_open(self) -> int:
+        for n in range(min(len(self._buf), len(self.OPEN) - 1), 0, -1):
+            if self.OPEN.startswith(self._buf[-n:]):
+                return n
+        return 0
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()  # mirror .strip() on the leading edge
+            self._started = bool(text)
+        return text
+
+    def feed(self, delta: str) -> str:
+        self._buf += delta
+        out = []
+        while True:
+            if self._in_think:
+                i = self._buf.find(self.CLOSE)
+                if i < 0:
+                    self._buf = self._buf[-(len(self.CLOSE) - 1):]
+                    break
+                self._buf = self._buf[i + len(self.CLOSE):]
+                self._in_think = False
+            else:
+                i = self._buf.find(self.OPEN)
+                if i >= 0:
+                    out.append(self._buf[:i])
+                    self._buf = self._buf[i + len(self.OPEN):]
+                    self._in_think = True
+                    continue
+                hold = self._partial_open()
+                out.append(self._buf[:len(self._buf) - hold])
+                self._buf = self._buf[len(self._buf) - hold:]
+                break
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        rest, self._buf = ("" if self._in_think else self._buf), ""
+        return self._emit(rest)
+
+
+# ── Cluster-wide rate limiting ────────────────────────────────────────────────
+# Every API pod and Celery worker draws from one Redis token bucket per
+# (provider, model), so adding workers no longer multiplies the request rate
+# into 429 storms. Two buckets per key, refilled continuously:
+#   {PROVIDER}_RPM — requests per minute  (e.g. NVIDIA_RPM=40)
+#   {PROVIDER}_TPM — tokens per minute    (input estimate + expected output)
+# Unset / 0 leaves that dimension unlimited; with neither set, no Redis calls.
+#
+# Priority lanes: "interactive" (the default — /query traffic) and "bulk"
+# (ingestion, set by DocuMindIngest via llm_lane("bulk")). Bulk calls may only
+# take tokens while LLM_RATE_BULK_RESERVE of each bucket stays free, and hold
+# off entirely while an interactive call is waiting.
+# If Redis is unreachable, calls go through unthrottled (fail open).
+LLM_RATE_BULK_RESERVE      = float(os.getenv("LLM_RATE_BULK_RESERVE", "0.2"))
+LLM_RATE_MAX_WAIT_S        = float(os.getenv("LLM_RATE_MAX_WAIT_S", "300"))
+LLM_RATE_OUTPUT_TOKENS_EST = int(os.getenv("LLM_RATE_OUTPUT_TOKENS_EST", "1024"))
+
+_llm_lane: ContextVar[str] = ContextVar("llm_lane", default="interactive")
+
+
+@contextmanager
+def llm_lane(lane: str):
+    """Run LLM calls in this context (and tasks / threads started from it) in a priority lane."""
+    token = _llm_lane.set(lane)
+    try:
+        yield
+    finally:
+        _llm_lane.reset(token)
+
+
+# KEYS: request bucket, token bucket, interactive waiters (zset id → expiry ms)
+# ARGV: rpm, tpm, token cost, reserve fraction, lane, waiter id
+# Returns 0 when granted (both buckets debited), else milliseconds to wait.
+# Bulk calls yield while any interactive waiter is registered; a waiter is
+# removed when it is granted and expires shortly after its last retry, so a
+# crashed caller can't stall the bulk lane.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local cost, reserve = tonumber(ARGV[3]), tonumber(ARGV[4])
+local interactive = ARGV[5] == 'interactive'
+
+if not interactive then
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+    local first = redis.call('ZRANGE', KEYS[3], 0, 0, 'WITHSCORES')
+    if first[2] then return math.max(tonumber(first[2]) - now, 1) end
+end
+
+local function level(key, capacity)
+    local v = redis.call('HMGET', key, 'level', 'ts')
+    if not v[1] then return capacity end
+    return math.min(capacity, tonumber(v[1]) + (now - tonumber(v[2])) * capacity / 60000)
+end
+
+local wait, req, tok = 0, 0, 0
+if rpm > 0 then
+    req = level(KEYS[1], rpm)
+    local need = math.min(rpm, 1 + reserve * rpm)
+    if req < need then wait = math.max(wait, (need - req) * 60000 / rpm) end
+end
+if tpm > 0 then
+    cost = math.min(cost, tpm)
+    tok = level(KEYS[2], tpm)
+    local need = math.min(tpm, cost + reserve * tpm)
+    if tok < need then wait = math.max(wait, (need - tok) * 60000 / tpm) end
+end
+
+if wait > 0 then
+    wait = math.ceil(wait)
+    if interactive then
+        redis.call('ZADD', KEYS[3], now + wait + 50, ARGV[6])
+        local last = redis.call('ZRANGE', KEYS[3], -1, -1, 'WITHSCORES')
+        redis.call('PEXPIRE', KEYS[3], math.max(tonumber(last[2]) - now, 1))
+    end
+    return wait
+end
+if rpm > 0 then
+    redis.call('HSET', KEYS[1], 'level', req - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], 120000)
+end
+if tpm > 0 then
+    redis.call('HSET', KEYS[2], 'level', tok - cost, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], 120000)
+end
+if interactive then redis.call('ZREM', KEYS[3], ARGV[6]) end
+return 0
+"""
+
+
+class RedisRateLimiter:
+    """Shared requests/min + tokens/min bucket for one (provider, model)."""
+
+    def __init__(self, provider: str, model: str, rpm: int, tpm: int):
+        self.provider, self.model = provider, model
+        self.rpm, self.tpm = rpm, tpm
+        base = f"documind:ratelimit:{provider}:{model}"
+        self.keys = [f"{base}:rpm", f"{base}:tpm", f"{base}:interactive_waiters"]
+        self._sync_script = None
+        # One Redis connection pool per event loop, closed as that loop shuts down
+        self._async_scripts = LoopScoped(self._open_async_script,
+                                         lambda script: script.registered_client.aclose())
+        self._warned = False
+
+    def _args(self, cost_tokens: int, lane: str, waiter: str) -> list:
+        reserve = LLM_RATE_BULK_RESERVE if lane == "bulk" else 0.0
+        return [self.rpm, self.tpm, cost_tokens, reserve, lane, waiter]
+
+    def _fail_open(self, e: Exception) -> None:
+        if not self._warned:
+            print(f"⚠️ LLM rate limiter unavailable ({self.provider}/{self.model}) — not throttling: {e}")
+            self._warned = True
+
+    def _waited_too_long(self, waited_s: float, lane: str) -> bool:
+        if waited_s < LLM_RATE_MAX_WAIT_S:
+            return False
+        print(f"⚠️ LLM rate limiter: {lane} call waited {waited_s:.0f}s "
+              f"for {self.provider}/{self.model} — sending anyway")
+        return True
+
+    def acquire(self, cost_tokens: int) -> None:
+        """Block until the shared buckets grant one request of cost_tokens."""
+        lane, start, waiter = _llm_lane.get(), time.monotonic(), uuid.uuid4().hex
+        while True:
+            try:
+                if self._sync_script is None:
+                    import redis
+                    client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+                    self._sync_script = client.register_script(_TOKEN_BUCKET_LUA)
+                wait_ms = self._sync_script(keys=self.keys, args=self._args(cost_tokens, lane, waiter))
+            except Exception as e:
+                return self._fail_open(e)
+            if not wait_ms or self._waited_too_long(time.monotonic() - start, lane):
+                return
+            time.sleep(wait_ms / 1000)
+
+    def _open_async_script(self):
+        import redis.asyncio as aioredis
+        client = aioredis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return client.register_script(_TOKEN_BUCKET_LUA)
+
+    async def aacquire(self, cost_tokens: int) -> None:
+        """acquire() without blocking the event loop."""
+        lane, start, waiter = _llm_lane.get(), time.monotonic(), uuid.uuid4().hex
+        while True:
+            try:
+                script = self._async_scripts.get()
+                wait_ms = await script(keys=self.keys, args=self._args(cost_tokens, lane, waiter))
+            except Exception as e:
+                return self._fail_open(e)
+            if not wait_ms or self._waited_too_long(time.monotonic() - start, lane):
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+
+_rate_limiters: Dict[tuple, Optional[RedisRateLimiter]] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def _rate_limiter_for(provider: "LLMProvider") -> Optional[RedisRateLimiter]:
+    name = type(provider).__name__.removesuffix("Provider").upper()
+    key = (name, provider.get_model_name())
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            rpm = int(os.getenv(f"{name}_RPM", "0"))
+            tpm = int(os.getenv(f"{name}_TPM", "0"))
+            _rate_limiters[key] = RedisRateLimiter(name.lower(), key[1], rpm, tpm) if (rpm or tpm) else None
+        return _rate_limiters[key]
+
+
+def _estimate_cost(prompt: str, system_prompt: str, max_tokens: int) -> int:
+    """Input tokens (~4 chars each) plus the expected, not maximum, output."""
+    return (len(prompt) + len(system_prompt)) // 4 + min(max_tokens, LLM_RATE_OUTPUT_TOKENS_EST)
+
+
+def _rate_limited(fn):
+    """
+    Acquire from the shared bucket before the provider call. Sits outside
+    tenacity, so a server-side 429 retry does not take a second slot.
+    Handles sync, async and async-generator (streaming) methods.
+    """
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def stream_wrapper(self, prompt, system_prompt="", max_tokens=8192):
+            limiter = _rate_limiter_for(self)
+            if limiter:
+                await limiter.aacquire(_estimate_cost(prompt, system_prompt, max_tokens))
+            async for delta in fn(self, prompt, system_prompt, max_tokens):
+                yield delta
+        return stream_wrapper
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(self, prompt, system_prompt="", max_tokens=8192):
+            limiter = _rate_limiter_for(self)
+            if limiter:
+                await limiter.aacquire(_estimate_cost(prompt, system_prompt, max_tokens))
+            return await fn(self, prompt, system_prompt, max_tokens)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def sync_wrapper(self, prompt, system_prompt="", max_tokens=8192):
+        limiter = _rate_limiter_for(self)
+        if limiter:
+            limiter.acquire(_estimate_cost(prompt, system_prompt, max_tokens))
+        return fn(self, prompt, system_prompt, max_tokens)
+    return sync_wrapper
+
+
+# ── Request coalescing ────────────────────────────────────────────────────────
+# Chunks of one document and users asking the same trending question often send
+# the exact same prompt at the same moment — before any of them could be
+# cached. Identical generate / async_generate calls in this process share one
+# provider request (and one rate-limit slot). Streaming is not coalesced.
+_llm_flight = SingleFlight("llm")
+
+_coalesced = singleflight(
+    _llm_flight,
+    lambda self, prompt, system_prompt="", max_tokens=8192:
+        (type(self).__name__, self.get_model_name(), system_prompt, prompt, max_tokens),
+)
+
+
 # ── Base Class ────────────────────────────────────────────────────────────────
 
 class LLMProvider(ABC):
@@ -29,6 +324,20 @@ class LLMProvider(ABC):
         content = re.sub(r'<think>.*', '', content, flags=re.DOTALL)
         return content.strip()
 
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: str) -> list:
+        messages = []
+        if system_prompt:
+            messages.append({'role': 'system', 'content': system_prompt})
+        messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    def _record_usage(self, input_tokens: int, output_tokens: int) -> None:
+        self.total_tokens_used += input_tokens + output_tokens
+        print(f"   📊 Tokens: {input_tokens} in / "
+              f"{output_tokens} out "
+              f"(total: {input_tokens + output_tokens} | session: {self.total_tokens_used})")
+
     @abstractmethod
     def generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
         pass
@@ -37,12 +346,40 @@ class LLMProvider(ABC):
     def get_model_name(self) -> str:
         pass
 
-    # Default async wrapper — works for all providers immediately.
-    # NOTE: NVIDIA, Gemini, OpenAI use asyncio.to_thread.
-    # True async clients for these providers are future debt.
+    # Fallback async wrapper for providers without a native async client.
+    # Every built-in provider overrides this with its SDK's async client so
+    # the async agent graph never parks a threadpool thread on an LLM call.
     async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
         return await asyncio.to_thread(self.generate, prompt, system_prompt, max_tokens)
 
+    # Streaming: providers override _astream_raw() with their SDK's streaming
+    # call; the fallback yields the whole answer as a single chunk.
+    # No tenacity retry here — once tokens have reached the client a retry would
+    # duplicate them. Callers fall back to async_generate() if the stream fails
+    # before its first token.
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        yield await self.async_generate(prompt, system_prompt, max_tokens)
+
+    async def astream_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> AsyncIterator[str]:
+        """Yields answer text deltas as the provider produces them, think tags removed."""
+        think = _ThinkTagFilter()
+        async for delta in self._astream_raw(prompt, system_prompt, max_tokens):
+            text = think.feed(delta)
+            if text:
+                yield text
+        tail = think.flush()
+        if tail:
+            yield tail
+
+    async def _openai_stream_deltas(self, stream) -> AsyncIterator[str]:
+        """Text deltas from an OpenAI-compatible chat.completions stream."""
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                self._record_usage(usage.prompt_tokens, usage.completion_tokens)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 
 # ── Groq ──────────────────────────────────────────────────────────────────────
 
@@ -53,13 +390,8 @@ class GroqProvider(LLMProvider):
         self.model_name = model_name
         self.total_tokens_used = 0
 
-    def _build_messages(self, prompt: str, system_prompt: str) -> list:
-        messages = []
-        if system_prompt:
-            messages.append({'role': 'system', 'content': system_prompt})
-        messages.append({'role': 'user', 'content': prompt})
-        return messages
-
+    @_coalesced
+    @_rate_limited
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -80,6 +412,8 @@ class GroqProvider(LLMProvider):
 
         return self._strip_think_tags(response.choices[0].message.content)
 
+    @_coalesced
+    @_rate_limited
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -100,19 +434,33 @@ class GroqProvider(LLMProvider):
 
         return self._strip_think_tags(response.choices[0].message.content)
 
+    @_rate_limited
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for delta in self._openai_stream_deltas(stream):
+            yield delta
+
     def get_model_name(self) -> str:
         return self.model_name
 
 
 # ── OpenAI ────────────────────────────────────────────────────────────────────
-# NOTE: uses base class asyncio.to_thread async — true async client is future debt
 
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: str, model_name: str = "gpt-4o"):
         self.client = openai.OpenAI(api_key=api_key)
+        self.async_client = openai.AsyncOpenAI(api_key=api_key)
         self.model_name = model_name
         self.total_tokens_used = 0
 
+    @_coalesced
+    @_rate_limited
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -138,12 +486,43 @@ class OpenAIProvider(LLMProvider):
 
         return self._strip_think_tags(response.choices[0].message.content)
 
+    @_coalesced
+    @_rate_limited
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((openai.RateLimitError, openai.InternalServerError))
+    )
+    async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        if response.usage:
+            self._record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+
+        return self._strip_think_tags(response.choices[0].message.content)
+
+    @_rate_limited
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for delta in self._openai_stream_deltas(stream):
+            yield delta
+
     def get_model_name(self) -> str:
         return self.model_name
 
 
 # ── Gemini ────────────────────────────────────────────────────────────────────
-# NOTE: uses base class asyncio.to_thread async — true async client is future debt
 
 def _is_retryable_gemini(exc: Exception) -> bool:
     """Retry on 5xx (ServerError) and 429 only (ClientError with code 429).
@@ -165,6 +544,8 @@ class GeminiProvider(LLMProvider):
         self.model_name = model_name
         self.total_tokens_used = 0
 
+    @_coalesced
+    @_rate_limited
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -189,12 +570,54 @@ class GeminiProvider(LLMProvider):
                   f"(total: {input_tokens + output_tokens} | session: {self.total_tokens_used})")
         return self._strip_think_tags(response.text)
 
+    @_coalesced
+    @_rate_limited
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception(_is_retryable_gemini)
+    )
+    async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        config = types.GenerateContentConfig(
+            system_instruction=system_prompt if system_prompt else None,
+            temperature=0
+        )
+        # client.aio is the SDK's native asyncio surface — same auth, no extra client
+        response = await self.client.aio.models.generate_content(
+            model=self.model_name,
+            contents=prompt,
+            config=config
+        )
+        if response.usage_metadata:
+            self._record_usage(
+                response.usage_metadata.prompt_token_count or 0,
+                response.usage_metadata.candidates_token_count or 0,
+            )
+        return self._strip_think_tags(response.text)
+
+    @_rate_limited
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        config = types.GenerateContentConfig(
+            system_instruction=system_prompt if system_prompt else None,
+            temperature=0
+        )
+        usage = None
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+            config=config
+        ):
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                yield chunk.text
+        if usage:
+            self._record_usage(usage.prompt_token_count or 0, usage.candidates_token_count or 0)
+
     def get_model_name(self) -> str:
         return self.model_name
 
 
 # ── NVIDIA NIM ────────────────────────────────────────────────────────────────
-# NOTE: uses base class asyncio.to_thread async — true async client is future debt
 
 class NvidiaProvider(LLMProvider):
     def __init__(self, api_key: str, model_name: str = "nvidia/llama-3.3-nemotron-super-49b-v1.5"):
@@ -202,9 +625,15 @@ class NvidiaProvider(LLMProvider):
             base_url="https://integrate.api.nvidia.com/v1",
             api_key=api_key
         )
+        self.async_client = openai.AsyncOpenAI(
+            base_url="https://integrate.api.nvidia.com/v1",
+            api_key=api_key
+        )
         self.model_name = model_name
         self.total_tokens_used = 0
 
+    @_coalesced
+    @_rate_limited
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -230,25 +659,51 @@ class NvidiaProvider(LLMProvider):
 
         return self._strip_think_tags(response.choices[0].message.content)
 
+    @_coalesced
+    @_rate_limited
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((openai.RateLimitError, openai.InternalServerError))
+    )
+    async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        if response.usage:
+            self._record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+
+        return self._strip_think_tags(response.choices[0].message.content)
+
+    @_rate_limited
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=self.model_name,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for delta in self._openai_stream_deltas(stream):
+            yield delta
+
     def get_model_name(self) -> str:
         return self.model_name
 
 
 # ── Anthropic ─────────────────────────────────────────────────────────────────
-# NOTE: uses base class asyncio.to_thread async — true async client is future debt
 
 class AnthropicProvider(LLMProvider):
     def __init__(self, api_key: str, model_name: str = "claude-sonnet-4-6"):
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key)
         self.model_name = model_name
         self.total_tokens_used = 0
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((anthropic.RateLimitError, anthropic.InternalServerError))
-    )
-    def generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+    def _message_kwargs(self, prompt: str, system_prompt: str, max_tokens: int) -> dict:
         kwargs = {
             "model": self.model_name,
             "max_tokens": max_tokens,
@@ -257,8 +712,17 @@ class AnthropicProvider(LLMProvider):
         }
         if system_prompt:
             kwargs["system"] = system_prompt
+        return kwargs
 
-        response = self.client.messages.create(**kwargs)
+    @_coalesced
+    @_rate_limited
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((anthropic.RateLimitError, anthropic.InternalServerError))
+    )
+    def generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        response = self.client.messages.create(**self._message_kwargs(prompt, system_prompt, max_tokens))
         if response.usage:
             self.total_tokens_used += response.usage.input_tokens + response.usage.output_tokens
             print(f"   📊 Tokens: {response.usage.input_tokens} in / "
@@ -268,10 +732,207 @@ class AnthropicProvider(LLMProvider):
 
         return self._strip_think_tags(response.content[0].text)
 
+    @_coalesced
+    @_rate_limited
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((anthropic.RateLimitError, anthropic.InternalServerError))
+    )
+    async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        response = await self.async_client.messages.create(
+            **self._message_kwargs(prompt, system_prompt, max_tokens)
+        )
+        if response.usage:
+            self._record_usage(response.usage.input_tokens, response.usage.output_tokens)
+
+        return self._strip_think_tags(response.content[0].text)
+
+    @_rate_limited
+    async def _astream_raw(self, prompt: str, system_prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        async with self.async_client.messages.stream(
+            **self._message_kwargs(prompt, system_prompt, max_tokens)
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            final = await stream.get_final_message()
+        if final.usage:
+            self._record_usage(final.usage.input_tokens, final.usage.output_tokens)
+
     def get_model_name(self) -> str:
         return self.model_name
 
 
+# ── Response cache ────────────────────────────────────────────────────────────
+# Every provider call runs at temperature=0, so identical prompts get identical
+# answers — decomposition, query entity extraction, audit and consistency
+# checks repeat them within a query's audit-retry loop and across users.
+# Key = (provider, model, system prompt, prompt, max_tokens, temperature=0), with
+# runs of whitespace collapsed so prompts that differ only in formatting of
+# interpolated context still match.
+#
+# LLM_CACHE_ROLES:   comma-separated roles to cache (primary, audit, extraction);
+#                    empty disables the cache. extraction is off by default: graph
+#                    extraction has its own ExtractionCache, and a cached reply
+#                    here would defeat /upload?bypass_cache=true.
+# LLM_CACHE_SIZE:    in-process LRU entries per role
+# LLM_CACHE_BACKEND: redis — shared second tier in the cache Redis (CACHE_REDIS_URL),
+#                            zlib-compressed, TTL LLM_CACHE_TTL_S
+#                    off   — in-process only (also when CACHE_REDIS_URL is unset)
+LLM_CACHE_ROLES   = {r.strip() for r in os.getenv("LLM_CACHE_ROLES", "audit").split(",") if r.strip()}
+LLM_CACHE_SIZE    = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL_S   = int(os.getenv("LLM_CACHE_TTL_S", str(24 * 3600)))
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "redis").lower()
+
+LLM_CACHE_STATS_KEY = "documind:metrics:llm_cache"
+
+
+class CachingLLMProvider(LLMProvider):
+    """
+    Wraps any LLMProvider with an in-process LRU and an optional Redis tier.
+    Hits and misses are counted per call site (the function that called
+    generate / async_generate / astream_generate) and mirrored to Redis.
+    """
+
+    def __init__(self, inner: LLMProvider, role: str, redis_client=None):
+        self.inner = inner
+        self.role = role
+        self._l1 = TTLCache(maxsize=LLM_CACHE_SIZE, ttl_s=LLM_CACHE_TTL_S)
+        self._redis = redis_client
+        self._stats_key = f"{LLM_CACHE_STATS_KEY}:{role}"
+        self._sites: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def get_model_name(self) -> str:
+        return self.inner.get_model_name()
+
+    @property
+    def total_tokens_used(self) -> int:
+        return self.inner.total_tokens_used
+
+    def _key(self, prompt: str, system_prompt: str, max_tokens: int) -> str:
+        payload = json.dumps([
+            type(self.inner).__name__, self.inner.get_model_name(),
+            " ".join(system_prompt.split()), " ".join(prompt.split()), max_tokens, 0,
+        ])
+        return "documind:llm_cache:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str, site: str) -> Optional[str]:
+        value = self._l1.get(key)
+        tier = "l1_hits"
+        if value is None and self._redis is not None:
+            try:
+                blob = self._redis.get(key)
+            except Exception:
+                blob = None
+            if blob is not None:
+                value = zlib.decompress(blob).decode("utf-8")
+                self._l1.set(key, value)
+                tier = "l2_hits"
+        self._count(site, tier if value is not None else "misses")
+        return value
+
+    def _store(self, key: str, value: str) -> None:
+        if not value:
+            return  # empty answers are usually failures — never pin them
+        self._l1.set(key, value)
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, LLM_CACHE_TTL_S, zlib.compress(value.encode("utf-8")))
+            except Exception:
+                pass  # the cache is best-effort
+
+    def forget(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> None:
+        """Drop a cached response the caller found unusable, so its retry reaches the model."""
+        key = self._key(prompt, system_prompt, max_tokens)
+        self._l1.pop(key)
+        if self._redis is not None:
+            try:
+                self._redis.delete(key)
+            except Exception:
+                pass
+
+    async def _alookup(self, key: str, site: str) -> Optional[str]:
+        """_lookup() off the event loop whenever it has Redis round trips to make."""
+        if self._redis is None:
+            return self._lookup(key, site)
+        return await asyncio.to_thread(self._lookup, key, site)
+
+    async def _astore(self, key: str, value: str) -> None:
+        if self._redis is None:
+            return self._store(key, value)
+        await asyncio.to_thread(self._store, key, value)
+
+    def _count(self, site: str, field: str) -> None:
+        with self._lock:
+            counts = self._sites.setdefault(site, {"l1_hits": 0, "l2_hits": 0, "misses": 0})
+            counts[field] += 1
+        if self._redis is not None:
+            try:
+                self._redis.hincrby(self._stats_key, f"{site}:{field}", 1)
+            except Exception:
+                pass  # metrics are best-effort
+
+    @staticmethod
+    def _call_site() -> str:
+        # Two frames up: the caller of generate / async_generate / astream_generate
+        frame = sys._getframe(2)
+        return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+    def generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        key = self._key(prompt, system_prompt, max_tokens)
+        cached = self._lookup(key, self._call_site())
+        if cached is not None:
+            return cached
+        response = self.inner.generate(prompt, system_prompt, max_tokens)
+        self._store(key, response)
+        return response
+
+    async def async_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> str:
+        key = self._key(prompt, system_prompt, max_tokens)
+        cached = await self._alookup(key, self._call_site())
+        if cached is not None:
+            return cached
+        response = await self.inner.async_generate(prompt, system_prompt, max_tokens)
+        await self._astore(key, response)
+        return response
+
+    async def astream_generate(self, prompt: str, system_prompt: str = "", max_tokens: int = 8192) -> AsyncIterator[str]:
+        key = self._key(prompt, system_prompt, max_tokens)
+        cached = await self._alookup(key, self._call_site())
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for delta in self.inner.astream_generate(prompt, system_prompt, max_tokens):
+            parts.append(delta)
+            yield delta
+        # Only a stream that ran to completion is stored
+        await self._astore(key, "".join(parts).strip())
+
+    def stats(self) -> Dict:
+        """Hit ratio per call site — this process, and summed across processes."""
+        with self._lock:
+            local = {site: dict(c) for site, c in self._sites.items()}
+        shared: Dict[str, Dict[str, int]] = {}
+        for field, value in read_shared_stats(self._redis, self._stats_key).items():
+            site, _, counter = field.rpartition(":")
+            shared.setdefault(site, {"l1_hits": 0, "l2_hits": 0, "misses": 0})[counter] = value
+        for counts in list(local.values()) + list(shared.values()):
+            lookups = sum(counts.values())
+            counts["hit_ratio"] = round((counts["l1_hits"] + counts["l2_hits"]) / lookups, 4) if lookups else 0.0
+        return {"model": self.get_model_name(), "local": local, "shared": shared}
+
+
+def _with_response_cache(instance: LLMProvider, role: str) -> LLMProvider:
+    if role not in LLM_CACHE_ROLES:
+        return instance
+    redis_client = get_cache_redis_client() if LLM_CACHE_BACKEND == "redis" else None
+    print(f"💾 LLM response cache enabled for {role} role "
+          f"({'in-process + Redis' if redis_client is not None else 'in-process only'})")
+    return CachingLLMProvider(instance, role, redis_client=redis_client)
+
+
 # ── Provider Factory ──────────────────────────────────────────────────────────
 
 def _init_llm_provider(prefix: str = "") -> LLMProvider:
@@ -425,6 +1086,23 @@ else:
     _audit_instance: LLMProvider = _extraction_instance
 
 
+# Response cache per role (LLM_CACHE_ROLES) — wrapped after the fallbacks above,
+# so roles sharing one provider instance still keep separate cache stats.
+_role_instances: Dict[str, LLMProvider] = {
+    "primary":    _with_response_cache(_primary_instance, "primary"),
+    "extraction": _with_response_cache(_extraction_instance, "extraction"),
+    "audit":      _with_response_cache(_audit_instance, "audit"),
+}
+
+
+def get_llm_cache_stats() -> Dict:
+    """Response cache hit ratios per role and call site; None for uncached roles."""
+    return {
+        role: instance.stats() if isinstance(instance, CachingLLMProvider) else None
+        for role, instance in _role_instances.items()
+    }
+
+
 def get_llm_provider(role: str = "primary") -> LLMProvider:
     """
     Return the singleton LLM instance for the given role.
@@ -435,12 +1113,13 @@ def get_llm_provider(role: str = "primary") -> LLMProvider:
 
     Extraction falls back to primary if STRUCTURED_LLM_PROVIDER is not set.
     Audit falls back to extraction if AUDIT_MODEL is not set.
+    Roles listed in LLM_CACHE_ROLES come wrapped in a CachingLLMProvider.
     """
     if role == "extraction":
         print(f"♻️  Reusing extraction LLM instance ({_extraction_instance.get_model_name()})")
-        return _extraction_instance
+        return _role_instances["extraction"]
     elif role == "audit":
         print(f"♻️  Reusing audit LLM instance ({_audit_instance.get_model_name()})")
-        return _audit_instance
+        return _role_instances["audit"]
     print(f"♻️  Reusing primary LLM instance ({_primary_instance.get_model_name()})")
-    return _primary_instance
+    return _role_instances["primary"]
@@ -37,8 +37,11 @@ from celery_app import celery_app
 from tasks import ingest_document_task
 from state_manager import StateManager
 from langsmith import traceable
-from agent_graph import app_graph
+from agent_graph import async_app_graph, decide_next_step, get_services
 from minio_storage import MinIOStorage
+from concurrency import read_concurrency_stats
+from cache_utils import singleflight_stats
+from llm_provider import get_llm_cache_stats
 
 # ---------------------------------------------------------------------------
 # Module-level state — None until lifespan initializes them.
@@ -87,6 +90,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"   ⚠️ Ingestor init failed: {e}")
 
+    # Agent services are built on first use; build them here on a worker thread
+    # so the first /query doesn't block the event loop connecting to Neo4j/Qdrant.
+    try:
+        await asyncio.to_thread(get_services)
+    except Exception as e:
+        print(f"   ⚠️ Agent services init failed: {e}")
+
     print("🚀 DocuMind started")
     yield
     print("🛑 DocuMind shutting down")
@@ -168,6 +178,45 @@ class QueryResponse(BaseModel):
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
+QUERY_MODEL_NAME = "DocuMind-Agent-v2"
+
+
+def _graph_inputs(request: QueryRequest) -> dict:
+    """Initial AgentState for a query."""
+    return {
+        "question":          request.question,
+        "history":           request.history or [],
+        "selected_docs":     request.selected_docs or [],  # Fix 11 — confirmed wired
+        "sub_queries":       [],
+        "documents":         [],
+        "generation":        "",
+        "audit_feedback":    "",
+        "retry_count":       0,
+        "sources":           [],
+        "top_rerank_score":  0.0,
+        "has_contradiction": False,
+    }
+
+
+def _clean_answer(raw_answer: str) -> str:
+    """Remove any leaked trusted-code-execution system note from the answer."""
+    return re.sub(
+        r'\[[^\]]*SYSTEM NOTE:[^\]]*TRUSTED CODE EXECUTION RESULT[^\]]*\]',
+        '',
+        raw_answer,
+    ).strip()
+
+
+def _confidence(final_state: dict) -> float:
+    """Rerank score penalised for contradictions and failed audits."""
+    top_score = final_state.get("top_rerank_score", 0.5)
+    if final_state.get("has_contradiction", False):
+        return max(0.0, min(top_score * 0.7, 0.75))
+    if not final_state.get("audit_feedback", ""):
+        return max(0.05, min(top_score, 0.95))
+    return max(0.05, min(top_score * 0.5, 0.5))
+
+
 def get_mime_type(filename: str) -> str:
     """Return MIME type from filename extension."""
     ext = os.path.splitext(filename)[1].lower()
@@ -234,43 +283,34 @@ def _build_dashboard_data() -> dict:
     total_documents = len(doc_list)
 
     # ── 2. GRAPH INTELLIGENCE (Fix 10 — Redis-cached) ─────────────────────
+    # Counts are maintained incrementally by KnowledgeBase on ingest/delete —
+    # nothing here scans the graph.
     total_nodes    = 0
     total_links    = 0
     top_entities   = []
     relation_types = {}
+    node_labels    = {}
     try:
         cached = state_manager.redis_client.get(DASHBOARD_CACHE_KEY)
         if cached:
-            graph_data = json.loads(cached)
+            summary = json.loads(cached)
         else:
-            graph_data = get_kb().get_visualization_data()
+            summary = get_kb().get_graph_summary(top_k=6)
             state_manager.redis_client.setex(
                 DASHBOARD_CACHE_KEY,
                 DASHBOARD_CACHE_TTL,
-                json.dumps(graph_data),
+                json.dumps(summary),
             )
 
-        nodes       = graph_data.get("nodes", [])
-        links       = graph_data.get("links", [])
-        total_nodes = len(nodes)
-        total_links = len(links)
-
-        degree_map = {}
-        for link in links:
-            src = link.get("source", "")
-            tgt = link.get("target", "")
-            degree_map[src] = degree_map.get(src, 0) + 1
-            degree_map[tgt] = degree_map.get(tgt, 0) + 1
-
-        sorted_entities = sorted(degree_map.items(), key=lambda x: x[1], reverse=True)
-        top_entities = [
-            {"name": name, "connections": count}
-            for name, count in sorted_entities[:6]
-        ]
-
-        for link in links:
-            label = link.get("label", "UNKNOWN") or "UNKNOWN"
-            relation_types[label] = relation_types.get(label, 0) + 1
+        total_nodes    = summary["total_nodes"]
+        total_links    = summary["total_links"]
+        top_entities   = summary["top_entities"]
+        relation_types = summary["relation_types"]
+        node_labels    = summary["node_labels"]
+        for doc in doc_list:
+            counts = summary["documents"].get(doc["filename"], {})
+            doc["entities"]  = counts.get("nodes", 0)
+            doc["relations"] = counts.get("edges", 0)
 
     except Exception as e:
         print(f"⚠️ Dashboard: graph section failed: {e}")
@@ -340,6 +380,7 @@ def _build_dashboard_data() -> dict:
             "total_links":    total_links,
             "top_entities":   top_entities,
             "relation_types": relation_types,
+            "node_labels":    node_labels,
         },
         "health": {
             "redis":  redis_status,
@@ -434,11 +475,31 @@ async def health_check():
     )
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Cache hit/miss counters (vectors, extraction, subgraphs, LLM responses), graph snapshot footprint, request coalescing and ingest concurrency. Read-only."""
+    registry = get_services()["graph_builder"].entity_registry
+    return {
+        "vector_store":     get_vector_db().cache_stats(),
+        "graph_extraction": get_services()["graph_builder"].cache_stats(),
+        "entity_registry":  registry.stats() if registry else None,
+        "subgraph_cache":   get_kb().subgraph_cache_stats(),
+        # In-process CSR snapshot: node/edge counts, bytes held, refresh timings
+        "graph_snapshot":   get_kb().graph_snapshot_stats(),
+        "llm_cache":        get_llm_cache_stats(),
+        # Identical in-flight LLM / query-embedding / rerank calls shared in this process
+        "coalescing":       singleflight_stats(),
+        # Per ingest worker (host:pid:limiter): current AIMD limit and in-flight calls
+        "ingest_concurrency": read_concurrency_stats(state_manager.redis_client),
+    }
+
+
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), bypass_cache: bool = False):
     """
     Saves the file to MinIO and dispatches a Celery task for ingestion.
     Returns a task_id immediately.
+    ?bypass_cache=true re-runs graph extraction instead of reusing cached chunks.
     Cache invalidation for dashboard graph happens in tasks.py on ingestion
     completion — NOT here, because the graph hasn't changed at dispatch time.
     """
@@ -465,7 +526,7 @@ async def upload_document(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
-    task = ingest_document_task.delay(file.filename)
+    task = ingest_document_task.delay(file.filename, bypass_cache=bypass_cache)
     state_manager.set_processing(file.filename, task.id)
 
     return {
@@ -562,9 +623,29 @@ def get_dashboard():
 
 
 @app.get("/graph")
-def get_graph(limit: int = 1000):
+async def get_graph(limit: int = 1000):
     """Returns graph visualization data for GraphExplorer component."""
-    return get_kb().get_visualization_data(limit=limit)
+    return await get_kb().aget_visualization_data(limit=limit)
+
+
+@app.get("/graph/export")
+def export_graph(cursor: Optional[str] = None, max_edges: int = 20000):
+    """
+    Streams the graph as NDJSON (one node / link record per line) so the
+    GraphExplorer can render large graphs as they load. The last line carries
+    a cursor: pass it back to continue after max_edges, null when complete.
+    """
+    if max_edges < 1:
+        raise HTTPException(status_code=400, detail="max_edges must be positive")
+    try:
+        records = get_kb().iter_graph_export(cursor=cursor, max_edges=max_edges)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        (json.dumps(record) + "\n" for record in records),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},  # let nginx pass lines through as they come
+    )
 
 
 @app.post("/query", response_model=QueryResponse)
@@ -573,44 +654,19 @@ async def query_knowledge_base(request: QueryRequest):
     """Executes the LangGraph RAG pipeline."""
     print(f"🧠 Invoking Agent Graph for: {request.question}")
 
-    inputs = {
-        "question":          request.question,
-        "history":           request.history or [],
-        "selected_docs":     request.selected_docs or [],  # Fix 11 — confirmed wired
-        "sub_queries":       [],
-        "documents":         [],
-        "generation":        "",
-        "audit_feedback":    "",
-        "retry_count":       0,
-        "sources":           [],
-        "top_rerank_score":  0.0,
-        "has_contradiction": False,
-    }
-
     try:
-        # Fix 5 — asyncio.wait_for; surfaces as 504 instead of hanging forever
+        # Fix 5 — asyncio.wait_for; surfaces as 504 instead of hanging forever.
+        # Async graph: the query awaits its I/O on the event loop, no thread held.
         final_state = await asyncio.wait_for(
-            asyncio.to_thread(app_graph.invoke, inputs),
+            async_app_graph.ainvoke(_graph_inputs(request)),
             timeout=float(os.getenv("QUERY_TIMEOUT_S", "60")),
         )
 
-        raw_answer = final_state["generation"]
-        clean_answer = re.sub(
-            r'\[[^\]]*SYSTEM NOTE:[^\]]*TRUSTED CODE EXECUTION RESULT[^\]]*\]',
-            '',
-            raw_answer,
-        ).strip()
         return QueryResponse(
-            answer=clean_answer,
+            answer=_clean_answer(final_state["generation"]),
             context_used=final_state.get("sources", []),
-            confidence=(
-                max(0.0, min(final_state.get("top_rerank_score", 0.5) * 0.7, 0.75))
-                if final_state.get("has_contradiction", False)
-                else max(0.05, min(final_state.get("top_rerank_score", 0.5), 0.95))
-                if not final_state.get("audit_feedback", "")
-                else max(0.05, min(final_state.get("top_rerank_score", 0.5) * 0.5, 0.5))
-            ),
-            model="DocuMind-Agent-v2",
+            confidence=_confidence(final_state),
+            model=QUERY_MODEL_NAME,
         )
 
     except asyncio.TimeoutError:
@@ -622,6 +678,95 @@ async def query_knowledge_base(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stage_event(node: str, update: dict, state: dict):
+    """Map a graph node's state update to an SSE (event, data) pair, or None."""
+    if node == "route":
+        return "route", {
+            "question_type": update.get("question_type", "factual"),
+            "multi_entity":  update.get("multi_entity", False),
+        }
+    if node == "decompose":
+        return "sub_queries", {"sub_queries": update.get("sub_queries", [])}
+    if node == "retrieve":
+        return "sources", {
+            "sources":          update.get("sources", []),
+            "top_rerank_score": update.get("top_rerank_score", 0.0),
+        }
+    if node == "audit":
+        feedback = update.get("audit_feedback", "")
+        return "audit", {
+            "passed":            not feedback,
+            "feedback":          feedback,
+            "has_contradiction": state.get("has_contradiction", False),
+            "will_retry":        decide_next_step(state) == "retry",
+        }
+    return None  # generate — its tokens are already on the custom stream
+
+
+async def _query_events(inputs: dict):
+    """
+    Drives async_app_graph with astream() and yields SSE frames:
+      route → sub_queries → sources → generation_start/token… → audit
+      (→ generation_start/token… → audit on retry) → done
+    Failures arrive as a final `error` event — the 200 is already on the wire.
+    """
+    state = dict(inputs)
+    try:
+        async with asyncio.timeout(float(os.getenv("QUERY_TIMEOUT_S", "60"))):
+            async for mode, chunk in async_app_graph.astream(
+                inputs,
+                config={"configurable": {"stream_tokens": True}},
+                stream_mode=["updates", "custom"],
+            ):
+                if mode == "custom":
+                    payload = dict(chunk)
+                    yield _sse(payload.pop("event"), payload)
+                    continue
+                for node, update in chunk.items():
+                    if not update:
+                        continue
+                    state.update(update)
+                    event = _stage_event(node, update, state)
+                    if event:
+                        yield _sse(*event)
+
+        yield _sse("done", {
+            "answer":       _clean_answer(state.get("generation", "")),
+            "context_used": state.get("sources", []),
+            "confidence":   _confidence(state),
+            "model":        QUERY_MODEL_NAME,
+        })
+
+    except TimeoutError:
+        yield _sse("error", {"status": 504, "detail": "Query timed out — try a simpler question"})
+
+    except Exception as e:
+        print(f"❌ Graph Stream Error: {e}")
+        yield _sse("error", {"status": 500, "detail": str(e)})
+
+
+@app.post("/query/stream")
+async def query_knowledge_base_stream(request: QueryRequest):
+    """
+    Server-sent-events variant of /query. Stage results and answer tokens are
+    sent as they are produced; the final `done` event carries the same fields
+    as QueryResponse.
+    """
+    print(f"🧠 Streaming Agent Graph for: {request.question}")
+    return StreamingResponse(
+        _query_events(_graph_inputs(request)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control":     "no-cache",
+            "X-Accel-Buffering": "no",  # nginx: flush each event, don't buffer
+        },
+    )
+
+
 @app.post("/summarize/{filename}")
 @traceable(name="document_summary")
 async def summarize_document(filename: str):
@@ -42,11 +42,12 @@ def _run_async(coro):
 
 
 @celery_app.task(bind=True, name="ingest_document")
-def ingest_document_task(self, filename: str):
+def ingest_document_task(self, filename: str, bypass_cache: bool = False):
     """
     Celery task wrapper for document ingestion.
     GPU lock is conditional — only acquired for local providers (Ollama, vLLM).
     Cloud providers (Groq, NVIDIA, OpenAI) skip the lock entirely.
+    bypass_cache=True forces fresh graph extraction for every chunk.
     """
     # Guard — ensure worker_process_init has fired before using singletons
     if state_manager is None or _ingestor is None or _minio is None:
@@ -89,7 +90,8 @@ def ingest_document_task(self, filename: str):
                 _ingestor.process_document(
                     file_path=file_path,
                     filename=filename,
-                    cancellation_token=check_if_cancelled
+                    cancellation_token=check_if_cancelled,
+                    bypass_cache=bypass_cache
                 )
             )
 
@@ -0,0 +1,173 @@
+"""
+Test that aingest_graph() writes the same batches and report as ingest_graph().
+Uses stub sync / async Neo4j sessions — no services needed.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import knowledge_graph
+from cache_utils import KeyedGenerations
+from concurrency import LoopScoped
+from graph_stats import GraphManifest, GraphStats
+from knowledge_graph import KnowledgeBase
+
+GRAPHS = [{
+    "nodes": [
+        {"id": "n1", "name": "Vantage Systems", "type": "Organization", "properties": {"aliases": ["Vantage"]}},
+        {"id": "n2", "name": "Helixor", "type": "Organization", "properties": {}},
+    ],
+    "edges": [{"source_id": "n1", "target_id": "n2", "type": "ACQUIRED", "properties": {}}],
+}]
+
+EXISTING_EDGES = set()  # (source, target) pairs the stub reports as matched, not created
+
+
+class _Result:
+    def __init__(self, query, rows):
+        if "MERGE (n:" in query:
+            self.records = [{"document_ids": ["a.pdf"], "ids": [f"4:{r['name']}" for r in rows]}]
+            self.counters = SimpleNamespace(nodes_created=len(rows))
+        elif "MERGE (a)-[r:" in query:
+            self.records = [{"source": r["source_name"], "target": r["target_name"], "id": "5:e",
+                             "created": (r["source_name"], r["target_name"]) not in EXISTING_EDGES}
+                            for r in rows]
+            self.counters = SimpleNamespace(nodes_created=0)
+        else:
+            self.records, self.counters = [], SimpleNamespace(nodes_created=0)
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        return SimpleNamespace(counters=self.counters)
+
+
+class _AsyncResult(_Result):
+    async def data(self):
+        return self.records
+
+    async def consume(self):
+        return SimpleNamespace(counters=self.counters)
+
+
+class _Tx:
+    def __init__(self, result_type):
+        self.result_type = result_type
+
+    def run(self, query, rows, **params):
+        return self.result_type(query, rows)
+
+
+class _AsyncTx(_Tx):
+    async def run(self, query, rows, **params):
+        return self.result_type(query, rows)
+
+
+class _Session:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args):
+        return fn(_Tx(_Result), *args)
+
+
+class _AsyncSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_write(self, fn, *args):
+        return await fn(_AsyncTx(_AsyncResult), *args)
+
+
+async def _close_stub(driver):
+    pass
+
+
+def _kb() -> KnowledgeBase:
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver = SimpleNamespace(session=lambda **config: _Session())
+    kb._redis = None
+    kb.stats = GraphStats(redis_client=None)
+    kb.manifest = GraphManifest(redis_client=None)
+    kb._edge_indexes = {"ACQUIRED"}
+    kb._subgraph_generations = KeyedGenerations("test", client=None)
+    return kb
+
+
+def _comparable(report: dict) -> dict:
+    return {k: v for k, v in report.items() if k not in ("elapsed_ms", "batches")} | {
+        "batches": [(b["kind"], b["key"], b["rows"], b["error"]) for b in report["batches"]]
+    }
+
+
+def test_async_bulk_write_matches_sync():
+    sync_kb = _kb()
+    sync_report = sync_kb.ingest_graph(GRAPHS, "a.pdf", bulk=True)
+
+    async def run():
+        kb = _kb()
+        kb._async_drivers = LoopScoped(lambda: SimpleNamespace(session=lambda **config: _AsyncSession()),
+                                       _close_stub)
+        return kb, await kb.aingest_graph(GRAPHS, "a.pdf")
+
+    async_kb, async_report = asyncio.run(run())
+
+    assert _comparable(async_report) == _comparable(sync_report)
+    assert async_report["nodes_created"] == 2 and async_report["edges_created"] == 1
+    assert async_kb.manifest.load("a.pdf") == sync_kb.manifest.load("a.pdf") == (
+        ["4:Vantage Systems", "4:Helixor"], ["5:e"]
+    )
+    assert async_kb.stats.summary()["relation_types"] == {"ACQUIRED": 1}
+
+
+def test_manifest_lists_merged_rows_not_only_created_ones():
+    # The edge already existed — another document created it
+    EXISTING_EDGES.add(("Vantage Systems", "Helixor"))
+    try:
+        kb = _kb()
+        report = kb.ingest_graph(GRAPHS, "a.pdf", bulk=True)
+    finally:
+        EXISTING_EDGES.clear()
+
+    assert report["edges_created"] == 0
+    assert kb.manifest.load("a.pdf") == (["4:Vantage Systems", "4:Helixor"], ["5:e"])
+    assert kb.stats.summary()["relation_types"] == {}
+
+
+def test_async_driver_per_loop_is_closed_on_that_loop(monkeypatch):
+    closed = []
+
+    class _AsyncDriver:
+        async def close(self):
+            closed.append((self, asyncio.get_running_loop()))
+
+    monkeypatch.setattr(knowledge_graph, "AsyncGraphDatabase",
+                        SimpleNamespace(driver=lambda *a, **k: _AsyncDriver()))
+    kb = _kb()
+    kb._async_drivers = LoopScoped(kb._open_async_driver, lambda driver: driver.close())
+
+    async def open_driver():
+        return kb.async_driver, asyncio.get_running_loop()
+
+    # asyncio.run() — app_graph.invoke(), Celery's fallback: closed before the loop goes
+    first, _ = asyncio.run(open_driver())
+    assert [d for d, _ in closed] == [first]
+
+    # A long-lived loop keeps one driver across calls, untouched by other loops
+    loop = asyncio.new_event_loop()
+    try:
+        second, second_loop = loop.run_until_complete(open_driver())
+        third, _ = asyncio.run(open_driver())
+        assert loop.run_until_complete(open_driver())[0] is second
+        assert third is not second and (second, second_loop) not in closed
+        loop.run_until_complete(kb.aclose())
+        assert (second, second_loop) in closed
+    finally:
+        loop.close()
@@ -0,0 +1,197 @@
+"""
+Test the UNWIND bulk graph writer: per-batch failure isolation, row order
+and created-vs-matched counting, through both ingest_graph() and
+aingest_graph(). Uses a stub Neo4j that applies MERGE rows in order —
+no services needed.
+"""
+
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from cache_utils import KeyedGenerations
+from concurrency import LoopScoped
+from graph_stats import GraphManifest, GraphStats
+from knowledge_graph import KnowledgeBase
+
+
+def _node(node_id, name, chunk, **properties):
+    return {"id": node_id, "name": name, "type": "Organization",
+            "properties": {"chunk_id": chunk, **properties}}
+
+
+def _edge(source_id, target_id):
+    return {"source_id": source_id, "target_id": target_id, "type": "ACQUIRED", "properties": {}}
+
+
+class _Graph:
+    """Just enough of Neo4j for the bulk templates: MERGE by key, rows in order."""
+
+    def __init__(self, nodes=(), edges=(), fail_on=()):
+        self.nodes = {("Organization", name): {} for name in nodes}
+        self.edges = {("ACQUIRED", source, target) for source, target in edges}
+        self.fail_on = set(fail_on)  # a batch containing one of these names raises
+        self.statements = []         # (kind, rows) in the order they were sent
+
+    def run(self, query, rows, **params):
+        kind = "nodes" if "MERGE (n:" in query else "edges" if "MERGE (a)-[r:" in query else "aliases"
+        self.statements.append((kind, rows))
+        if any(self.fail_on & {r.get("name"), r.get("source_name")} for r in rows):
+            raise RuntimeError("Neo.TransientError.Transaction.DeadlockDetected")
+        if kind == "nodes":
+            label = re.search(r"MERGE \(n:(\w+)", query).group(1)
+            created = 0
+            for r in rows:
+                created += (label, r["name"]) not in self.nodes
+                self.nodes.setdefault((label, r["name"]), {}).update(r["properties"])
+            ids = list(dict.fromkeys(f"4:{r['name']}" for r in rows))
+            return [{"document_ids": [params["document_id"]], "ids": ids}], created
+        if kind == "edges":
+            rel = re.search(r"\[r:(\w+)\]", query).group(1)
+            records = {}
+            for r in rows:
+                key = (rel, r["source_name"], r["target_name"])
+                created = key not in self.edges
+                self.edges.add(key)
+                records.setdefault(key, {"source": key[1], "target": key[2],
+                                         "id": f"5:{key[1]}->{key[2]}", "created": created})
+            return list(records.values()), 0
+        return [], 0
+
+
+class _Result:
+    def __init__(self, records, nodes_created):
+        self.records = records
+        self.counters = SimpleNamespace(nodes_created=nodes_created)
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        return SimpleNamespace(counters=self.counters)
+
+
+class _AsyncResult(_Result):
+    async def data(self):
+        return self.records
+
+    async def consume(self):
+        return SimpleNamespace(counters=self.counters)
+
+
+class _Session:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args):
+        graph = self.graph
+        return fn(SimpleNamespace(run=lambda query, rows, **params: _Result(*graph.run(query, rows, **params))),
+                  *args)
+
+
+class _AsyncSession(_Session):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_write(self, fn, *args):
+        graph = self.graph
+
+        async def run(query, rows, **params):
+            return _AsyncResult(*graph.run(query, rows, **params))
+
+        return await fn(SimpleNamespace(run=run), *args)
+
+
+async def _close_stub(driver):
+    pass
+
+
+def _write(graph: _Graph, graphs, mode: str, batch_size: int = 2):
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver = SimpleNamespace(session=lambda **config: _Session(graph))
+    kb._redis = None
+    kb.stats = GraphStats(redis_client=None)
+    kb.manifest = GraphManifest(redis_client=None)
+    kb._edge_indexes = {"ACQUIRED"}
+    kb._subgraph_generations = KeyedGenerations("test", client=None)
+    if mode == "sync":
+        return kb, kb.ingest_graph(graphs, "a.pdf", bulk=True, batch_size=batch_size)
+
+    kb._async_drivers = LoopScoped(lambda: SimpleNamespace(session=lambda **config: _AsyncSession(graph)),
+                                   _close_stub)
+    return kb, asyncio.run(kb.aingest_graph(graphs, "a.pdf", batch_size=batch_size))
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_failed_batch_is_counted_and_later_batches_still_run(mode):
+    graphs = [{
+        "nodes": [_node("n1", "Vantage", "c1"), _node("n2", "Helixor", "c1"), _node("n3", "Austin Labs", "c1")],
+        "edges": [_edge("n1", "n2"), _edge("n1", "n3")],
+    }]
+    graph = _Graph(fail_on={"Helixor"})
+    kb, report = _write(graph, graphs, mode, batch_size=1)
+
+    assert (report["nodes_written"], report["nodes_failed"]) == (2, 1)
+    assert (report["edges_written"], report["edges_failed"]) == (2, 0)
+    assert [b["error"] is not None for b in report["batches"]] == [False, True, False, False, False]
+    assert ("Organization", "Austin Labs") in graph.nodes
+    # Only committed batches reach the manifest and the stats
+    node_ids, _ = kb.manifest.load("a.pdf")
+    assert node_ids == ["4:Vantage", "4:Austin Labs"]
+    assert kb.stats.summary()["node_labels"] == {"Organization": 2}
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_rows_are_sent_in_chunk_order(mode):
+    graphs = [
+        {"nodes": [_node("n1", "Vantage", "c1", sector="software"), _node("n2", "Helixor", "c1")],
+         "edges": [_edge("n1", "n2")]},
+        {"nodes": [_node("n1", "Vantage", "c2", sector="semiconductors"), _node("n2", "Austin Labs", "c2")],
+         "edges": [_edge("n1", "n2")]},
+    ]
+    graph = _Graph()
+    _write(graph, graphs, mode, batch_size=3)
+
+    # Every node batch before any edge batch; rows keep their chunk order across batches
+    assert [kind for kind, _ in graph.statements] == ["nodes", "nodes", "edges"]
+    assert [(r["name"], r["chunk_id"]) for _, rows in graph.statements[:2] for r in rows] == [
+        ("Vantage", "c1"), ("Helixor", "c1"), ("Vantage", "c2"), ("Austin Labs", "c2"),
+    ]
+    # ...so the later chunk's properties win, as with the per-row writer
+    assert graph.nodes[("Organization", "Vantage")]["sector"] == "semiconductors"
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_created_and_matched_rows_are_counted_apart(mode):
+    graphs = [
+        {"nodes": [_node("n1", "Vantage", "c1"), _node("n2", "Helixor", "c1"), _node("n3", "Austin Labs", "c1")],
+         "edges": [_edge("n1", "n2"), _edge("n1", "n3")]},
+        # The same new edge again, in the same batch
+        {"nodes": [_node("n1", "Vantage", "c2"), _node("n2", "Austin Labs", "c2")],
+         "edges": [_edge("n1", "n2")]},
+    ]
+    # Another document already wrote Vantage and its edge to Helixor
+    graph = _Graph(nodes={"Vantage"}, edges={("Vantage", "Helixor")})
+    kb, report = _write(graph, graphs, mode, batch_size=10)
+
+    assert (report["nodes_written"], report["nodes_created"]) == (5, 2)
+    assert (report["edges_written"], report["edges_created"]) == (3, 1)
+    summary = kb.stats.summary()
+    assert summary["node_labels"] == {"Organization": 2}
+    assert summary["relation_types"] == {"ACQUIRED": 1}
+    # Matched rows are still this document's writes
+    assert kb.manifest.load("a.pdf") == (
+        ["4:Vantage", "4:Helixor", "4:Austin Labs"],
+        ["5:Vantage->Helixor", "5:Vantage->Austin Labs"],
+    )
@@ -0,0 +1,76 @@
+"""
+Test cross-document entity resolution against the persistent registry.
+Runs the registry in-process (no Redis) — no LLM calls or services needed.
+"""
+
+from entity_registry import PersistentEntityRegistry, registry_key
+from graph_agent import _compose_registries
+
+
+def test_registry_key_ignores_titles_and_legal_forms():
+    assert registry_key("Vantage Systems, Inc.", "Organization") == "vantage systems"
+    assert registry_key("Vantage Systems Inc", "Organization") == "vantage systems"
+    assert registry_key("Dr. Sarah Chen, PhD", "Person") == "sarah chen"
+    assert registry_key("Inc.", "Organization") == "inc"
+
+
+def test_second_document_resolves_to_first_documents_canonical():
+    registry = PersistentEntityRegistry(redis_client=None)
+    registry.record(
+        "filing-a.pdf",
+        canonicals={"Vantage Systems, Inc.": "Organization", "Gerald Ashford": "Person"},
+        aliases={"Vantage": "Vantage Systems, Inc."},
+    )
+
+    matches, ambiguous = registry.resolve({
+        "Vantage Systems Inc": "Organization",   # same blocking key
+        "Vantage": "Organization",               # stored alias
+        "Gerald Ashford": "Person",              # already canonical
+        "Gerald Fontaine": "Person",             # nameparser guard blocks
+        "Helixor Capital": "Organization",       # unseen
+    })
+    assert matches == {
+        "Vantage Systems Inc": "Vantage Systems, Inc.",
+        "Vantage": "Vantage Systems, Inc.",
+    }
+    assert ambiguous == []
+
+
+def test_stored_canonical_is_never_absorbed():
+    registry = PersistentEntityRegistry(redis_client=None)
+    registry.record("filing-a.pdf", canonicals={"Acme Corp": "Organization"}, aliases={})
+
+    # The LLM picked the new, longer name — the stored one must stay canonical
+    assert registry.prefer_stored({"Acme Corp": "Acme Corporation Group"}) == {
+        "Acme Corporation Group": "Acme Corp"
+    }
+
+
+def test_deleting_a_document_drops_only_the_names_no_other_document_uses():
+    registry = PersistentEntityRegistry(redis_client=None)
+    registry.record(
+        "filing-a.pdf",
+        canonicals={"Vantage Systems, Inc.": "Organization", "Gerald Ashford": "Person"},
+        aliases={"Vantage": "Vantage Systems, Inc."},
+    )
+    registry.record("filing-b.pdf", canonicals={"Vantage Systems, Inc.": "Organization"}, aliases={})
+    # Re-recording a document replaces its references instead of adding to them
+    registry.record("filing-b.pdf", canonicals={"Vantage Systems, Inc.": "Organization"}, aliases={})
+
+    registry.forget("filing-a.pdf")
+    assert registry.stats() == {"canonical_names": 1, "aliases": 0}
+    matches, _ = registry.resolve({"Vantage Systems Inc": "Organization", "Gerald Ashford": "Person"})
+    assert matches == {"Vantage Systems Inc": "Vantage Systems, Inc."}
+
+    registry.forget("filing-b.pdf")
+    assert registry.stats() == {"canonical_names": 0, "aliases": 0}
+    assert registry.resolve({"Vantage Systems Inc": "Organization"}) == ({}, [])
+
+
+def test_compose_follows_chains_and_drops_cycles():
+    cross = {"Vantage Systems, Inc.": "Vantage Systems Inc"}
+    local = {"Vantage Systems": "Vantage Systems, Inc.", "Vantage Systems Inc": "Vantage Systems"}
+    assert _compose_registries(cross, local) == {
+        "Vantage Systems, Inc.": "Vantage Systems Inc",
+        "Vantage Systems": "Vantage Systems Inc",
+    }
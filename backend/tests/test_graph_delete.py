@@ -0,0 +1,83 @@
+"""
+Test batched document deletes: manifest seeks vs document_id index fallback.
+Uses a stub Neo4j session and in-process stats/manifest — no services needed.
+"""
+
+from cache_utils import KeyedGenerations
+from graph_stats import GraphManifest, GraphStats
+from knowledge_graph import KnowledgeBase
+
+EDGE_ROW = {"source_type": "Organization", "source": "Vantage", "target_type": "Location",
+            "target": "Austin", "rel": "LOCATED_IN"}
+NODE_ROW = {"label": "Location", "name": "Austin"}
+
+
+class _Record(dict):
+    def data(self):
+        return dict(self)
+
+
+class _Session:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        if "db.relationshipTypes" in query:
+            return [_Record(relationshipType="LOCATED_IN")]
+        if "IN TRANSACTIONS" not in query:
+            return []
+        if "DELETE r" in query and ("elementId(r)" in query or "[r:LOCATED_IN]" in query):
+            return [_Record(EDGE_ROW)]
+        if "DELETE n" in query and ("elementId(n)" in query or "(n:Location)" in query):
+            return [_Record(NODE_ROW)]
+        return []
+
+
+class _Driver:
+    def __init__(self):
+        self.queries = []
+
+    def session(self):
+        return _Session(self.queries)
+
+
+def _kb() -> KnowledgeBase:
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver = _Driver()
+    kb._redis = None
+    kb.stats = GraphStats(redis_client=None)
+    kb.manifest = GraphManifest(redis_client=None)
+    kb._subgraph_generations = KeyedGenerations("test", client=None)
+    return kb
+
+
+def test_manifest_delete_seeks_recorded_ids_and_reports_progress():
+    kb = _kb()
+    kb.manifest.record("b.pdf", ["4:db:7"], ["5:db:3"])
+    progress = []
+
+    kb.delete_document("b.pdf", progress=lambda *p: progress.append(p))
+
+    deletes = [(q, p) for q, p in kb.driver.queries if "IN TRANSACTIONS" in q]
+    assert [p["ids"] for _, p in deletes] == [["5:db:3"], ["4:db:7"]]
+    assert progress == [("edges", 1, 1), ("nodes", 1, 1)]
+    assert kb.manifest.load("b.pdf") is None
+
+
+def test_delete_without_manifest_scans_each_type_and_label_index():
+    kb = _kb()
+    progress = []
+
+    kb.delete_document("b.pdf", progress=lambda *p: progress.append(p))
+
+    deletes = [q for q, _ in kb.driver.queries if "IN TRANSACTIONS" in q]
+    assert "[r:LOCATED_IN]" in deletes[0]
+    assert sum("MATCH (n:" in q for q in deletes) == len(deletes) - 1
+    assert progress == [("edges", 1, None), ("nodes", 1, None)]
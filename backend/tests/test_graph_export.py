@@ -0,0 +1,44 @@
+"""
+Test the paged NDJSON graph export against a stub Neo4j session.
+No services needed.
+"""
+
+from types import SimpleNamespace
+
+from knowledge_graph import KnowledgeBase
+
+# "Apex" exists both as an Organization and as a Product.
+PAGES = {
+    "Organization": [{"source": "Apex", "source_degree": 2, "relation": "MAKES", "target": "Apex",
+                      "target_type": "Product", "target_degree": 1}],
+    "Person": [{"source": "Dana", "source_degree": 1, "relation": "WORKS_FOR", "target": "Apex",
+                "target_type": "Organization", "target_degree": 2}],
+}
+
+
+class _Session:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, after="", **params):
+        if "RETURN nodes, links" in query:
+            return SimpleNamespace(single=lambda: {"nodes": 3, "links": 2})
+        label = query.split("MATCH (s:", 1)[1].split(")", 1)[0]
+        rows = PAGES.get(label, []) if not after else []
+        return SimpleNamespace(data=lambda: rows)
+
+
+def test_export_emits_each_node_id_once():
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver = SimpleNamespace(session=lambda **config: _Session())
+
+    records = list(kb.iter_graph_export())
+
+    node_ids = [r["id"] for r in records if r["type"] == "node"]
+    links = [(r["source"], r["target"]) for r in records if r["type"] == "link"]
+    assert sorted(node_ids) == ["Apex", "Dana"]
+    assert all(s in node_ids and t in node_ids for s, t in links)
+    assert records[-1] == {"type": "end", "cursor": None, "links": 2}
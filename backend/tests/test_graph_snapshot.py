@@ -0,0 +1,78 @@
+"""
+Test the in-process CSR graph snapshot: subgraph expansion, degree ranking,
+document deletes and the memory report. Loaded from rows — no Neo4j needed.
+"""
+
+from graph_snapshot import GraphSnapshot
+from graph_stats import GraphStats
+from knowledge_graph import KnowledgeBase
+
+NODES = [
+    {"label": "Organization", "name": "Vantage Systems", "aliases": ["Vantage"], "doc": "a.pdf"},
+    {"label": "Organization", "name": "Helixor", "aliases": None, "doc": "a.pdf"},
+    {"label": "Person", "name": "Sarah Chen", "aliases": None, "doc": "a.pdf"},
+    {"label": "Location", "name": "Austin", "aliases": None, "doc": "b.pdf"},
+    {"label": "Concept", "name": "Vantage Holdings Capital", "aliases": None, "doc": "b.pdf"},
+]
+EDGES = [
+    ("Organization", "Vantage Systems", "ACQUIRED", "Organization", "Helixor", "a.pdf"),
+    ("Person", "Sarah Chen", "EMPLOYED_AT", "Organization", "Vantage Systems", "a.pdf"),
+    ("Organization", "Helixor", "RELATED_TO", "Location", "Austin", "b.pdf"),
+]
+
+
+def _snapshot() -> GraphSnapshot:
+    snapshot = GraphSnapshot(driver=None)
+    snapshot.load(NODES, [
+        {"a_label": a_label, "a_name": a, "rel": rel, "b_label": b_label, "b_name": b, "doc": doc}
+        for a_label, a, rel, b_label, b, doc in EDGES
+    ])
+    return snapshot
+
+
+def test_expansion_matches_query_subgraph_rows():
+    snapshot = _snapshot()
+    rows = snapshot.subgraph_rows(["vantage systems"])
+    assert {(r["rel"], r["m_name"], r["rel2"], r["leaf_node"]) for r in rows} == {
+        ("ACQUIRED", "Helixor", "RELATED_TO", "Austin"),
+        ("EMPLOYED_AT", "Sarah Chen", None, None),
+    }
+    assert rows[0]["n_aliases"] == ["Vantage"]
+
+    # The phrase must appear as whole tokens; exact names rank before partial ones
+    rows = snapshot.subgraph_rows(["Vantage"])
+    assert [r["n_name"] for r in rows][0] == "Vantage Systems"
+    assert snapshot.subgraph_rows(["vant"]) == []
+    assert snapshot.subgraph_rows(["Vantage"], source_filter=["b.pdf"]) == []
+
+
+def test_delete_drops_edges_and_orphans_and_reports_memory():
+    snapshot = _snapshot()
+    assert snapshot.top_degree(2) == [
+        {"name": "Vantage Systems", "type": "Organization", "connections": 2},
+        {"name": "Helixor", "type": "Organization", "connections": 2},
+    ]
+
+    snapshot.apply_change({"op": "delete", "doc": "b.pdf"})
+    assert snapshot.top_degree(1, label="Location") == []
+    report = snapshot.memory_report()
+    assert (report["nodes"], report["dead_nodes"], report["edges"]) == (3, 2, 2)
+    assert report["bytes"]["csr_arrays"] > 0
+
+    assert GraphSnapshot(driver=None).subgraph_rows(["Vantage"]) is None
+
+
+def test_graph_summary_ranks_top_entities_from_the_snapshot():
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver, kb.stats = None, GraphStats(redis_client=None)
+    kb.snapshot = GraphSnapshot(driver=None)
+    kb.snapshot._thread = object()  # no refresher — the test loads rows directly
+
+    # Not built yet: GraphStats' degree ranking stands in
+    assert kb.get_graph_summary(top_k=2)["top_entities"] == []
+
+    kb.snapshot = _snapshot()
+    kb.snapshot._thread = object()
+    assert kb.get_graph_summary(top_k=1)["top_entities"] == [
+        {"name": "Vantage Systems", "type": "Organization", "connections": 2},
+    ]
@@ -0,0 +1,61 @@
+"""
+Test the incrementally maintained graph statistics and the export cursor.
+Runs GraphStats in-process (no Redis) — no Neo4j or other services needed.
+"""
+
+import pytest
+
+from graph_stats import GraphStats, GraphStatsDelta, degree_member
+from knowledge_graph import _decode_export_cursor, _encode_export_cursor
+
+
+def _ingest(stats: GraphStats, document_id: str, nodes: dict, edges: list) -> None:
+    delta = GraphStatsDelta()
+    for label, n in nodes.items():
+        delta.nodes(label, document_id, n)
+    for rel, (src_label, src), (tgt_label, tgt) in edges:
+        delta.edge(rel, degree_member(src_label, src), degree_member(tgt_label, tgt), document_id)
+    stats.apply(delta)
+
+
+def test_ingest_and_delete_keep_counts_current():
+    stats = GraphStats(redis_client=None)
+    _ingest(stats, "a.pdf", {"Person": 2, "Organization": 1}, [
+        ("EMPLOYED_AT", ("Person", "Sarah Chen"), ("Organization", "Vantage")),
+        ("EMPLOYED_AT", ("Person", "Gerald Ashford"), ("Organization", "Vantage")),
+    ])
+    _ingest(stats, "b.pdf", {"Location": 1}, [
+        ("LOCATED_IN", ("Organization", "Vantage"), ("Location", "Austin")),
+    ])
+
+    summary = stats.summary(top_k=2)
+    assert summary["total_nodes"] == 4
+    assert summary["total_links"] == 3
+    assert summary["relation_types"] == {"EMPLOYED_AT": 2, "LOCATED_IN": 1}
+    assert summary["top_entities"][0] == {"name": "Vantage", "type": "Organization", "connections": 3}
+    assert summary["documents"]["b.pdf"] == {"nodes": 1, "edges": 1}
+
+    # Deleting b.pdf removes its edge and the node only it owned
+    delta = GraphStatsDelta()
+    delta.edge("LOCATED_IN", degree_member("Organization", "Vantage"),
+               degree_member("Location", "Austin"), sign=-1)
+    delta.node_removed("Location", "Austin")
+    delta.document_removed("b.pdf")
+    stats.apply(delta)
+
+    summary = stats.summary(top_k=6)
+    assert summary["total_nodes"] == 3
+    assert summary["relation_types"] == {"EMPLOYED_AT": 2}
+    assert {e["name"]: e["connections"] for e in summary["top_entities"]} == {
+        "Vantage": 2, "Sarah Chen": 1, "Gerald Ashford": 1,
+    }
+    assert list(summary["documents"]) == ["a.pdf"]
+
+
+def test_export_cursor_round_trip_and_rejects_garbage():
+    cursor = _encode_export_cursor("Person", "Dr. Sarah Chen: CFO")
+    assert _decode_export_cursor(cursor) == ("Person", "Dr. Sarah Chen: CFO")
+    with pytest.raises(ValueError):
+        _decode_export_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        _decode_export_cursor(_encode_export_cursor("Person) DETACH DELETE (x", "a"))
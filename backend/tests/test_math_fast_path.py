@@ -0,0 +1,83 @@
+"""
+Test the in-process arithmetic fast path against the subprocess sandbox.
+No LLM or services needed.
+"""
+
+from code_executor import MathExecutor, evaluate_simple_arithmetic
+
+GENERATED_CODE = """# Extracted Variables
+category_a = 88
+category_b = 76
+category_c = 49
+overlap = 27
+records = 12 - 3 - 2 + 3 - 2 - 1
+
+# Calculation
+# Sum the categories, then remove the overlap
+subtotal = category_a + category_b + category_c
+subtotal -= overlap
+result = round(subtotal / records, 2)
+print(f"Adjusted Load Index: {result:,.2f} ({subtotal} / {records})")
+"""
+
+
+def test_fast_path_matches_sandbox():
+    """Whitelisted code gives byte-identical output to the sandbox"""
+    executor = MathExecutor(llm_provider=None)
+    snippets = [
+        GENERATED_CODE,
+        "a = 213\nb = 27\nprint('Difference:', a - b)",
+        "print(max(abs(-3), min(2, 7)) ** 2 % 5, 7 // 2)",
+        "total = sum([10, 20, 30.5])\nprint(total)",
+        "x = 1\nx = -x",
+    ]
+    for code in snippets:
+        fast = evaluate_simple_arithmetic(code)
+        assert fast is not None, code
+        assert fast == executor._execute_in_subprocess(code), code
+
+
+def test_fast_path_reports_arithmetic_errors():
+    """Division by zero fails like the sandbox would, without a process"""
+    result = evaluate_simple_arithmetic("a = 5\nb = 0\nprint(a / b)")
+    assert result["success"] is False
+    assert "ZeroDivisionError" in result["error"]
+
+
+def test_non_whitelisted_code_falls_back():
+    """Anything beyond assignments, arithmetic and one print goes to the sandbox"""
+    rejected = [
+        "import os\nprint(os.getcwd())",
+        "for i in range(3):\n    print(i)",
+        "print(open('/etc/passwd').read())",
+        "x = (1).__class__\nprint(x)",
+        "print(__import__('os'))",
+        "print(1)\nprint(2)",
+        "print(1, sep='')",
+        "print(undefined_name)",
+        "round = 3\nprint(round)",
+        "print(10 ** 10 ** 10)",
+        "print('a' * 10)",
+        "x = [1, 2]\nprint(x)",
+        "print(f'{1!r}')",
+        "def f():\n    return 1",
+        "this is not python",
+    ]
+    for code in rejected:
+        assert evaluate_simple_arithmetic(code) is None, code
+
+
+def test_oversized_format_specs_fall_back():
+    """Huge f-string widths / precisions would allocate in-process — sandbox them"""
+    rejected = [
+        'x = 2\nprint(f"{x:5000000}")',
+        'x = 2\nprint(f"{x:>1000000000}")',
+        'x = 2.5\nprint(f"{x:.500f}")',
+        'w = 10 ** 6\nx = 2\nprint(f"{x:{w}}")',
+        'x = 2\nprint(f"{x:%Y}")',
+    ]
+    for code in rejected:
+        assert evaluate_simple_arithmetic(code) is None, code
+
+    assert evaluate_simple_arithmetic('x = 2.5\nprint(f"{x:*>12,.3f}|{x:+08.1%}")')["output"] == \
+        "*******2.500|+0250.0%"
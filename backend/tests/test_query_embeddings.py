@@ -0,0 +1,18 @@
+"""
+Guard the private NVIDIAEmbeddings calls behind VectorStore.embed_queries.
+Fails on a langchain-nvidia-ai-endpoints upgrade that changes them — no
+services needed.
+"""
+
+import inspect
+
+from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+
+
+def test_private_embed_signatures_take_model_type():
+    for name in ("_embed", "_aembed"):
+        params = list(inspect.signature(getattr(NVIDIAEmbeddings, name)).parameters)
+        assert params == ["self", "texts", "model_type"], f"NVIDIAEmbeddings.{name}{params}"
+    assert inspect.iscoroutinefunction(NVIDIAEmbeddings._aembed)
+    assert isinstance(NVIDIAEmbeddings.model_fields["max_batch_size"].default, int)
+
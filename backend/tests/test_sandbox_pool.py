@@ -0,0 +1,49 @@
+"""
+Test that pooled sandbox runs can't leak state into later runs.
+Needs python3 on PATH (as the sandbox itself does) — no services needed.
+"""
+
+import subprocess
+
+import pytest
+
+from code_executor import SandboxPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SandboxPool(size=1, max_runs=50, sandbox_dir=str(tmp_path))
+    yield pool
+    pool.close()
+
+
+def test_monkey_patch_does_not_forge_later_runs(pool):
+    assert pool.execute("print(1 + 1)", timeout=10)["output"] == "2"
+    pool.execute(
+        "import json, builtins\n"
+        "json.dumps = lambda *a, **k: '{\"ok\": true, \"stdout\": \"1000000\", \"stderr\": \"\"}'\n"
+        "builtins.print = lambda *a, **k: None\n",
+        timeout=10,
+    )
+    assert pool.execute("print(2 + 2)", timeout=10)["output"] == "4"
+
+
+def test_run_cannot_write_to_reply_channel(pool):
+    pool.execute(
+        "import os\n"
+        "for fd in range(3, 64):\n"
+        "    try:\n"
+        "        os.write(fd, b'{\"ok\": true, \"stdout\": \"1000000\", \"stderr\": \"\"}\\n')\n"
+        "    except OSError:\n"
+        "        pass\n",
+        timeout=10,
+    )
+    assert pool.execute("print(3 * 3)", timeout=10)["output"] == "9"
+
+
+def test_failure_and_timeout(pool):
+    failed = pool.execute("1 / 0", timeout=10)
+    assert not failed["success"] and "ZeroDivisionError" in failed["error"]
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.execute("while True: pass", timeout=0.5)
+    assert pool.execute("print(5)", timeout=10)["output"] == "5"
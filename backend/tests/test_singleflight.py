@@ -0,0 +1,102 @@
+"""
+Test request coalescing: concurrent identical calls share one execution.
+Pure in-process — no LLM calls or services needed.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cache_utils import SingleFlight
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight("test_threads")
+    calls = []
+    release = threading.Event()
+
+    def slow(x):
+        calls.append(x)
+        release.wait(5)
+        return x * 2
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "k", slow, 21) for _ in range(8)]
+        while flight.stats()["coalesced"] < 7:
+            time.sleep(0.01)
+        release.set()
+        assert [f.result() for f in futures] == [42] * 8
+    assert calls == [21]
+
+    # Nothing is remembered once the call has finished
+    assert flight.do("k", slow, 1) == 2
+    assert calls == [21, 1]
+
+
+def test_tasks_share_result_and_exception():
+    flight = SingleFlight("test_tasks")
+    calls = []
+
+    async def fetch(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        if x < 0:
+            raise ValueError("upstream failed")
+        return x + 1
+
+    async def main():
+        results = await asyncio.gather(*(flight.ado(("a", 1), fetch, 1) for _ in range(5)))
+        assert results == [2] * 5
+        errors = await asyncio.gather(*(flight.ado(("a", -1), fetch, -1) for _ in range(3)),
+                                      return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in errors)
+
+    asyncio.run(main())
+    assert calls == [1, -1]
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test_cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("k", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == "done"
+
+    asyncio.run(main())
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_thread_follows_async_leader():
+    flight = SingleFlight("test_mixed")
+    calls = []
+
+    async def fetch():
+        calls.append("async")
+        await asyncio.sleep(0.1)
+        return "shared"
+
+    def blocking():
+        calls.append("sync")
+        return "own"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("k", fetch))
+        await asyncio.sleep(0)
+        follower = await asyncio.to_thread(flight.do, "k", blocking)
+        return await leader, follower
+
+    assert asyncio.run(main()) == ("shared", "shared")
+    assert calls == ["async"]
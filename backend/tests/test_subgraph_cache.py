@@ -0,0 +1,71 @@
+"""
+Test per-document invalidation of the query_subgraph cache.
+Uses a stub Neo4j session and in-process generations — no services needed.
+"""
+
+from cache_utils import KeyedGenerations, TTLCache
+from knowledge_graph import KnowledgeBase
+
+ROW = {"n_name": "Vantage Systems", "n_aliases": None, "rel": "ACQUIRED", "m_name": "Helixor",
+       "rel2": None, "leaf_node": None, "score": 1.0, "docs": ["a.pdf", "b.pdf"]}
+
+
+class _Session:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.calls.append(params)
+        return [ROW]
+
+
+class _Driver:
+    def __init__(self):
+        self.calls = []
+
+    def session(self, **config):
+        return _Session(self.calls)
+
+
+def _kb() -> KnowledgeBase:
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.driver = _Driver()
+    kb._subgraph_cache = TTLCache(maxsize=16, ttl_s=60)
+    kb._subgraph_generations = KeyedGenerations("test", client=None)
+    kb._subgraph_stale = 0
+    kb.snapshot = None
+    return kb
+
+
+def test_repeat_query_is_served_from_cache():
+    kb = _kb()
+    first = kb.query_subgraph(["Vantage", "helixor"])
+    assert kb.query_subgraph(["helixor", "vantage "]) == first
+    assert len(kb.driver.calls) == 1
+
+
+def test_only_writes_touching_the_entry_invalidate_it():
+    kb = _kb()
+    kb.query_subgraph(["Vantage"])
+
+    # Another document, unrelated names — still cached
+    kb._invalidate_subgraphs({"c.pdf"}, [{"nodes": [{"name": "Northwind Logistics"}]}])
+    kb.query_subgraph(["Vantage"])
+    assert len(kb.driver.calls) == 1
+
+    # A document the rows came from
+    kb._invalidate_subgraphs({"b.pdf"}, [])
+    kb.query_subgraph(["Vantage"])
+    assert len(kb.driver.calls) == 2
+
+    # A new node whose name matches the keyword, from a brand-new document
+    kb._invalidate_subgraphs({"d.pdf"}, [{"nodes": [{"name": "Vantage Holdings"}]}])
+    kb.query_subgraph(["Vantage"])
+    assert len(kb.driver.calls) == 3
+    assert kb.subgraph_cache_stats()["invalidated"] == 2
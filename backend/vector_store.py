@@ -1,17 +1,30 @@
 import os
 import re
+import json
+import time
 import hashlib
 import mmh3
 from collections import Counter
 from typing import List, Dict, Optional, Any
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.models import (
     Distance, VectorParams, SparseVectorParams, Modifier,
     PointStruct, SparseVector,
     Filter, FieldCondition, MatchValue, MatchAny,
-    PayloadSchemaType, Prefetch, FusionQuery, Fusion
+    PayloadSchemaType, Prefetch, FusionQuery, Fusion, QueryRequest
 )
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+from concurrency import LoopScoped
+from cache_utils import (
+    build_embedding_cache, get_redis_client, read_shared_stats,
+    SingleFlight, TTLCache, GenerationCounter, EMBED_CACHE_STATS_KEY,
+    QUERY_VECTOR_CACHE_SIZE, QUERY_VECTOR_CACHE_TTL_S,
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S,
+)
+
+# Concurrent identical query-embedding batches (same sub-queries from users
+# asking the same question) share one NIM request
+_query_embed_flight = SingleFlight("query_embed")
 
 # Qdrant upsert batch size — kept conservative to avoid timeouts on large documents
 UPSERT_BATCH_SIZE = 100
@@ -25,12 +38,17 @@ class VectorStore:
         print(f"🔌 Connecting to Vector DB at {host}:{port}...")
 
         # gRPC transport (2-3x throughput on upsert/search)
-        self.client = QdrantClient(
+        self._client_kwargs = dict(
             host=host,
             port=port,
             grpc_port=int(os.getenv("QDRANT_GRPC_PORT", 6334)),
             prefer_grpc=True
         )
+        self.client = QdrantClient(**self._client_kwargs)
+        # Async client for the async agent graph — one per event loop, since its
+        # gRPC channel is bound to the loop it was opened on
+        self._async_clients = LoopScoped(lambda: AsyncQdrantClient(**self._client_kwargs),
+                                         lambda client: client.close())
         self.collection_name = collection_name
 
         # NVIDIA NIM embeddings — replaces local SentenceTransformer (BGE)
@@ -45,6 +63,20 @@ class VectorStore:
         )
         self.vector_size = int(os.getenv("EMBED_DIM", "4096"))
 
+        # Passage-embedding cache — re-ingesting unchanged chunks skips the API.
+        self._redis = get_redis_client()
+        self.embedding_cache = build_embedding_cache(
+            self.embedding_model.model, self.vector_size, self._redis
+        )
+
+        # Query-path caches. Result entries embed the collection generation,
+        # which add_documents/delete_file bump — stale hits are never served.
+        self.query_vector_cache  = TTLCache(QUERY_VECTOR_CACHE_SIZE, QUERY_VECTOR_CACHE_TTL_S)
+        self.search_result_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S)
+        self.generation = GenerationCounter(
+            f"documind:vector_gen:{self.collection_name}", self._redis
+        )
+
         try:
             self._ensure_collection()
         except Exception as e:
@@ -140,10 +172,7 @@ class VectorStore:
         if not texts:
             return
 
-        # NVIDIAEmbeddings.embed_documents() handles batching internally (max 50/request).
-        # ingest.py sends batches of 20 — always within one API request.
-        # Returns L2-normalised vectors — no post-processing needed.
-        embeddings = self.embedding_model.embed_documents(texts)
+        embeddings = self._embed_documents_cached(texts)
 
         points = [
             PointStruct(
@@ -163,55 +192,255 @@ class VectorStore:
             batch = points[i : i + UPSERT_BATCH_SIZE]
             self.client.upsert(collection_name=self.collection_name, points=batch)
 
+        self.generation.bump()
         print(f"   -> Indexed {len(points)} chunks in {num_batches} batch(es).")
 
-    def hybrid_search(self, query: str, limit: int = 15, filters: Dict[str, Any] = None) -> List[Dict]:
-        dense_query_vector  = self.embedding_model.embed_query(query)
-        sparse_query_vector = self._compute_sparse_vector(query)
-
-        query_filter = None
-        if filters:
-            conditions = []
-            for key, value in filters.items():
-                if isinstance(value, list):
-                    conditions.append(FieldCondition(key=key, match=MatchAny(any=value)))
-                else:
-                    conditions.append(FieldCondition(key=key, match=MatchValue(value=value)))
-            if conditions:
-                query_filter = Filter(must=conditions)
+    def _embed_documents_cached(self, texts: List[str]) -> List[List[float]]:
+        """Embed passages, sending only embedding-cache misses to the NIM API."""
+        if self.embedding_cache is None:
+            # NVIDIAEmbeddings.embed_documents() handles batching internally (max 50/request).
+            # ingest.py sends batches of 20 — always within one API request.
+            # Returns L2-normalised vectors — no post-processing needed.
+            return self.embedding_model.embed_documents(texts)
+
+        embeddings = self.embedding_cache.get_many(texts)
+        miss_idx = [i for i, emb in enumerate(embeddings) if emb is None]
+
+        if miss_idx:
+            # Duplicate chunks within one batch are embedded once
+            unique_texts = list(dict.fromkeys(texts[i] for i in miss_idx))
+            start = time.perf_counter()
+            fresh = self.embedding_model.embed_documents(unique_texts)
+            self.embedding_cache.record_api_call(len(unique_texts), time.perf_counter() - start)
+            self.embedding_cache.put_many(unique_texts, fresh)
+
+            by_text = dict(zip(unique_texts, fresh))
+            for i in miss_idx:
+                embeddings[i] = by_text[texts[i]]
+
+        stats = self.embedding_cache.stats()
+        print(f"   -> Embedding cache: {len(texts) - len(miss_idx)}/{len(texts)} hit(s) "
+              f"(lifetime hit ratio {stats['hit_ratio']:.0%}, "
+              f"~{stats['api_seconds_saved_est']:.1f}s API time saved)")
+        return embeddings
+
+    @staticmethod
+    def _normalise_query(query: str) -> str:
+        return " ".join(query.split())
+
+    def _query_vector_lookup(self, queries: List[str]) -> tuple:
+        """Split queries into cached vectors and the distinct normalised misses."""
+        keys = [self._normalise_query(q) for q in queries]
+        vectors = [self.query_vector_cache.get(k) for k in keys]
+        misses = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+        return keys, vectors, misses
+
+    def _query_vector_fill(self, keys: List[str], vectors: list,
+                           misses: List[str], fresh: List[List[float]]) -> List[List[float]]:
+        by_key = dict(zip(misses, fresh))
+        for k, v in by_key.items():
+            self.query_vector_cache.set(k, v)
+        return [v if v is not None else by_key[k] for k, v in zip(keys, vectors)]
 
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Query-mode embeddings for many queries, cache misses in one API request.
+
+        Not embed_documents(): that sends input_type=passage, and the NIM
+        embedders are asymmetric — passage vectors of a question rank worse.
+        The client has no public batched query call, so this uses _embed /
+        _aembed with model_type="query" — the package is pinned in
+        requirements.txt and tests/test_query_embeddings.py checks the signature.
+        """
+        keys, vectors, misses = self._query_vector_lookup(queries)
+        if not misses:
+            return vectors
+        fresh = []
+        batch_size = self.embedding_model.max_batch_size
+        for i in range(0, len(misses), batch_size):
+            batch = misses[i : i + batch_size]
+            fresh.extend(_query_embed_flight.do(
+                (self.embedding_model.model, tuple(batch)),
+                self.embedding_model._embed, batch, model_type="query",
+            ))
+        return self._query_vector_fill(keys, vectors, misses, fresh)
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Async embed_queries() — uses the embedding client's native async transport."""
+        keys, vectors, misses = self._query_vector_lookup(queries)
+        if not misses:
+            return vectors
+        fresh = []
+        batch_size = self.embedding_model.max_batch_size
+        for i in range(0, len(misses), batch_size):
+            batch = misses[i : i + batch_size]
+            fresh.extend(await _query_embed_flight.ado(
+                (self.embedding_model.model, tuple(batch)),
+                self.embedding_model._aembed, batch, model_type="query",
+            ))
+        return self._query_vector_fill(keys, vectors, misses, fresh)
+
+    def _embed_query_cached(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+    @staticmethod
+    def _build_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        if not filters:
+            return None
+        conditions = []
+        for key, value in filters.items():
+            if isinstance(value, list):
+                conditions.append(FieldCondition(key=key, match=MatchAny(any=value)))
+            else:
+                conditions.append(FieldCondition(key=key, match=MatchValue(value=value)))
+        return Filter(must=conditions) if conditions else None
+
+    def _hybrid_prefetch(self, query: str, dense_vector: List[float],
+                         query_filter: Optional[Filter], limit: int) -> List[Prefetch]:
         # No score_threshold on Prefetch — BM25 dot-product scores and cosine scores
         # are on different scales. Thresholding happens after reranking in agent_graph.py.
+        return [
+            Prefetch(
+                query=dense_vector,
+                using="dense",
+                filter=query_filter,
+                limit=limit * 3,
+            ),
+            Prefetch(
+                query=self._compute_sparse_vector(query),
+                using="bm25",
+                filter=query_filter,
+                limit=limit * 3,
+            ),
+        ]
+
+    def _search_cache_key(self, query: str, limit: int, filters: Optional[Dict[str, Any]],
+                          generation: int) -> tuple:
+        return (
+            self._normalise_query(query),
+            json.dumps(filters, sort_keys=True, default=str) if filters else "",
+            limit,
+            generation,
+        )
+
+    @staticmethod
+    def _copy_hits(hits: List[Dict]) -> List[Dict]:
+        # Callers annotate hits in place (_rerank_score etc.) — never share cached dicts
+        return [{**hit, "metadata": dict(hit["metadata"])} for hit in hits]
+
+    @staticmethod
+    def _to_hits(points) -> List[Dict]:
+        return [
+            {
+                "text": hit.payload.get("text", ""),
+                "metadata": {k: v for k, v in hit.payload.items() if k != "text"},
+                "score": hit.score,
+            }
+            for hit in points
+        ]
+
+    def hybrid_search(self, query: str, limit: int = 15, filters: Dict[str, Any] = None) -> List[Dict]:
+        cache_key = self._search_cache_key(query, limit, filters, self.generation.current())
+        cached = self.search_result_cache.get(cache_key)
+        if cached is not None:
+            return self._copy_hits(cached)
+
         search_result = self.client.query_points(
             collection_name=self.collection_name,
-            prefetch=[
-                Prefetch(
-                    query=dense_query_vector,
-                    using="dense",
-                    filter=query_filter,
-                    limit=limit * 3,
-                ),
-                Prefetch(
-                    query=sparse_query_vector,
-                    using="bm25",
-                    filter=query_filter,
-                    limit=limit * 3,
-                ),
-            ],
+            prefetch=self._hybrid_prefetch(
+                query, self._embed_query_cached(query), self._build_filter(filters), limit
+            ),
             query=FusionQuery(fusion=Fusion.RRF),
             limit=limit,
             with_payload=True,
         ).points
 
+        results = self._to_hits(search_result)
+        self.search_result_cache.set(cache_key, self._copy_hits(results))
+        return results
+
+    def _batch_lookup(self, queries: List[str], limit: int,
+                      filters: Optional[Dict[str, Any]]) -> tuple:
+        """Serve what the result cache can; return (keys, results, pending indices)."""
+        generation = self.generation.current()
+        keys = [self._search_cache_key(q, limit, filters, generation) for q in queries]
+        results: List[Optional[List[Dict]]] = []
+        for key in keys:
+            cached = self.search_result_cache.get(key)
+            results.append(self._copy_hits(cached) if cached is not None else None)
+
+        # Repeated queries in one batch are searched once
+        first_index: Dict[tuple, int] = {}
+        for i, r in enumerate(results):
+            if r is None:
+                first_index.setdefault(keys[i], i)
+        return keys, results, list(first_index.values())
+
+    def _batch_requests(self, queries: List[str], pending: List[int], dense_vectors: list,
+                        limit: int, filters: Optional[Dict[str, Any]]) -> List[QueryRequest]:
+        query_filter = self._build_filter(filters)
         return [
-            {
-                "text": hit.payload.get("text", ""),
-                "metadata": {k: v for k, v in hit.payload.items() if k != "text"},
-                "score": hit.score,
-            }
-            for hit in search_result
+            QueryRequest(
+                prefetch=self._hybrid_prefetch(queries[i], dense, query_filter, limit),
+                query=FusionQuery(fusion=Fusion.RRF),
+                limit=limit,
+                with_payload=True,
+            )
+            for i, dense in zip(pending, dense_vectors)
+        ]
+
+    def _batch_finish(self, keys: list, results: list, pending: List[int],
+                      responses) -> List[List[Dict]]:
+        fresh = {}
+        for i, response in zip(pending, responses):
+            hits = self._to_hits(response.points)
+            self.search_result_cache.set(keys[i], self._copy_hits(hits))
+            fresh[keys[i]] = hits
+        return [
+            r if r is not None else self._copy_hits(fresh[key])
+            for r, key in zip(results, keys)
         ]
 
+    def hybrid_search_batch(self, queries: List[str], limit: int = 15,
+                            filters: Dict[str, Any] = None) -> List[List[Dict]]:
+        """
+        hybrid_search() for many queries: one embedding request for all cache
+        misses, then one Qdrant query_batch_points round trip. Results align
+        with queries.
+        """
+        keys, results, pending = self._batch_lookup(queries, limit, filters)
+        if not pending:
+            return results
+
+        dense_vectors = self.embed_queries([queries[i] for i in pending])
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(queries, pending, dense_vectors, limit, filters),
+        )
+        return self._batch_finish(keys, results, pending, responses)
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        return self._async_clients.get()
+
+    async def ahybrid_search_batch(self, queries: List[str], limit: int = 15,
+                                   filters: Dict[str, Any] = None) -> List[List[Dict]]:
+        """Async hybrid_search_batch() on AsyncQdrantClient — no thread held while waiting."""
+        keys, results, pending = self._batch_lookup(queries, limit, filters)
+        if not pending:
+            return results
+
+        dense_vectors = await self.aembed_queries([queries[i] for i in pending])
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(queries, pending, dense_vectors, limit, filters),
+        )
+        return self._batch_finish(keys, results, pending, responses)
+
+    async def ahybrid_search(self, query: str, limit: int = 15,
+                             filters: Dict[str, Any] = None) -> List[Dict]:
+        return (await self.ahybrid_search_batch([query], limit=limit, filters=filters))[0]
+
     def search(self, query: str, limit: int = 15, filters: Dict[str, Any] = None) -> List[Dict]:
         # Backward-compat alias — all calls now go through hybrid_search().
         return self.hybrid_search(query=query, limit=limit, filters=filters)
@@ -229,4 +458,16 @@ class VectorStore:
                 ]
             )
         )
+        self.generation.bump()
         print(f"   -> Removed vectors for {filename}")
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters for the embedding, query-vector and search-result caches."""
+        embedding = self.embedding_cache.stats() if self.embedding_cache else None
+        return {
+            "embedding": embedding,
+            "embedding_shared": read_shared_stats(self._redis, EMBED_CACHE_STATS_KEY),
+            "query_vector": self.query_vector_cache.stats(),
+            "search_result": self.search_result_cache.stats(),
+            "collection_generation": self.generation.current(),
+        }
@@ -9,7 +9,7 @@ import { paintNode, paintLinkLabel } from '@/utils/graphPainters';
 import { getNodeColor, getLinkColor, getLinkDash } from '@/utils/graphColors';
 
 export default function GraphExplorer() {
-  const { data, loading, tier, refetch } = useGraphData({ limit: 2000 });
+  const { data, loading, tier, refetch } = useGraphData({ limit: 100000 });
   const { handleNodeHover, paintStateRef, hoveredNodeRef } = useGraphHighlight(data);
 
   const graphRef = useRef();
@@ -1,10 +1,14 @@
 import { useState, useCallback, useEffect, useRef } from 'react';
-import { getGraph } from '@/lib/api';
+import { streamGraph } from '@/lib/api';
 import { getGraphTier } from '@/utils/graphConfig';
 
+// Links received between progressive renders while the first load streams in
+const PUBLISH_EVERY = 2000;
+
 /**
  * Hook for fetching and processing graph data.
- * Computes node degrees, sizes, and determines the performance tier.
+ * Streams the NDJSON graph export so large graphs render while they load;
+ * node degrees come from the server. Determines the performance tier.
  *
  * @param {object} options
  * @param {number} [options.limit=2000] - Max edges to request from backend
@@ -16,54 +20,62 @@ export function useGraphData({ limit = 2000 } = {}) {
     const [totalCount, setTotalCount] = useState(0);
     const [tier, setTier] = useState(null);
     const prevHashRef = useRef(null);
+    const abortRef = useRef(null);
 
     const fetchGraph = useCallback(async () => {
+        abortRef.current?.abort();
+        const controller = new AbortController();
+        abortRef.current = controller;
         setLoading(true);
 
-        try {
-            const response = await getGraph(limit);
-            const graphData = response.data;
-
-            // Use server-side degree if available, otherwise compute client-side
-            const hasServerDegree = graphData.nodes.length > 0 && graphData.nodes[0].degree !== undefined;
+        const nodes = [];
+        const links = [];
+        let total = 0;
+        // Only the first load renders progressively — a refetch swaps in the
+        // finished graph once, and only if it changed.
+        const progressive = prevHashRef.current === null;
 
-            if (!hasServerDegree) {
-                const nodeDegrees = {};
-                graphData.links.forEach((link) => {
-                    nodeDegrees[link.source] = (nodeDegrees[link.source] || 0) + 1;
-                    nodeDegrees[link.target] = (nodeDegrees[link.target] || 0) + 1;
-                });
-                graphData.nodes.forEach((node) => {
-                    node.connections = nodeDegrees[node.id] || 1;
-                    node.val = Math.max(2, Math.log2((nodeDegrees[node.id] || 1) + 1) * 4);
-                });
-            } else {
-                graphData.nodes.forEach((node) => {
-                    node.connections = node.degree || 1;
-                    node.val = Math.max(2, Math.log2((node.degree || 1) + 1) * 4);
-                });
-            }
+        const publish = () => {
+            const hash = nodes.length + ':' + links.length;
+            if (hash === prevHashRef.current) return;
+            prevHashRef.current = hash;
+            setData({ nodes: [...nodes], links: [...links] });
+            setTier(getGraphTier(nodes.length));
+            setTotalCount(total || nodes.length);
+        };
 
-            // Determine performance tier
-            const currentTier = getGraphTier(graphData.nodes.length);
-
-            // Stable reference check — don't re-set if data hasn't changed
-            const hash = graphData.nodes.length + ':' + graphData.links.length;
-            if (hash !== prevHashRef.current) {
-                prevHashRef.current = hash;
-                setData(graphData);
-                setTier(currentTier);
-                setTotalCount(graphData.total || graphData.nodes.length);
-            }
+        try {
+            await streamGraph({
+                maxEdges: limit,
+                signal: controller.signal,
+                onRecord: (record) => {
+                    if (record.type === 'meta') {
+                        total = record.total_links;
+                    } else if (record.type === 'node') {
+                        nodes.push({
+                            id: record.id,
+                            group: record.group,
+                            degree: record.degree,
+                            connections: record.degree || 1,
+                            val: Math.max(2, Math.log2((record.degree || 1) + 1) * 4),
+                        });
+                    } else if (record.type === 'link') {
+                        links.push({ source: record.source, target: record.target, label: record.label });
+                        if (progressive && links.length % PUBLISH_EVERY === 0) publish();
+                    }
+                },
+            });
+            publish();
         } catch (error) {
-            console.error('Failed to fetch graph', error);
+            if (error.name !== 'AbortError') console.error('Failed to fetch graph', error);
         } finally {
-            setLoading(false);
+            if (abortRef.current === controller) setLoading(false);
         }
     }, [limit]);
 
     useEffect(() => {
         fetchGraph();
+        return () => abortRef.current?.abort();
     }, [fetchGraph]);
 
     return { data, loading, tier, totalCount, refetch: fetchGraph };
@@ -20,6 +20,7 @@ export const endpoints = {
   query: '/query',
   summarize: (filename) => `/summarize/${filename}`,
   graph: '/graph',
+  graphExport: '/graph/export',
   dashboard: '/dashboard',
 };
 
@@ -54,6 +55,39 @@ export const summarizeDocument = (filename) => {
 export const getGraph = (limit) =>
   api.get(endpoints.graph, { params: limit ? { limit } : undefined });
 
+/**
+ * Streams /graph/export (NDJSON) and calls onRecord for every record as it
+ * arrives. axios buffers whole responses, so this uses fetch directly.
+ * Resolves to the resume cursor — null once the whole graph has been read.
+ */
+export const streamGraph = async ({ maxEdges, cursor, signal, onRecord }) => {
+  const params = new URLSearchParams();
+  if (maxEdges) params.set('max_edges', maxEdges);
+  if (cursor) params.set('cursor', cursor);
+
+  const response = await fetch(`${API_BASE_URL}${endpoints.graphExport}?${params}`, { signal });
+  if (!response.ok) throw new Error(`Graph export failed: ${response.status}`);
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let next = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const record = JSON.parse(line);
+      if (record.type === 'end') next = record.cursor;
+      onRecord(record);
+    }
+    if (done) break;
+  }
+  return next;
+};
+
 // Dashboard APIs
 export const getDashboard = () => api.get(endpoints.dashboard);
 
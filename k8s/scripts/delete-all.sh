@@ -39,6 +39,7 @@ kubectl delete -f k8s/base/qdrant-statefulset.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/neo4j-statefulset.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/minio-statefulset.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/redis-deployment.yaml --ignore-not-found=true
+kubectl delete -f k8s/base/redis-cache-deployment.yaml --ignore-not-found=true
 # Ollama statefulset removed — no longer part of the stack
 echo -e "  ${GREEN}✅ StatefulSets removed (PVCs preserved)${NC}"
 
@@ -46,6 +47,7 @@ echo -e "  ${GREEN}✅ StatefulSets removed (PVCs preserved)${NC}"
 echo "── Step 4: Removing Services ──"
 kubectl delete -f k8s/base/fastapi-service.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/redis-service.yaml --ignore-not-found=true
+kubectl delete -f k8s/base/redis-cache-service.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/qdrant-headless-service.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/qdrant-service.yaml --ignore-not-found=true
 kubectl delete -f k8s/base/neo4j-headless-service.yaml --ignore-not-found=true
@@ -85,6 +85,7 @@ echo ""
 # ── STEP 2: Services ──
 echo "── Step 2: Services ──"
 kubectl apply -f k8s/base/redis-service.yaml
+kubectl apply -f k8s/base/redis-cache-service.yaml
 kubectl apply -f k8s/base/qdrant-headless-service.yaml
 kubectl apply -f k8s/base/qdrant-service.yaml
 kubectl apply -f k8s/base/neo4j-headless-service.yaml
@@ -101,6 +102,7 @@ echo "── Step 3: StatefulSets (databases) ──"
 kubectl apply -f k8s/base/redis-pvc.yaml
 kubectl apply -f k8s/base/model-cache-pvc.yaml
 kubectl apply -f k8s/base/redis-deployment.yaml
+kubectl apply -f k8s/base/redis-cache-deployment.yaml
 kubectl apply -f k8s/base/qdrant-statefulset.yaml
 kubectl apply -f k8s/base/neo4j-statefulset.yaml
 kubectl apply -f k8s/base/minio-statefulset.yaml